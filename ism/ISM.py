@@ -5,26 +5,56 @@ Implements the following functions:
     * __init__ - Constructor accepts path to properties file and
     then calls get_properties() to load the YAML.
     * get_properties - Read the properties file into the properties attribute.
-    * run - Iterates over the array of imported ism_core_actions and calls each one's
-        execute method.
+    * run - Dispatches the ready actions, highest priority first, until stopped.
+    * dump_flight_recorder - Write the flight recorder's ring buffer to the run directory.
+    * checkpoint - Checkpoint the control database so the run can be resumed.
+    * subscribe - Receive phase, activation, timer and shutdown events as they happen.
+    * create_action - Install another instance of an action class, e.g. one per entity.
+    * reload_action_pack - Deploy changes to an imported action pack without restarting the run.
+    * snapshot - Read the control database consistently from other threads without blocking the loop.
+    * journal - Optionally journal every change made through the actions, replayed on resume.
+    * clock - Tell the time by the system clock or a simulated one that skips idle time.
 """
 
 # Standard library imports
+import concurrent.futures
 import errno
+import hashlib
 import importlib.resources as pkg_resources
 import importlib.util
 import inspect
 import json
 import logging
 import os
+import queue
+import sys
 import threading
 import time
 import yaml
 
 # Local application imports
 from ism.exceptions.exceptions import PropertyKeyNotRecognised, RDBMSNotRecognised, TimestampFormatNotRecognised, \
-    ExecutionPhaseNotFound, MalformedActionPack
+    ExecutionPhaseNotFound, MalformedActionPack, ActionPackNotImported
 from . import core
+from .core.channel import MessageChannel
+from .core.checkpoint import Checkpoint
+from .core.clock import SimulatedClock, SystemClock
+from .core.dispatcher import Dispatcher
+from .core.events import EventBus
+from .core.exporter import MetricsExporter
+from .core.gates import Gates
+from .core.journal import Journal, replay
+from .dal.migrations import SchemaMigrator
+from .dal.statement_stats import StatementStats
+from .dal.template_cache import TemplateCache
+from .core import events
+from .core.flight_recorder import FlightRecorder
+from .core.metrics import Metrics
+from .core.payload_store import PayloadStore
+from .core.recurring_timers import RecurringTimers
+from .core.registry import ActionRegistry
+from .core.startup import StartupPool
+from .core.watchdog import Watchdog
 from .core.action_check_timers import ActionCheckTimers
 from .core.action_normal_shutdown import ActionNormalShutdown
 from .core.action_emergency_shutdown import ActionEmergencyShutdown
@@ -55,37 +85,177 @@ class ISM:
         """
         :param props_file:
             Fully qualified path to the properties file
+        :param resume:
+            Optional path to the run directory of an earlier run. The run continues
+            from its last checkpoint instead of starting a new run.
         """
         self.properties_file = args[0]['properties_file']
         self.properties = self.__get_properties()
         self.properties['database']['password'] = args[0].get('database', {}).get('password', None)
         self.properties['database']['db_path'] = None
-        self.properties['runtime']['run_timestamp'] = self.__create_run_timestamp()
-        self.properties['runtime']['tag'] = self.properties['runtime'].get('tag', 'default')
+        self.resume_dir = args[0].get('resume', None)
+        if self.resume_dir:
+            path = os.path.normpath(self.resume_dir)
+            self.properties['runtime']['tag'] = os.path.basename(os.path.dirname(path))
+            self.properties['runtime']['run_timestamp'] = int(os.path.basename(path))
+        else:
+            self.properties['runtime']['run_timestamp'] = self.__create_run_timestamp()
+            self.properties['runtime']['tag'] = self.properties['runtime'].get('tag', 'default')
         self.properties['running'] = False
         self.ism_thread = None
         self.actions = []
+        self.action_packs = []
+        self.resumed_packs = []
+        self.pack_sources = {}
+        self.between_ticks = queue.SimpleQueue()
+        self.checkpoint_requested = threading.Event()
+        self.checkpoint_taken = threading.Event()
+        self.events = EventBus()
+        self.channel = MessageChannel()
+        self.phase = None
+        self.phase_changed = threading.Condition()
+        self.events.subscribe(events.PHASE, self.__on_phase)
+        self.metrics = Metrics()
+        self.clock = self.__create_clock()
+        self.state_changes = 0
+        if self.clock.simulated:
+            for event_type in (events.ACTIVATE, events.DEACTIVATE, events.PAYLOAD, events.PHASE, events.TIMER):
+                self.events.subscribe(event_type, self.__on_state_change)
         self.__create_runtime_environment()
         self.__enable_logging()
+        self.recorder = FlightRecorder(
+            self.properties.get('flight_recorder', {}).get('size', 4096),
+            f'{self.properties["runtime"]["run_dir"]}{os.path.sep}flight_recorder'
+        )
         self.logger.info(f'Starting run using user tag ('
                          f'{self.properties["runtime"]["tag"]}) and system tag ('
                          f'{self.properties["runtime"]["run_timestamp"]})')
         self.__create_db(self.properties['database']['rdbms'])
-        self.__create_core_schema()
-        self.__insert_core_data()
+        self.checkpoints = Checkpoint(self.dao, self.properties, self.clock)
+        self.watchdog = self.__create_watchdog()
+        self.registry = ActionRegistry(self.dao, self.events)
+        self.action_args = None
+        self.gates = Gates(self.dao, self.events)
+        self.startup = self.__create_startup_pool()
+        self.payloads = PayloadStore(
+            f'{self.properties["runtime"]["run_dir"]}{os.path.sep}payloads',
+            self.properties.get('payloads', {}).get('threshold_bytes', 1048576)
+        )
+        self.journal = self.__create_journal()
+        self.recurring_timers = RecurringTimers(
+            self.dao,
+            self.metrics,
+            self.properties.get('recurring_timers', {}).get('resolution_ms', 10),
+            self.clock,
+            self.journal
+        )
+        self.dispatcher = Dispatcher(
+            self.registry, self.events, self.metrics, self.recorder, self.watchdog, self.startup
+        )
+        self.migrator = SchemaMigrator(self.dao, self.properties['database']['rdbms'])
+        self.exporter = self.__create_exporter()
+        self.templates = None
+        self.template_key = None
+        self.template_pending = None
+        self.template_backlog = []
+        self.template_writes = 0
+        if self.resume_dir:
+            self.__resume_from_checkpoint()
+        else:
+            self.__create_template_cache()
+            self.__create_core_schema()
+            self.__insert_core_data()
+            self.__materialise_template()
+        self.phase = self.get_execution_phase()
         self.__import_core_actions()
+        self.registry.load()
+        self.recurring_timers.load()
 
     # Private methods
+    def __add_action(self, action):
+        """Add an action to the collection of actions and to those dispatched"""
+
+        self.actions.append(action)
+        self.dispatcher.add(action)
+
+    def __advance_clock(self):
+        """Jump the simulated clock to the next timer or recurring timer deadline"""
+
+        deadlines = []
+        expiry = self.dao.execute_sql_query('SELECT MIN(expiry) FROM timers WHERE active = 1')
+        if expiry and expiry[0][0] is not None:
+            # A timer fires once the time is past its expiry
+            deadlines.append((expiry[0][0] + 1) * 1000000 - self.clock.time_ns())
+        due_ns = self.recurring_timers.next_due_ns()
+        if due_ns is not None:
+            deadlines.append(due_ns - self.clock.monotonic_ns())
+        if deadlines:
+            self.clock.advance(max(0, min(deadlines)))
+
+    def __create_clock(self):
+        """Create the clock named in the properties, the system clock by default"""
+
+        props = self.properties.get('clock', {})
+        mode = props.get('mode', 'system')
+        if mode == 'simulated':
+            return SimulatedClock(props.get('start_ms', None))
+        if mode != 'system':
+            raise PropertyKeyNotRecognised(f'Clock mode ({mode}) must be system or simulated')
+        return SystemClock()
+
     def __create_core_schema(self):
         """Create the core schema
 
-        ISM needs a basic core of tables to run. Import the schema from ism.core.schema.json.
+        ISM needs a basic core of tables to run. Import the schema from ism.core.schema.json
+        and apply its migrations.
         """
 
         with pkg_resources.open_text(core, 'schema.json') as schema:
-            data = json.load(schema)
-            for table in data[self.properties['database']['rdbms'].lower()]['tables']:
-                self.dao.execute_sql_statement(table)
+            source = schema.read()
+            data = json.loads(source)
+            self.__execute_statements(
+                core.__name__,
+                source,
+                self.migrator.create_statements(core.__name__, data[self.properties['database']['rdbms'].lower()])
+            )
+
+    def __create_watchdog(self):
+        """Create the watchdog if the properties have a watchdog section"""
+
+        if 'watchdog' not in self.properties:
+            return None
+        return Watchdog(
+            self.metrics,
+            self.properties['watchdog'].get('budget_ms', 1000),
+            self.properties['watchdog'].get('on_overrun', 'log'),
+            self.properties['watchdog'].get('interval_ms', 10)
+        )
+
+    def __create_startup_pool(self):
+        """Create the pool for the startup actions if the properties have a startup section"""
+
+        if 'startup' not in self.properties:
+            return None
+        return StartupPool(self.gates, self.properties['startup'].get('workers', 4))
+
+    def __create_template_cache(self):
+        """Enable the template cache if the properties set database:template_cache.
+
+        Only supported for Sqlite3, where the control database is a single file.
+        """
+
+        directory = self.properties['database'].get('template_cache', None)
+        if not directory:
+            return
+        if self.properties['database']['rdbms'].lower() != 'sqlite3':
+            self.logger.info('Template cache is only supported for sqlite3. Ignoring database:template_cache')
+            return
+        self.templates = TemplateCache(
+            directory,
+            self.properties['database'].get('max_templates', 32)
+        )
+        self.template_key = TemplateCache.root_key(self.properties['database']['rdbms'].lower())
+        self.template_writes = self.dao.writes
 
     def __create_db(self, rdbms):
         """Route through to the correct RDBMS handler"""
@@ -98,6 +268,20 @@ class ISM:
             self.logger.error(f'RDBMS {rdbms} not recognised / supported')
             raise RDBMSNotRecognised(f'RDBMS {rdbms} not recognised / supported')
 
+    def __create_journal(self):
+        """Create the write-ahead journal if it's enabled in the properties"""
+
+        props = self.properties.get('journal', {})
+        if not props.get('enabled', False):
+            return None
+        return Journal(
+            f'{self.properties["runtime"]["run_dir"]}{os.path.sep}journal',
+            props.get('fsync', 'interval'),
+            props.get('fsync_interval_ms', 100),
+            props.get('segment_bytes', 67108864),
+            self.clock
+        )
+
     def __create_mysql(self):
         """Create the Mysql database for the run.
 
@@ -126,7 +310,7 @@ class ISM:
         db_dir = f'{self.properties["runtime"]["run_dir"]}{os.path.sep}database'
         self.properties['database']['db_path'] = \
             f'{db_dir}{os.path.sep}{self.properties["database"]["db_name"]}'
-        os.makedirs(db_dir)
+        os.makedirs(db_dir, exist_ok=bool(self.resume_dir))
         self.dao = Sqlite3DAO(self.properties)
         self.dao.create_database(self.properties)
         self.logger.info(f'Created Sqlite3 database {self.properties["database"]["db_path"]}')
@@ -176,7 +360,7 @@ class ISM:
             log_dir = f'{self.properties["runtime"]["run_dir"]}' \
                       f'{os.path.sep}' \
                       f'log'
-            os.makedirs(log_dir)
+            os.makedirs(log_dir, exist_ok=bool(self.resume_dir))
 
             self.properties["logging"]["file"] = \
                 f'{log_dir}' \
@@ -200,7 +384,7 @@ class ISM:
 
         # File handler for the root logger
         formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-        fh = logging.FileHandler(self.properties["logging"]["file"], 'w')
+        fh = logging.FileHandler(self.properties["logging"]["file"], 'a' if self.resume_dir else 'w')
         fh.setFormatter(formatter)
         self.root_logger.addHandler(fh)
 
@@ -216,18 +400,69 @@ class ISM:
         with open(self.properties_file) as file:
             return yaml.safe_load(file)
 
+    def __execute_statements(self, package: str, source: str, statements: list):
+        """Execute the schema or data statements read from the package's file content in source.
+
+        If the template cache is enabled and already holds the database that results from
+        these statements, execution is deferred and the database is cloned from the
+        template by __materialise_template(). Otherwise the statements are executed and
+        the result stored as a new template. Once anything else has been written to the
+        control database, the cache is no longer used for the run.
+        """
+
+        if self.template_key is not None and self.dao.writes != self.template_writes:
+            self.logger.info(
+                'Control database written outside the template cache. Not using it for the rest of the run'
+            )
+            self.__materialise_template()
+            self.template_key = None
+
+        if self.template_key is None:
+            for statement in statements:
+                self.dao.execute_sql_statement(statement)
+            return
+
+        key = self.templates.key(self.template_key, package, source.encode('utf-8'))
+        self.template_key = key
+        if self.templates.contains(key):
+            self.template_pending = key
+            self.template_backlog.append(statements)
+            return
+
+        self.__materialise_template()
+        for statement in statements:
+            self.dao.execute_sql_statement(statement)
+        self.templates.store(key, self.dao)
+        self.template_writes = self.dao.writes
+
+    def __get_action_args(self) -> dict:
+        """The context passed to the constructor of every action. One dict shared by them all."""
+
+        if self.action_args is None:
+            self.action_args = {
+                "dao": self.dao,
+                "properties": self.properties,
+                "recorder": self.recorder,
+                "events": self.events,
+                "channel": self.channel,
+                "gates": self.gates,
+                "registry": self.registry,
+                "recurring_timers": self.recurring_timers,
+                "payloads": self.payloads,
+                "journal": self.journal,
+                "clock": self.clock
+            }
+        return self.action_args
+
     def __import_core_actions(self):
         """Import the core actions for the ISM"""
 
-        args = {
-            "dao": self.dao,
-            "properties": self.properties
-        }
-        self.actions.append(ActionCheckTimers(args))
-        self.actions.append(ActionConfirmReadyToRun(args))
-        self.actions.append(ActionConfirmReadyToStop(args))
-        self.actions.append(ActionEmergencyShutdown(args))
-        self.actions.append(ActionNormalShutdown(args))
+        args = self.__get_action_args()
+        self.__add_action(ActionCheckTimers(args))
+        self.__add_action(ActionConfirmReadyToRun(args))
+        self.__add_action(ActionConfirmReadyToStop(args))
+        self.__add_action(ActionEmergencyShutdown(args))
+        self.__add_action(ActionNormalShutdown(args))
 
     def __insert_core_data(self):
         """Insert the run data for the core
@@ -236,26 +471,301 @@ class ISM:
         """
 
         with pkg_resources.open_text(core, 'data.json') as data:
-            inserts = json.load(data)
-            for insert in inserts[self.properties['database']['rdbms'].lower()]['inserts']:
-                self.dao.execute_sql_statement(insert)
+            source = data.read()
+            inserts = json.loads(source)
+            self.__execute_statements(
+                core.__name__, source, inserts[self.properties['database']['rdbms'].lower()]['inserts']
+            )
+
+    def __materialise_template(self):
+        """Clone any deferred template into the control database.
+
+        Falls back to executing the deferred statements if the template has gone, or if the
+        control database has been written to since, as the clone would overwrite the writes.
+        """
+
+        if self.template_pending is None:
+            return
+        if self.dao.writes != self.template_writes or not self.templates.clone(self.template_pending, self.dao):
+            for statements in self.template_backlog:
+                for statement in statements:
+                    self.dao.execute_sql_statement(statement)
+        self.template_pending = None
+        self.template_backlog = []
+        self.template_writes = self.dao.writes
+
+    def __on_phase(self, event):
+        """Track the execution phase so callers can wait on it without querying the control DB"""
+
+        with self.phase_changed:
+            self.phase = event.subject
+            self.phase_changed.notify_all()
+
+    def __on_state_change(self, event):
+        """Count the state changes so the simulated clock can tell when a tick was idle"""
+        self.state_changes += 1
+
+    def __resume_from_checkpoint(self):
+        """Restore the control database from the run's last checkpoint.
+
+        The schema and core data are already in the checkpoint so are not recreated.
+        Action packs imported before the checkpoint skip their tables and inserts. Changes
+        journalled since the checkpoint are replayed onto it.
+        """
+
+        manifest = self.checkpoints.restore()
+        self.resumed_packs = manifest['action_packs']
+        with pkg_resources.open_text(core, 'schema.json') as schema:
+            self.migrator.upgrade(core.__name__, json.load(schema)[self.properties['database']['rdbms'].lower()])
+        if manifest.get('journal'):
+            replayed = replay(
+                self.dao.execute_sql_statement,
+                f'{self.properties["runtime"]["run_dir"]}{os.path.sep}journal',
+                manifest['journal']
+            )
+            self.logger.info(f'Replayed ({replayed}) changes journalled since the checkpoint')
+        self.logger.info(f'Resuming run in phase ({manifest["execution_phase"]}) with '
+                         f'({len(manifest["pending_timers"])}) pending timers')
+
+    def __collect_metrics(self) -> list:
+        """Every sample for the metrics exporter, grouped by name. Called on the exporter's thread."""
+
+        now = time.monotonic()
+        ticks = self.dispatcher.ticks
+        last_now, last_ticks = self.last_scrape
+        self.last_scrape = (now, ticks)
+        samples = list(self.metrics.samples())
+        samples.append(('ism_ticks_total', 'counter', {}, ticks))
+        samples.append(('ism_ticks_per_second', 'gauge', {}, (ticks - last_ticks) / max(now - last_now, 1e-9)))
+        samples.append(('ism_active_actions', 'gauge', {}, self.registry.active_count()))
+        samples.append(('ism_ready_actions', 'gauge', {}, len(self.registry.ready(self.phase))))
+        samples.extend(
+            ('ism_phase', 'gauge', {'phase': phase}, 1 if phase == self.phase else 0)
+            for phase in ('STARTING', 'RUNNING', 'EMERGENCY_SHUTDOWN', 'NORMAL_SHUTDOWN', 'STOPPED')
+        )
+
+        # Timers expire in the clock's time, which may be simulated. The loop's performance is in the system's
+        epoch_millis = self.clock.time_ns() // 1000000
+        sql = self.dao.prepare_parameterised_statement('SELECT COUNT(*) FROM timers WHERE active = ?')
+        pending = self.dao.execute_sql_query(sql, (True,))[0][0]
+        sql = self.dao.prepare_parameterised_statement(
+            'SELECT COUNT(*), MIN(expiry) FROM timers WHERE active = ? AND expiry < ?'
+        )
+        overdue, oldest = self.dao.execute_sql_query(sql, (True, epoch_millis))[0]
+        samples.append(('ism_timers_pending', 'gauge', {}, pending))
+        samples.append(('ism_timers_overdue', 'gauge', {}, overdue))
+        samples.append(('ism_timer_lag_seconds', 'gauge', {}, (epoch_millis - oldest) / 1000 if oldest else 0))
+        samples.append(('ism_recurring_timers', 'gauge', {}, len(self.recurring_timers)))
+
+        for kind, (count, seconds) in self.dao.stats.totals().items():
+            samples.append(('ism_db_statements_total', 'counter', {'kind': kind}, count))
+            samples.append(('ism_db_statement_seconds_total', 'counter', {'kind': kind}, seconds))
+        samples.extend(
+            ('ism_action_executions_total', 'counter', {'action': action_name}, count)
+            for action_name, count in sorted(self.dispatcher.executions.items())
+        )
+        return sorted(samples, key=lambda sample: sample[0])
+
+    def __create_exporter(self):
+        """Create the metrics exporter if enabled in the properties metrics section"""
+
+        config = self.properties.get('metrics', {})
+        if not config.get('enabled', False):
+            return None
+        self.dao.stats = StatementStats()
+        self.last_scrape = (time.monotonic(), 0)
+        return MetricsExporter(
+            self.__collect_metrics,
+            config.get('host', '127.0.0.1'),
+            config.get('port', 9464),
+            config.get('socket', None)
+        )
+
+    def __create_module_actions(self, module) -> list:
+        """Instantiate each action class in the module. Any class with Action in its name except BaseAction."""
+
+        action_args = self.__get_action_args()
+        return [
+            cl_(action_args) for name, cl_ in inspect.getmembers(module, inspect.isclass)
+            if name != 'BaseAction' and 'Action' in name
+        ]
+
+    @staticmethod
+    def __get_pack_module_names(package) -> list:
+        """The fully qualified names of the modules in an action pack"""
+
+        import pkgutil
+        names = []
+        for importer, modname, ispkg in pkgutil.iter_modules(package.__path__):
+            # Should not be any sub packages in there
+            if ispkg:
+                raise MalformedActionPack(
+                    f'Passed malformed action pack ({package.__name__}). Unexpected sub packages {modname}'
+                )
+            names.append(f'{package.__name__}.{modname}')
+        return names
+
+    @staticmethod
+    def __get_source_digest(module) -> str:
+        """SHA1 of the module's source file, to tell if it has changed since it was imported"""
+
+        with open(module.__file__, 'rb') as source:
+            return hashlib.sha1(source.read()).hexdigest()
+
+    def __reload_pack(self, package, modules) -> list:
+        """Apply the new statements of a reloaded action pack and swap in its changed actions.
+
+        :param modules The changed modules.
+        :return The names of the actions replaced or added
+        """
+
+        self.__materialise_template()
+        self.template_key = None
+        rdbms = self.properties['database']['rdbms'].lower()
+        path = os.path.split(package.__file__)[0]
+        statements = []
+        if os.path.exists(os.path.join(path, 'schema.json')):
+            with open(os.path.join(path, 'schema.json')) as tables:
+                schema = json.load(tables)[rdbms]
+            self.migrator.upgrade(package.__name__, schema)
+            statements.extend(schema.get('tables', []))
+        with open(os.path.join(path, 'data.json')) as data:
+            statements.extend(json.load(data)[rdbms]['inserts'])
+
+        executed = self.migrator.executed_digests(package.__name__)
+        new = [statement for statement in dict.fromkeys(statements)
+               if self.migrator.digest(statement) not in executed]
+        records = self.migrator.record_statements(package.__name__, new)
+        if not executed:
+            # Imported before statements were recorded. Take the current statements as the baseline.
+            self.logger.warning(f'No statements recorded for action pack ({package.__name__}). '
+                                f'Recording its current statements as executed.')
+            new = []
+        for statement in new + records:
+            self.dao.execute_sql_statement(statement)
+        self.registry.load()
+
+        swapped = []
+        for module in modules:
+            for action in self.__create_module_actions(module):
+                self.__replace_action(action)
+                self.gates.register(action)
+                swapped.append(action.action_name)
+        self.import_action_pack_scheduling(package)
+        self.logger.info(f'Reloaded action pack ({package.__name__}). Executed ({len(new)}) new statements, '
+                         f'swapped actions {swapped}')
+        return swapped
+
+    def __replace_action(self, action):
+        """Replace the action of the same name, or add it if it is new"""
+
+        for index, existing in enumerate(self.actions):
+            if existing.action_name == action.action_name:
+                self.actions[index] = action
+                self.dispatcher.add(action)
+                return
+        self.__add_action(action)
+
+    def __run_between_ticks(self):
+        """Run the work queued for the ISM thread between ticks, e.g. swapping reloaded actions"""
+
+        while not self.between_ticks.empty():
+            work, future = self.between_ticks.get_nowait()
+            try:
+                future.set_result(work())
+            except Exception as e:
+                future.set_exception(e)
 
     def __run(self):
-        """Iterates over the array of imported actions and calls each one's
-        execute method.
+        """Dispatches the ready actions, highest priority first, one tick at a time.
 
-        Method executes in its own thread.
+        Method executes in its own thread. An unhandled exception from an action
+        dumps the flight recorder before it is raised. Checkpoints are taken
+        between ticks.
         """
 
+        interval = self.properties.get('checkpoint', {}).get('interval', None)
+        next_checkpoint = time.monotonic() + interval if interval else None
         self.properties['running'] = True
-        index = 0
-        while self.properties['running']:
-            self.actions[index].execute()
-            index += 1
-            if index >= len(self.actions):
-                index = 0
+        self.dao.begin_group_commit()
+        try:
+            while self.properties['running']:
+                state_changes = self.state_changes
+                self.dispatcher.tick(self.phase)
+                if self.clock.simulated and self.state_changes == state_changes:
+                    self.__advance_clock()
+                self.dao.commit_group()
+                if self.journal is not None:
+                    self.journal.tick()
+                self.__run_between_ticks()
+                if self.checkpoint_requested.is_set() or \
+                        (next_checkpoint and time.monotonic() >= next_checkpoint):
+                    self.__take_checkpoint()
+                    next_checkpoint = time.monotonic() + interval if interval else None
+        except Exception as e:
+            path = self.recorder.dump('unhandled_exception')
+            self.logger.error(f'Unhandled exception ({e}) in run(). Flight recorder dumped to ({path})')
+            raise
+        finally:
+            self.__run_between_ticks()
+            self.dispatcher.close_generators()
+            self.dao.end_group_commit()
+            if self.startup is not None:
+                self.startup.shutdown()
+            if self.watchdog is not None:
+                self.watchdog.stop()
+            if self.exporter is not None:
+                self.exporter.stop()
+            self.dao.close_snapshot_connections()
+            self.dao.restore_log_flushing()
+            if self.journal is not None:
+                self.journal.close()
+            self.events.publish(events.SHUTDOWN, self.phase)
+
+    def __take_checkpoint(self):
+        """Checkpoint the run and notify anyone waiting on checkpoint()"""
+
+        self.checkpoints.save(self.action_packs, self.journal)
+        # Payload files the checkpoint doesn't reference can't be needed by a resume
+        self.payloads.collect(self.dao)
+        self.checkpoint_requested.clear()
+        self.checkpoint_taken.set()
 
     # Public methods
+    def checkpoint(self, timeout=None):
+        """Checkpoint the control database so the run can be resumed.
+
+        If the main loop is running, the checkpoint is taken by the loop between dispatches
+        and the call blocks until it has been taken or the timeout expires.
+        """
+
+        if self.ism_thread is not None and self.ism_thread.is_alive():
+            self.checkpoint_taken.clear()
+            self.checkpoint_requested.set()
+            return self.checkpoint_taken.wait(timeout)
+        self.__take_checkpoint()
+        return True
+
+    def create_action(self, cls, action_name=None):
+        """Create an action sharing the context of the others and add it to those dispatched.
+
+        Many instances of the same class can be installed under different names, e.g. one per
+        entity modelled. Each needs a row in the actions table before the run starts, and before
+        it is created if it gates a phase, so the gates know whether it is active.
+
+        :return The action
+        """
+
+        action = cls(self.__get_action_args(), action_name or cls.__name__)
+        self.__add_action(action)
+        self.gates.register(action)
+        return action
+
+    def dump_flight_recorder(self) -> str:
+        """Dump the flight recorder to the run directory and return the path to the dump file"""
+
+        return self.recorder.dump()
+
     def get_database_name(self) -> str:
         """Return the database name"""
 
@@ -285,39 +795,58 @@ class ISM:
 
             The package should contain nothing else and no sub packages.
         """
-        import pkgutil
-        action_args = {
-            "dao": self.dao,
-            "properties": self.properties
-        }
+        imported = len(self.actions)
 
         try:
             # Import the package containing the actions
             package = importlib.import_module(pack)
-            # Find each action module in the package
-            for importer, modname, ispkg in pkgutil.iter_modules(package.__path__):
-                # Should not be any sub packages in there
-                if ispkg:
-                    raise MalformedActionPack(
-                        f'Passed malformed action pack ({pack}). Unexpected sub packages {modname}'
-                    )
-                # Import the module containing the action
-                module = importlib.import_module(f'{pack}.{importer.find_spec(modname).name}')
-                # Get the name of the action class, instantiate it and add to the collection of actions
-                for action in inspect.getmembers(module, inspect.isclass):
-                    if action[0] == 'BaseAction':
-                        continue
-                    if 'Action' in action[0]:
-                        cl_ = getattr(module, action[0])
-                        self.actions.append(cl_(action_args))
-
-            # Get the supporting DB file/s
-            self.import_action_pack_tables(package)
+            # Import each module containing actions
+            for name in self.__get_pack_module_names(package):
+                module = importlib.import_module(name)
+                self.pack_sources.setdefault(pack, {})[name] = self.__get_source_digest(module)
+                # Instantiate the actions and add to the collection of actions
+                for action in self.__create_module_actions(module):
+                    self.__add_action(action)
+
+            self.import_action_pack_scheduling(package)
+
+            # Get the supporting DB file/s. A resumed run already has them from the checkpoint
+            # but may need to upgrade its schema.
+            if pack not in self.resumed_packs:
+                self.import_action_pack_tables(package)
+            else:
+                self.upgrade_action_pack_tables(package)
+            self.action_packs.append(pack)
+
+            # Gating actions are registered once their rows are in the actions table
+            self.registry.load()
+            for action in self.actions[imported:]:
+                self.gates.register(action)
 
         except ModuleNotFoundError as e:
             logging.error(f'Module/s not found for argument ({pack})')
             raise
 
+    def import_action_pack_scheduling(self, package):
+        """Apply the priorities, deadlines and budgets declared in the scheduling section of the pack's data.json.
+
+        They are kept in the registry against the named action only, so other instances of its
+        class, and other ISMs, keep the values declared by the class.
+        """
+
+        path = os.path.split(package.__file__)[0]
+        for root, dirs, files in os.walk(path):
+            if 'data.json' in files:
+                with open(os.path.join(root, 'data.json')) as statements:
+                    scheduling = json.load(statements).get('scheduling', {})
+                for action in self.actions:
+                    for attribute, value in scheduling.get(action.action_name, {}).items():
+                        if attribute not in ('priority', 'deadline_ms', 'budget_ms'):
+                            raise MalformedActionPack(
+                                f'Unrecognised scheduling attribute ({attribute}) for action ({action.action_name})'
+                            )
+                        self.registry.schedule(action.action_name, attribute, value)
+
     def import_action_pack_tables(self, package):
         """"An action will typically create some tables and insert standing data.
 
@@ -332,34 +861,140 @@ class ISM:
             if 'schema.json' in files:
                 schema_file = os.path.join(root, 'schema.json')
                 with open(schema_file) as tables:
-                    data = json.load(tables)
-                    for table in data[self.properties['database']['rdbms'].lower()]['tables']:
-                        self.dao.execute_sql_statement(table)
+                    source = tables.read()
+                    schema = json.loads(source)[self.properties['database']['rdbms'].lower()]
+                    self.__execute_statements(
+                        package.__name__,
+                        source,
+                        self.migrator.create_statements(package.__name__, schema) +
+                        self.migrator.record_statements(package.__name__, schema.get('tables', []))
+                    )
 
             if 'data.json' in files:
                 data = os.path.join(root, 'data.json')
                 with open(data) as statements:
-                    inserts = json.load(statements)
-                    for insert in inserts[self.properties['database']['rdbms'].lower()]['inserts']:
-                        self.dao.execute_sql_statement(insert)
+                    source = statements.read()
+                    inserts = json.loads(source)[self.properties['database']['rdbms'].lower()]['inserts']
+                    self.__execute_statements(
+                        package.__name__, source, inserts + self.migrator.record_statements(package.__name__, inserts)
+                    )
                     inserts_found = True
 
             if not inserts_found:
                 raise MalformedActionPack(f'No insert statements found for action pack ({package})')
 
+        self.__materialise_template()
+
+    def subscribe(self, event_type: str, callback):
+        """Call callback(event) for every event of event_type.
+
+        Event types are defined in ism.core.events. Callbacks run on the ISM thread so must
+        be quick. Use ism.events.queue() to consume events on another thread.
+        """
+
+        self.events.subscribe(event_type, callback)
+
+    def unsubscribe(self, event_type: str, callback):
+        """Stop calling callback for event_type"""
+
+        self.events.unsubscribe(event_type, callback)
+
+    def upgrade_action_pack_tables(self, package):
+        """Apply any schema migrations for an action pack that are newer than the control database"""
+
+        path = os.path.split(package.__file__)[0]
+        for root, dirs, files in os.walk(path):
+            if 'schema.json' in files:
+                with open(os.path.join(root, 'schema.json')) as tables:
+                    self.migrator.upgrade(
+                        package.__name__, json.load(tables)[self.properties['database']['rdbms'].lower()]
+                    )
+
+    def query_snapshot(self, sql, params=()) -> list:
+        """Run one SELECT against a snapshot of the control database. See snapshot()"""
+
+        with self.dao.snapshot() as snapshot:
+            return snapshot.query(sql, params)
+
+    def reload_action_pack(self, pack, timeout=None) -> list:
+        """Deploy changes to an imported action pack without restarting the run.
+
+        Modules whose source has changed since they were imported are reloaded and new
+        modules imported. Their actions are swapped in between ticks, replacing those of
+        the same name. Only the schema migrations, tables and inserts the pack has added
+        since are executed, so the control database, timers and payloads are preserved.
+        Unchanged actions keep their instances and any state they hold.
+
+        :param pack The name of the action pack, as passed to import_action_pack.
+        :param timeout Seconds to wait for the running ISM to reach the end of a tick.
+        :return The names of the actions replaced or added
+        :raise ActionPackNotImported if the pack hasn't been imported into the run
+        """
+
+        if pack not in self.action_packs:
+            raise ActionPackNotImported(f'Action pack ({pack}) has not been imported into the run')
+
+        # Import the changes on the caller's thread. A module that fails to import leaves the run unchanged.
+        importlib.invalidate_caches()
+        package = importlib.import_module(pack)
+        modules = {}
+        for name in self.__get_pack_module_names(package):
+            module = sys.modules.get(name)
+            if module is None:
+                module = importlib.import_module(name)
+            elif self.__get_source_digest(module) != self.pack_sources[pack].get(name):
+                module = importlib.reload(module)
+            else:
+                continue
+            modules[module] = self.__get_source_digest(module)
+
+        def reload():
+            swapped = self.__reload_pack(package, modules)
+            self.pack_sources[pack].update({module.__name__: digest for module, digest in modules.items()})
+            return swapped
+
+        if self.ism_thread is None or not self.ism_thread.is_alive():
+            return reload()
+        future = concurrent.futures.Future()
+        self.between_ticks.put((reload, future))
+        return future.result(timeout)
+
     def set_tag(self, tag):
         """Set the user tag for the runtime directories"""
         self.properties['runtime']['tag'] = tag
 
+    def snapshot(self):
+        """Context manager yielding a read-only Snapshot of the control database.
+
+        Every query made through the snapshot sees the database as it was when it was opened.
+        Safe to use from any thread while the loop runs. Snapshots read on connections of their
+        own so they don't hold up the loop's writes. See ism.dal.snapshot.
+        """
+
+        return self.dao.snapshot()
+
     def start(self, join=False):
         """Start running the state machine main loop in the background
 
         Caller has the option to run the thread as a daemon or to join() it.
+        Once running, the control database no longer matches any template. With the journal
+        enabled, a checkpoint is taken first so the journal has a base to replay onto.
         """
 
+        self.__materialise_template()
+        self.template_key = None
+        # Pick up any changes made to the actions table with SQL before the run
+        self.registry.load()
+        if self.journal is not None:
+            self.__take_checkpoint()
+
         self.ism_thread = threading.Thread(target=self.__run, daemon=True)
         self.logger.info(f'Starting run() thread {self.ism_thread.name}')
         self.ism_thread.start()
+        if self.watchdog is not None:
+            self.watchdog.start(self.ism_thread)
+        if self.exporter is not None:
+            self.exporter.start()
         if join:
             self.ism_thread.join()
 
@@ -383,6 +1018,15 @@ class ISM:
 
         return self.properties.get('database', {}).get('db_path', 'Not found')
 
+    def wait_for_phase(self, phase: str, timeout=None) -> bool:
+        """Block until the ISM enters the execution phase or the timeout expires.
+
+        :return True if the ISM is in the phase
+        """
+
+        with self.phase_changed:
+            return self.phase_changed.wait_for(lambda: self.phase == phase, timeout)
+
     def get_execution_phase(self) -> str:
         """Get the current active execution phase.
 
@@ -0,0 +1,4 @@
+"""Benchmarks for the ISM runtime. Run each module with python -m, e.g.
+
+    python -m ism.benchmarks.bench_registry
+"""
@@ -0,0 +1,99 @@
+"""Benchmark the cost of a tick and the memory per action as the installed actions grow
+
+Installs N per-entity actions of one class, a handful of them active, and times the
+dispatcher's ticks. With the action registry the tick cost depends on the number of
+active actions, not the number installed, and the memory per action stays constant.
+
+    python -m ism.benchmarks.bench_registry [--sizes 1000 10000 100000] [--active 10] [--ticks 500]
+
+Uses the Sqlite3 properties file from the unit tests unless --properties is given.
+"""
+
+# Standard library imports
+import argparse
+import gc
+import os
+import statistics
+import time
+import tracemalloc
+
+# Local application imports
+from ism.ISM import ISM
+from ism.core.base_action import BaseAction
+
+PROPERTIES = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'tests', 'resources', 'sqlite3_properties.yaml'
+)
+
+
+class ActionBenchEntity(BaseAction):
+    """One entity's state machine. Does nothing but test whether it is active."""
+
+    __slots__ = ()
+
+    def execute(self):
+        if self.active():
+            pass
+
+
+def install(ism: ISM, size: int, active: int) -> int:
+    """Insert the rows for size entity actions, the first active of them active, and create the actions.
+
+    :return Bytes allocated per action object
+    """
+
+    ism.dao.execute_sql_statement(
+        f"INSERT INTO actions (action, execution_phase, payload, active) "
+        f"WITH RECURSIVE seq(n) AS (SELECT 0 UNION ALL SELECT n + 1 FROM seq WHERE n < {size - 1}) "
+        f"SELECT 'ActionBenchEntity' || n, 'ALL', NULL, n < {active} FROM seq"
+    )
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    for n in range(size):
+        ism.create_action(ActionBenchEntity, f'ActionBenchEntity{n}')
+    ism.registry.load()
+    allocated = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return allocated // size
+
+
+def bench(properties: str, size: int, active: int, ticks: int) -> dict:
+    """Time ticks of an ISM with size installed entity actions"""
+
+    ism = ISM({'properties_file': properties})
+    per_action = install(ism, size, active)
+    # Settle into RUNNING before timing
+    for _ in range(3):
+        ism.dispatcher.tick(ism.phase)
+    timings = []
+    for _ in range(ticks):
+        started = time.perf_counter_ns()
+        ism.dispatcher.tick(ism.phase)
+        timings.append((time.perf_counter_ns() - started) / 1000)
+    timings.sort()
+    return {
+        'installed': size,
+        'bytes_per_action': per_action,
+        'tick_mean_us': statistics.mean(timings),
+        'tick_p99_us': timings[int(len(timings) * 0.99) - 1]
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the action registry')
+    parser.add_argument('--properties', default=PROPERTIES, help='Sqlite3 properties file')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--active', type=int, default=10, help='Number of entity actions active')
+    parser.add_argument('--ticks', type=int, default=500)
+    args = parser.parse_args()
+
+    print(f'{"installed":>10} {"bytes/action":>13} {"tick mean us":>13} {"tick p99 us":>12}')
+    for size in args.sizes:
+        result = bench(args.properties, size, args.active, args.ticks)
+        print(f'{result["installed"]:>10} {result["bytes_per_action"]:>13} '
+              f'{result["tick_mean_us"]:>13.1f} {result["tick_p99_us"]:>12.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,145 @@
+"""Benchmark the shared memory ring against the file and semaphore inbound protocol
+
+A producer process sends N small messages for one action. Reports messages per second:
+    * ring - Through the ring alone, drained as fast as possible.
+    * ingest - Through an ISM running ActionIngestRing, until the consumer has them all.
+    Includes starting the ISM and the producer.
+    * files - The .json and .smp files ActionInboundTestMsg reads, written and read back
+    without an ISM, which bounds that protocol's rate from above.
+
+    python -m ism.benchmarks.bench_shm_ring [--messages 200000]
+"""
+
+# Standard library imports
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+# Local application imports
+from ism.ISM import ISM
+from ism.core.base_action import BaseAction
+from ism.packs.shm_ring.ring_buffer import RingBuffer, RingProducer
+
+PROPERTIES = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'tests', 'resources', 'sqlite3_properties.yaml'
+)
+
+
+class ActionBenchRingConsumer(BaseAction):
+    """Counts the messages in each batch and shuts the ISM down once it has them all"""
+
+    expected = 0
+    received = 0
+
+    def execute(self):
+        if self.active():
+            self.received += len(json.loads(self.get_payload()[0][0]))
+            self.clear_payload()
+            self.deactivate()
+            if self.received >= self.expected:
+                self.activate('ActionNormalShutdown')
+
+
+def produce(name: str, messages: int, action: str):
+    """Send the messages, attaching once the ring exists and backing off while it's full.
+
+    Run in a process of its own, started with --produce, as a producer would be.
+    """
+
+    while True:
+        try:
+            producer = RingProducer(name)
+            break
+        except FileNotFoundError:
+            time.sleep(0.001)
+    payload = b'{"n":1}'
+    with producer:
+        for _ in range(messages):
+            while not producer.send(action, payload):
+                time.sleep(0.0005)
+
+
+def start_producer(name: str, messages: int, action: str) -> subprocess.Popen:
+    return subprocess.Popen(
+        [sys.executable, '-m', 'ism.benchmarks.bench_shm_ring', '--produce', name, str(messages), action]
+    )
+
+
+def bench_ring(messages: int) -> float:
+    name = f'ism_bench_{os.getpid()}'
+    ring = RingBuffer(name)
+    producer = start_producer(name, messages, 'ActionBench')
+    received = len(ring.drain())
+    # Time from the first message, not the producer's start up
+    while not received:
+        time.sleep(0.0005)
+        received = len(ring.drain())
+    started = time.perf_counter()
+    while received < messages:
+        drained = len(ring.drain())
+        if not drained:
+            time.sleep(0.0005)
+        received += drained
+    elapsed = time.perf_counter() - started
+    producer.wait()
+    ring.close()
+    return messages / elapsed
+
+
+def bench_ingest(properties: str, messages: int) -> float:
+    name = f'ism_bench_{os.getpid()}'
+    ism = ISM({'properties_file': properties})
+    ism.properties['shm_ring'] = {'name': name}
+    ism.import_action_pack('ism.packs.shm_ring')
+    ism.dao.execute_sql_statement(
+        "INSERT INTO actions (action, execution_phase, payload, active) "
+        "VALUES ('ActionBenchRingConsumer', 'RUNNING', NULL, 0)"
+    )
+    consumer = ism.create_action(ActionBenchRingConsumer)
+    consumer.expected = messages
+    ism.registry.load()
+    producer = start_producer(name, messages, 'ActionBenchRingConsumer')
+    started = time.perf_counter()
+    ism.start(join=True)
+    elapsed = time.perf_counter() - started
+    producer.wait()
+    return messages / elapsed
+
+
+def bench_files(messages: int) -> float:
+    with tempfile.TemporaryDirectory() as directory:
+        started = time.perf_counter()
+        for n in range(messages):
+            with open(os.path.join(directory, f'{n}.json'), 'w') as file:
+                file.write('{"sender_id": 1, "action": "ActionBench", "payload": {"n": 1}}')
+            open(os.path.join(directory, f'{n}.smp'), 'w').close()
+        for file in [name for name in os.listdir(directory) if name.endswith('.smp')]:
+            stem = os.path.splitext(file)[0]
+            with open(os.path.join(directory, f'{stem}.json')) as message:
+                json.loads(message.read())
+            os.remove(os.path.join(directory, f'{stem}.json'))
+            os.remove(os.path.join(directory, file))
+        return messages / (time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the shared memory ring')
+    parser.add_argument('--properties', default=PROPERTIES, help='Sqlite3 properties file')
+    parser.add_argument('--messages', type=int, default=200000)
+    parser.add_argument('--produce', nargs=3, metavar=('NAME', 'MESSAGES', 'ACTION'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.produce:
+        produce(args.produce[0], int(args.produce[1]), args.produce[2])
+        return
+
+    print(f'ring    {bench_ring(args.messages):>12,.0f} messages/s')
+    print(f'ingest  {bench_ingest(args.properties, args.messages):>12,.0f} messages/s')
+    print(f'files   {bench_files(min(args.messages, 20000)):>12,.0f} messages/s')
+
+
+if __name__ == '__main__':
+    main()
@@ -8,8 +8,12 @@ So this action runs every iteration of the action stack and checks to see if any
  as the other actions in the stack might be running at that time. The only guarantee is that
  the specified interval will definitely have expired before the action is run.
 
+Recurring timers are fired from a timing wheel rather than the timers table, so checking
+them costs the timers due, not the number defined. See ism.core.recurring_timers.
+
 """
 
+from ism.core import flight_recorder
 from ism.core.base_action import BaseAction
 
 
@@ -28,10 +32,18 @@ class ActionCheckTimers(BaseAction):
             for timer in self.dao.execute_sql_query(sql, (True,)):
                 if timer[2] < epoch_millis:
                     # Timer has expired so enable the action
+                    self.record(flight_recorder.TIMER, timer[0])
                     self.set_payload(timer[0], timer[1])
                     self.activate(timer[0])
                     # Deactivate the timer in the DB
                     sql = self.dao.prepare_parameterised_statement(
                         f'UPDATE timers SET active = 0 WHERE id = ?'
                     )
-                    self.dao.execute_sql_statement(sql, (timer[3],))
+                    self.mutate('timer_expired', timer[0], sql, (timer[3],))
+
+            # Fire any recurring timers that are due
+            if self.recurring_timers is not None:
+                for action, payload in self.recurring_timers.advance():
+                    self.record(flight_recorder.TIMER, action)
+                    self.set_payload(action, payload)
+                    self.activate(action)
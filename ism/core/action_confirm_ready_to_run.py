@@ -8,18 +8,14 @@ class ActionConfirmReadyToRun(BaseAction):
     """Check if we're ready to run and if so, change state.
 
     Ready if:
-        All ActionBefore actions (if any) have completed.
+        All actions gating the RUNNING phase (if any) have completed.
     """
 
     def execute(self):
         """Execute the instructions for this action"""
         if self.active():
 
-            sql = self.dao.prepare_parameterised_statement(
-                f'SELECT action FROM actions WHERE action LIKE "ActionBefore%" AND active = ?'
-            )
-            records = self.dao.execute_sql_query(sql, (True,))
-            if len(records) > 0:
+            if not self.gates.is_open('RUNNING'):
                 return
             else:
                 # Change phase from STARTING to RUNNING
@@ -8,18 +8,14 @@ class ActionConfirmReadyToStop(BaseAction):
     """Check if we're ready to run and if so, change state.
 
     Ready if:
-        All BEFORE actions (if any) have completed.
+        All actions gating the STOPPED phase (if any) have completed.
     """
 
     def execute(self):
         """Execute the instructions for this action"""
         if self.active():
 
-            sql = self.dao.prepare_parameterised_statement(
-                f'SELECT action FROM actions WHERE action LIKE "%After%" AND active = ?'
-            )
-            records = self.dao.execute_sql_query(sql, (True,))
-            if len(records) > 0:
+            if not self.gates.is_open('STOPPED'):
                 return
             else:
                 # Change phase from to RUNNING to STOPPED
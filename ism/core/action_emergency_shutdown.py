@@ -7,11 +7,19 @@ from ism.core.base_action import BaseAction
 
 class ActionEmergencyShutdown(BaseAction):
 
+    priority = 100
+
     def execute(self):
-        """Emergency shutdown means just kill the main thread."""
+        """Emergency shutdown means just kill the main thread.
+
+        The flight recorder is dumped so there is a record of how we got here.
+        """
 
         if self.active():
 
             self.set_execution_phase('EMERGENCY_SHUTDOWN')
             self.properties['running'] = False
             self.deactivate()
+            if self.recorder is not None:
+                path = self.recorder.dump('emergency_shutdown')
+                self.logger.error(f'Emergency shutdown. Flight recorder dumped to ({path})')
@@ -7,6 +7,8 @@ from ism.core.base_action import BaseAction
 
 class ActionNormalShutdown(BaseAction):
 
+    priority = 50
+
     def execute(self):
         """Normal shutdown so activate ActionConfirmReadyToStop"""
 
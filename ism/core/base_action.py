@@ -4,21 +4,103 @@
 import logging
 import time
 
+from ism.core import flight_recorder, journal
+from ism.core.payload_store import is_reference
 from ism.exceptions.exceptions import DuplicateDataInControlDatabase, MissingDataInControlDatabase, \
     ExecutionPhaseNotFound, ExecutionPhaseUnrecognised
 
 
 class BaseAction:
+    """Parent of every action.
+
+    Actions hold a reference to the context shared by every action the ISM created with them,
+    the dao, properties and so on, rather than one reference each, and have __slots__. So an ISM
+    can have tens of thousands installed, e.g. one per entity modelled:
+
+        ism.create_action(ActionEntity, 'ActionEntity42')
+
+    Subclasses declaring __slots__ = () keep the saving. Scheduling is per class metadata.
+    """
+
+    __slots__ = ('action_name', '__context')
+
+    # Scheduling. Higher priority actions are executed first. If set, the deadline is the
+    # longest the action should wait between activation and execution and the budget
+    # overrides the watchdog's default budget for a single execute.
+    priority = 0
+    deadline_ms = None
+    budget_ms = None
+    # The phase, RUNNING or STOPPED, the ISM can't enter until this action has deactivated
+    gates_phase = None
+    # Names of the actions that must complete before this one is run on the startup pool
+    depends_on = ()
 
     def __init__(self, *args):
-        self.action_name = self.__class__.__name__
-        self.dao = args[0]['dao']
-        self.properties = args[0]['properties']
-        self.logger = logging.getLogger(self.action_name)
+        """args[0] is the context dict shared by the actions. The optional args[1] names the action,
+        which is the class name by default.
+        """
+
+        self.action_name = args[1] if len(args) > 1 else self.__class__.__name__
+        self.__context = args[0]
+
+    @property
+    def dao(self):
+        return self.__context['dao']
+
+    @property
+    def properties(self) -> dict:
+        return self.__context['properties']
+
+    @property
+    def logger(self) -> logging.Logger:
+        return logging.getLogger(self.action_name)
+
+    @property
+    def recorder(self):
+        return self.__context.get('recorder', None)
+
+    @property
+    def events(self):
+        return self.__context.get('events', None)
+
+    @property
+    def channel(self):
+        return self.__context.get('channel', None)
+
+    @property
+    def gates(self):
+        return self.__context.get('gates', None)
+
+    @property
+    def registry(self):
+        return self.__context.get('registry', None)
+
+    @property
+    def payloads(self):
+        return self.__context.get('payloads', None)
+
+    @property
+    def recurring_timers(self):
+        return self.__context.get('recurring_timers', None)
+
+    @property
+    def journal(self):
+        return self.__context.get('journal', None)
+
+    @property
+    def clock(self):
+        return self.__context.get('clock', None)
 
     def active(self) -> bool:
         """Test if the child action is activated"""
 
+        if self.registry is not None:
+            try:
+                return self.registry.is_active(self.action_name)
+            except (DuplicateDataInControlDatabase, MissingDataInControlDatabase) as e:
+                self.logger.error(e)
+                raise
+
         sql = self.dao.prepare_parameterised_statement(
             f'SELECT active, execution_phase FROM actions WHERE action = ?'
         )
@@ -53,17 +135,16 @@ class BaseAction:
 
         sql = self.dao.prepare_parameterised_statement(f'UPDATE actions SET active = ? WHERE action = ?')
         params = (True, action)
-        self.dao.execute_sql_statement(sql, params)
+        self.mutate('activate', action, sql, params)
+        self.record(flight_recorder.ACTIVATE, action)
 
     def clear_payload(self):
         """Clear the child action's payload"""
         sql = self.dao.prepare_parameterised_statement(
             'UPDATE actions SET payload = NULL WHERE action = ?'
         )
-        self.dao.execute_sql_statement(
-            sql,
-            (self.action_name,)
-        )
+        self.mutate('clear_payload', self.action_name, sql, (self.action_name,))
+        self.record(flight_recorder.PAYLOAD, self.action_name)
 
     def deactivate(self, action=None):
         """Deactivate the named action or this action by default"""
@@ -76,22 +157,62 @@ class BaseAction:
         else:
             params = (False, action)
 
-        self.dao.execute_sql_statement(sql, params)
+        self.mutate('deactivate', params[1], sql, params)
+        self.record(flight_recorder.DEACTIVATE, params[1])
+
+    def get_epoch_milliseconds(self) -> int:
+        """The time by the ISM's clock, which may be simulated. See ism.core.clock."""
 
-    @staticmethod
-    def get_epoch_milliseconds() -> int:
+        if self.clock is not None:
+            return self.clock.time_ns() // 1000000
         return int(time.time()*1000.0)
 
     def get_payload(self) -> list:
-        """Get the payload for the child action"""
+        """Get the payload for the child action. A payload in the payload store is read back as text."""
+
+        sql = self.dao.prepare_parameterised_statement(
+            'SELECT payload FROM actions WHERE action = ?'
+        )
+        rows = self.dao.execute_sql_query(
+            sql,
+            (self.action_name,)
+        )
+        if rows and is_reference(rows[0][0]):
+            return [(self.payloads.text(rows[0][0]),)]
+        return rows
+
+    def get_payload_view(self):
+        """Get the payload for the child action as a read only memoryview, or None if it has none.
+
+        A payload in the payload store is mapped from its file without copying.
+        """
 
         sql = self.dao.prepare_parameterised_statement(
             'SELECT payload FROM actions WHERE action = ?'
         )
-        return self.dao.execute_sql_query(
+        rows = self.dao.execute_sql_query(
             sql,
             (self.action_name,)
         )
+        if not rows or rows[0][0] is None:
+            return None
+        payload = rows[0][0]
+        if is_reference(payload):
+            return self.payloads.view(payload)
+        return memoryview(payload.encode('utf-8') if isinstance(payload, str) else payload)
+
+    def mutate(self, operation: str, subject: str, sql: str, params=()):
+        """Change the run's state, journalling the change first if the journal is enabled.
+
+        Changes made through mutate are replayed when the run resumes from its checkpoint.
+
+        :param operation What the change is, e.g. activate. Recorded in the journal.
+        :param subject What it's made to, e.g. the name of the action activated.
+        :param sql Prepared statement making the change.
+        :param params Params of the statement.
+        """
+
+        journal.mutate(self.journal, self.dao, operation, subject, sql, params)
 
     def set_execution_phase(self, execution_phase: str):
 
@@ -101,28 +222,60 @@ class BaseAction:
         sql = self.dao.prepare_parameterised_statement(
             f'UPDATE phases SET state = ? WHERE state = ?'
         )
-        self.dao.execute_sql_statement(sql, (False, True))
+        self.mutate('execution_phase', execution_phase, sql, (False, True))
         sql = self.dao.prepare_parameterised_statement(
             f'UPDATE phases SET state = ? WHERE execution_phase = ?;'
         )
-        self.dao.execute_sql_statement(sql, (True, execution_phase))
+        self.mutate('execution_phase', execution_phase, sql, (True, execution_phase))
+        self.record(flight_recorder.PHASE, execution_phase)
+
+    def record(self, event: int, subject: str):
+        """Record a state transition in the ISM's flight recorder and publish it to any subscribers."""
+
+        if self.recorder is not None:
+            self.recorder.record(event, subject)
+        if self.events is not None:
+            self.events.publish(flight_recorder.EVENT_NAMES[event], subject)
 
     def set_payload(self, action: str, payload: str):
         """Set the payload for the action named in the params.
 
+        Payloads over the payload store's threshold are written to the store and only a reference
+        to them is kept in the control database.
+
         :param action The name of the action to trigger.
-        :param payload JSON payload for the action.
+        :param payload JSON payload for the action. Text or bytes.
         """
+        reference = None
+        if self.payloads is not None and self.payloads.stores(payload):
+            payload = reference = self.payloads.put(payload)
         sql = self.dao.prepare_parameterised_statement(
             'UPDATE actions SET payload = ? WHERE action = ?'
         )
-        self.dao.execute_sql_statement(
-            sql,
-            (
-                payload,
-                action
-            )
-        )
+        self.mutate('set_payload', action, sql, (payload, action))
+        if reference is not None:
+            self.payloads.referenced(reference)
+        self.record(flight_recorder.PAYLOAD, action)
+
+    def cancel_recurring_timer(self, timer_id: int) -> bool:
+        """Stop a recurring timer set by set_recurring_timer
+
+        :param timer_id The id returned by set_recurring_timer.
+        :return False if there is no such timer
+        """
+
+        return self.recurring_timers.cancel(timer_id)
+
+    def set_recurring_timer(self, action: str, payload: str = None, interval_ms: int = None, cron: str = None) -> int:
+        """Set a timer to trigger an action repeatedly, until cancelled
+        :param action The name of the action to trigger.
+        :param payload JSON payload for the action.
+        :param interval_ms Milliseconds between triggers. Either this or cron.
+        :param cron Cron schedule of the triggers, e.g. '*/5 * * * *'. Either this or interval_ms.
+        :return The id of the timer, for cancel_recurring_timer
+        """
+
+        return self.recurring_timers.create(action, payload, interval_ms, cron)
 
     def set_timer(self, action: str, payload: str, expiry: int):
         """Set a timer to trigger an action after expiry
@@ -132,20 +285,12 @@ class BaseAction:
         """
 
         sql = self.dao.prepare_parameterised_statement(
-            'UPDATE timers SET action = ?, payload = ?, expiry = ?'
-        )
-        self.dao.execute_sql_statement(
-            sql,
-            (
-                action,
-                payload,
-                expiry
-            )
+            'INSERT INTO timers (active, action, payload, expiry) VALUES (?, ?, ?, ?)'
         )
+        self.mutate('set_timer', action, sql, (True, action, payload, expiry))
 
-    @staticmethod
-    def set_timer_expiry(hours=None, seconds=None, milliseconds=None) -> int:
-        """Calculate the expiry time for a timer, offset from now
+    def set_timer_expiry(self, hours=None, seconds=None, milliseconds=None) -> int:
+        """Calculate the expiry time for a timer, offset from now by the ISM's clock
 
         :param hours The interval expressed in hours
         :param seconds The interval expressed in seconds
@@ -154,12 +299,12 @@ class BaseAction:
         """
 
         if hours:
-            return int((time.time() * 1000) + (hours * 60 * 60 * 1000))
+            return int(self.get_epoch_milliseconds() + (hours * 60 * 60 * 1000))
         elif seconds:
             seconds *= 1000
-            return int((time.time() * 1000) + seconds)
+            return int(self.get_epoch_milliseconds() + seconds)
         elif milliseconds:
-            return int((time.time() * 1000) + milliseconds)
+            return int(self.get_epoch_milliseconds() + milliseconds)
         else:
             raise RuntimeError('Duration expected but got None')
 
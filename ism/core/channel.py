@@ -0,0 +1,79 @@
+"""In-process request / reply channel into a running ISM
+
+Code running in the same process as the ISM, such as the unit tests, can send messages
+to the state machine's actions without the file and semaphore round trip through the
+inbound and outbound directories. Messages have the same format as the test support
+message files:
+
+{
+    action: "NameOfAction",
+    payload: {sender_id: integer, ...}
+}
+
+A reply is any payload sent back for the sender_id of a pending message. e.g.
+
+    reply = ism.channel.request(message, timeout=5)
+"""
+
+# Standard library imports
+import concurrent.futures
+import queue
+import threading
+
+
+class MessageChannel:
+    """Thread safe inbound queue with replies matched to senders by sender_id."""
+
+    def __init__(self):
+        self.__inbound = queue.SimpleQueue()
+        self.__pending = {}
+        self.__lock = threading.Lock()
+
+    def receive(self) -> list:
+        """Drain the inbound messages without blocking. Called on the ISM thread."""
+
+        messages = []
+        while True:
+            try:
+                messages.append(self.__inbound.get_nowait())
+            except queue.Empty:
+                return messages
+
+    def reply(self, sender_id, payload) -> bool:
+        """Complete the pending request for sender_id with payload.
+
+        :return False if no request from sender_id is waiting for a reply
+        """
+
+        with self.__lock:
+            future = self.__pending.pop(sender_id, None)
+        if future is None:
+            return False
+        future.set_result(payload)
+        return True
+
+    def request(self, message: dict, timeout=None) -> dict:
+        """Send a message and block until its reply arrives.
+
+        A request that times out stops waiting, so a late reply to it isn't matched.
+
+        :raise concurrent.futures.TimeoutError if there is no reply within timeout
+        """
+
+        future = self.send(message)
+        try:
+            return future.result(timeout)
+        finally:
+            sender_id = message['payload']['sender_id']
+            with self.__lock:
+                if self.__pending.get(sender_id) is future:
+                    del self.__pending[sender_id]
+
+    def send(self, message: dict) -> concurrent.futures.Future:
+        """Send a message and return a future for its reply"""
+
+        future = concurrent.futures.Future()
+        with self.__lock:
+            self.__pending[message['payload']['sender_id']] = future
+        self.__inbound.put(message)
+        return future
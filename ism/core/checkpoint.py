@@ -0,0 +1,116 @@
+"""Checkpoint the state of a run so that it can be resumed after a crash
+
+A checkpoint is taken between dispatches, so it never captures an action half way
+through its execute method. It consists of:
+    * A copy of the control database. Taken with the Sqlite3 backup API or, for MySql,
+    copied into a sibling database named <run_db>_checkpoint.
+    * A manifest (checkpoint.json) recording the execution phase, the imported action
+    packs and the pending timers at the time of the checkpoint.
+    * With the journal enabled, the journal segment the changes since the checkpoint are
+    written to. The segments before it are deleted. See ism.core.journal.
+
+Both are written beneath the run directory:
+    <run_dir>/checkpoint/checkpoint.json
+    <run_dir>/checkpoint/<db_name>
+"""
+
+# Standard library imports
+import json
+import logging
+import os
+
+# Local application imports
+from ism.core.clock import SystemClock
+from ism.exceptions.exceptions import CheckpointNotFound
+
+
+class Checkpoint:
+    """Save and restore checkpoints for a run.
+
+    Attributes
+    ----------
+    directory: str
+        The checkpoint directory beneath the run directory.
+    dao: DAOInterface
+        The DAO for the run's control database.
+    properties: dict
+        The ISM properties.
+    clock: SystemClock
+        Or SimulatedClock, whose time the manifest is stamped with. See ism.core.clock.
+    """
+
+    MANIFEST = 'checkpoint.json'
+
+    def __init__(self, dao, properties, clock=None):
+        self.dao = dao
+        self.properties = properties
+        self.clock = clock if clock is not None else SystemClock()
+        self.directory = f'{properties["runtime"]["run_dir"]}{os.path.sep}checkpoint'
+        self.logger = logging.getLogger('ism.checkpoint.Checkpoint')
+
+    def exists(self) -> bool:
+        """Test if a checkpoint has been taken for the run"""
+        return os.path.exists(f'{self.directory}{os.path.sep}{self.MANIFEST}')
+
+    def load(self) -> dict:
+        """Read the manifest of the last checkpoint"""
+
+        if not self.exists():
+            raise CheckpointNotFound(f'No checkpoint found in ({self.directory})')
+        with open(f'{self.directory}{os.path.sep}{self.MANIFEST}') as file:
+            return json.load(file)
+
+    def restore(self) -> dict:
+        """Restore the control database from the last checkpoint and return the manifest"""
+
+        manifest = self.load()
+        self.dao.restore_database(manifest['database'])
+        self.logger.info(f'Restored control database from checkpoint taken at ({manifest["created"]})')
+        return manifest
+
+    def save(self, action_packs: list, journal=None) -> dict:
+        """Take a checkpoint of the control database
+
+        The database copy is written first and the manifest replaced afterwards, so a
+        crash part way through leaves the previous checkpoint intact.
+
+        :param action_packs The names of the action packs imported into the run.
+        :param journal The run's Journal, if enabled. Compacted by the checkpoint.
+        :return The manifest
+        """
+
+        if journal is not None:
+            with journal.lock:
+                manifest = self.__save(action_packs, journal)
+            # Only the segments since the manifest's are needed to replay onto its database
+            journal.prune(manifest['journal'])
+            return manifest
+        return self.__save(action_packs)
+
+    # Private methods
+    def __save(self, action_packs: list, journal=None) -> dict:
+        os.makedirs(self.directory, exist_ok=True)
+        if self.properties['database']['rdbms'].lower() == 'sqlite3':
+            target = f'{self.directory}{os.path.sep}{self.properties["database"]["db_name"]}'
+        else:
+            target = f'{self.properties["database"]["run_db"]}_checkpoint'
+        self.dao.backup_database(target)
+
+        sql = self.dao.prepare_parameterised_statement(
+            'SELECT action, payload, expiry FROM timers WHERE active = ?'
+        )
+        manifest = {
+            'created': self.clock.time_ns() // 1000000,
+            'database': target,
+            'execution_phase': self.dao.execute_sql_query('SELECT execution_phase FROM phases WHERE state = 1')[0][0],
+            'action_packs': action_packs,
+            'pending_timers': [list(timer) for timer in self.dao.execute_sql_query(sql, (True,))],
+            'journal': journal.rotate() if journal is not None else None
+        }
+
+        path = f'{self.directory}{os.path.sep}{self.MANIFEST}'
+        with open(f'{path}.tmp', 'w') as file:
+            json.dump(manifest, file)
+        os.replace(f'{path}.tmp', path)
+        self.logger.debug(f'Checkpoint taken in phase ({manifest["execution_phase"]})')
+        return manifest
@@ -0,0 +1,83 @@
+"""The clock the timers and actions tell the time by
+
+The ISM's timers, recurring timers and BaseAction's time functions read the time from
+its clock, shared with the actions as self.clock. The system clock is the default.
+
+With a simulated clock, time only moves when the clock is advanced. The ISM advances it
+whenever a tick changes nothing, jumping straight to the next timer or recurring timer
+deadline. So a scenario of hour long timers runs as fast as the loop can execute its
+actions, and the same way every time. Enable it in the properties file:
+
+    clock:
+      # system or simulated
+      mode: simulated
+      # Optional. Epoch milliseconds the simulated clock starts at. Now by default
+      start_ms: 1700000000000
+
+An action waiting on the time without a timer, e.g. polling get_epoch_milliseconds, sees
+the time stand still unless something advances the clock. Tests can with advance().
+The watchdog, deadlines, metrics and checkpoint intervals measure the loop's real
+performance so always use the system's time.
+"""
+
+# Standard library imports
+import datetime
+import threading
+import time
+
+
+class SystemClock:
+    """The system's wall clock and monotonic clock"""
+
+    simulated = False
+
+    @staticmethod
+    def monotonic_ns() -> int:
+        return time.monotonic_ns()
+
+    @staticmethod
+    def now() -> datetime.datetime:
+        """Local wall clock time"""
+        return datetime.datetime.now()
+
+    @staticmethod
+    def time_ns() -> int:
+        """Epoch nanoseconds"""
+        return time.time_ns()
+
+
+class SimulatedClock:
+    """A clock that only moves when advanced. Its monotonic clock reads the same as its wall clock.
+
+    Attributes
+    ----------
+    start_ms: int
+        Epoch milliseconds the clock starts at. The system's time by default.
+    """
+
+    simulated = True
+
+    def __init__(self, start_ms=None):
+        self.__epoch_ns = time.time_ns() if start_ms is None else int(start_ms) * 1000000
+        self.__elapsed_ns = 0
+        self.__lock = threading.Lock()
+
+    def advance(self, ns: int):
+        """Move the clock forward ns nanoseconds"""
+
+        if ns < 0:
+            raise ValueError(f'The simulated clock can\'t go back ({ns})ns')
+        with self.__lock:
+            self.__elapsed_ns += int(ns)
+
+    def monotonic_ns(self) -> int:
+        return self.time_ns()
+
+    def now(self) -> datetime.datetime:
+        """Local wall clock time"""
+        return datetime.datetime.fromtimestamp(self.time_ns() / 1e9)
+
+    def time_ns(self) -> int:
+        """Epoch nanoseconds"""
+        return self.__epoch_ns + self.__elapsed_ns
+
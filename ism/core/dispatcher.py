@@ -0,0 +1,188 @@
+"""Dispatch the ready actions in priority order
+
+Each tick the dispatcher asks the action registry which actions are active in the
+current execution phase, then calls their execute methods highest priority first.
+Actions of equal priority run in the order they were registered.
+
+An action declares its priority, an optional deadline and an optional watchdog budget
+as class attributes, or in the scheduling section of its action pack's data.json:
+
+    "scheduling": {
+        "ActionName": {"priority": 10, "deadline_ms": 50, "budget_ms": 200}
+    }
+
+If an action with a higher priority than the rest of the tick is activated part way
+through a tick, the tick ends early so that it runs next. The deadline is the longest
+an action should wait between being activated and being executed. Misses are logged
+and counted in the ism_deadline_misses_total metric.
+
+An action's execute method may be a generator, so that long running work can be time
+sliced. The first dispatch runs it to its first yield and each later dispatch of the
+action resumes it to the next, until it returns. As with any action, it is only
+dispatched while active, so deactivating it part way through pauses it.
+
+During STARTING, the actions gating RUNNING are handed to the startup pool, if there
+is one, rather than executed on the ISM thread. See ism.core.startup.
+
+If the ISM has a watchdog, it is told which action is executing. When an action overruns
+its budget the watchdog's verdict is carried out once execute returns.
+"""
+
+# Standard library imports
+import inspect
+import logging
+import time
+
+# Local application imports
+from ism.core import events, flight_recorder, watchdog
+
+
+class Dispatcher:
+    """Runs one tick of the state machine at a time.
+
+    Attributes
+    ----------
+    registry: ActionRegistry
+        The installed actions and their active flags.
+    metrics: Metrics
+        Where deadline misses are counted.
+    recorder: FlightRecorder
+        Records each dispatch.
+    watchdog: Watchdog
+        Optional. Enforces the time budget of each dispatch.
+    startup: StartupPool
+        Optional. Executes the startup actions concurrently.
+    """
+
+    def __init__(self, registry, event_bus, metrics, recorder, watchdog=None, startup=None):
+        self.registry = registry
+        self.metrics = metrics
+        self.recorder = recorder
+        self.watchdog = watchdog
+        self.startup = startup
+        self.logger = logging.getLogger('ism.dispatcher.Dispatcher')
+        self.activated = {}
+        self.generators = {}
+        # Counted without a lock for the metrics exporter. Only the ISM thread writes them.
+        self.ticks = 0
+        self.executions = {}
+        self.preempt = None
+        event_bus.subscribe(events.ACTIVATE, self.__on_activate)
+
+    def add(self, action):
+        """Add an action to those dispatched. Replaces any action of the same name."""
+
+        self.registry.add(action)
+        self.close_generator(action.action_name)
+
+    def close_generator(self, action_name: str):
+        """Close the action's generator if it is part way through"""
+
+        generator = self.generators.pop(action_name, None)
+        if generator is not None:
+            generator.close()
+
+    def close_generators(self):
+        """Close every generator part way through. e.g. when the main loop stops."""
+
+        for action_name in list(self.generators):
+            self.close_generator(action_name)
+
+    def ready(self, execution_phase: str) -> list:
+        """The actions active in the execution phase, highest priority first"""
+
+        ready = self.registry.ready(execution_phase)
+        scheduling = self.registry.scheduling
+        ready.sort(key=lambda ready_action: (-scheduling(ready_action[1], 'priority'), ready_action[0]))
+        return [action for action_id, action in ready]
+
+    def tick(self, execution_phase: str) -> int:
+        """Execute each ready action once, highest priority first.
+
+        :return The number of actions executed
+        """
+
+        self.preempt = None
+        self.ticks += 1
+        if self.startup is not None:
+            self.startup.reap()
+        ready = self.ready(execution_phase)
+        for index, action in enumerate(ready):
+            if self.startup is not None and self.startup.accepts(action, execution_phase):
+                if self.startup.submit(action):
+                    self.__dispatched(action)
+                continue
+            self.__dispatched(action)
+            self.__execute(action)
+            if self.preempt is not None and index + 1 < len(ready) and \
+                    self.preempt > self.registry.scheduling(ready[index + 1], 'priority'):
+                return index + 1
+        return len(ready)
+
+    # Private methods
+    def __execute(self, action):
+        """Execute the action under the watchdog, if there is one, and carry out its verdict"""
+
+        if self.watchdog is None:
+            self.__step(action)
+            return
+
+        self.watchdog.begin(action, self.registry.scheduling(action, 'budget_ms'))
+        try:
+            self.__step(action)
+        finally:
+            verdict = self.watchdog.end()
+        if verdict == watchdog.DEACTIVATE:
+            self.logger.warning(f'Deactivating action ({action.action_name}) after it overran its budget')
+            action.deactivate()
+        elif verdict == watchdog.EMERGENCY_SHUTDOWN:
+            self.logger.error(f'Emergency shutdown after action ({action.action_name}) overran its budget')
+            action.activate('ActionEmergencyShutdown')
+
+    def __step(self, action):
+        """Call execute, or advance the generator a previous call to execute returned"""
+
+        generator = self.generators.get(action.action_name)
+        if generator is None:
+            generator = action.execute()
+            if not inspect.isgenerator(generator):
+                return
+            self.generators[action.action_name] = generator
+        try:
+            next(generator)
+        except StopIteration:
+            del self.generators[action.action_name]
+        except Exception:
+            del self.generators[action.action_name]
+            raise
+
+    def __dispatched(self, action):
+        """Check the action's deadline and record and count its dispatch"""
+
+        self.__check_deadline(action)
+        self.recorder.record(flight_recorder.DISPATCH, action.action_name)
+        self.executions[action.action_name] = self.executions.get(action.action_name, 0) + 1
+
+    def __check_deadline(self, action):
+        """Report the action if it has waited longer than its deadline since it was activated"""
+
+        activated = self.activated.pop(action.action_name, None)
+        deadline_ms = self.registry.scheduling(action, 'deadline_ms')
+        if activated is None or deadline_ms is None:
+            return
+        waited = (time.monotonic_ns() - activated) / 1000000
+        if waited > deadline_ms:
+            self.metrics.increment('ism_deadline_misses_total', {'action': action.action_name})
+            self.logger.warning(f'Action ({action.action_name}) missed its deadline. Waited ({waited:.3f})ms, '
+                                f'deadline ({deadline_ms})ms')
+
+    def __on_activate(self, event):
+        """Note when an action was activated and whether it should preempt the current tick"""
+
+        action = self.registry.get(event.subject)
+        if action is None:
+            return
+        self.activated.setdefault(event.subject, event.timestamp_ns)
+        priority = self.registry.scheduling(action, 'priority')
+        if self.preempt is None or priority > self.preempt:
+            self.preempt = priority
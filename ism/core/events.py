@@ -0,0 +1,139 @@
+"""Push based notification of changes in the state machine
+
+External code can subscribe to the state changes the ISM makes instead of polling
+the control database or the file system. Events are published for:
+    * activate - An action was activated. Subject is the action name.
+    * deactivate - An action was deactivated. Subject is the action name.
+    * payload - An action's payload was set or cleared. Subject is the action name.
+    * timer - A timer fired. Subject is the action the timer activates.
+    * phase - The execution phase changed. Subject is the new phase.
+    * shutdown - The main loop exited. Subject is the execution phase it stopped in.
+
+Callbacks are called on the thread that made the change, usually the ISM thread,
+so they must be quick and must not block. Consumers on other threads should use
+a queue instead:
+
+    with ism.events.queue(['phase', 'shutdown']) as events:
+        for event in events:
+            ...
+"""
+
+# Standard library imports
+import collections
+import logging
+import queue
+import threading
+import time
+
+ACTIVATE = 'activate'
+DEACTIVATE = 'deactivate'
+PAYLOAD = 'payload'
+TIMER = 'timer'
+PHASE = 'phase'
+SHUTDOWN = 'shutdown'
+
+EVENT_TYPES = (ACTIVATE, DEACTIVATE, PAYLOAD, TIMER, PHASE, SHUTDOWN)
+
+Event = collections.namedtuple('Event', ['type', 'subject', 'timestamp_ns'])
+
+
+class EventBus:
+    """Deliver state change events to subscribed callbacks."""
+
+    def __init__(self):
+        self.logger = logging.getLogger('ism.events.EventBus')
+        self.__lock = threading.Lock()
+        self.__subscribers = {event_type: () for event_type in EVENT_TYPES}
+
+    def publish(self, event_type: str, subject: str):
+        """Deliver an event to the callbacks subscribed to its type.
+
+        A callback that raises is logged and doesn't stop delivery to the others.
+        """
+
+        subscribers = self.__subscribers[event_type]
+        if not subscribers:
+            return
+        event = Event(event_type, subject, time.monotonic_ns())
+        for callback in subscribers:
+            try:
+                callback(event)
+            except Exception as e:
+                self.logger.error(f'Subscriber ({callback}) failed handling event ({event}). ({e})')
+
+    def queue(self, event_types=None, maxsize=0):
+        """Subscribe a thread safe queue to the event types, all of them by default"""
+        return EventQueue(self, event_types or EVENT_TYPES, maxsize)
+
+    def subscribe(self, event_type: str, callback):
+        """Call callback(event) for every event of event_type"""
+
+        if event_type not in EVENT_TYPES:
+            raise ValueError(f'Unrecognised event type ({event_type}). Expected one of {EVENT_TYPES}')
+        # Copy on write so publish() can read the subscribers without taking the lock
+        with self.__lock:
+            self.__subscribers[event_type] = self.__subscribers[event_type] + (callback,)
+
+    def unsubscribe(self, event_type: str, callback):
+        """Stop calling callback for event_type"""
+
+        with self.__lock:
+            self.__subscribers[event_type] = tuple(
+                subscriber for subscriber in self.__subscribers[event_type] if subscriber != callback
+            )
+
+
+class EventQueue:
+    """A thread safe queue of events, for consumers on another thread.
+
+    Iterating blocks for the next event until the queue is closed. If maxsize is
+    set and the consumer falls behind, new events are dropped and counted rather
+    than blocking the ISM thread.
+    """
+
+    __CLOSED = object()
+
+    def __init__(self, bus, event_types, maxsize=0):
+        self.bus = bus
+        self.event_types = list(event_types)
+        self.dropped = 0
+        self.maxsize = maxsize
+        self.__queue = queue.Queue()
+        for event_type in self.event_types:
+            self.bus.subscribe(event_type, self.__put)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def __iter__(self):
+        while True:
+            event = self.__queue.get()
+            if event is self.__CLOSED:
+                return
+            yield event
+
+    def close(self):
+        """Unsubscribe from the bus and end any iteration"""
+
+        for event_type in self.event_types:
+            self.bus.unsubscribe(event_type, self.__put)
+        self.__queue.put(self.__CLOSED)
+
+    def get(self, timeout=None) -> Event:
+        """Return the next event, raising queue.Empty if none arrives within timeout"""
+
+        event = self.__queue.get(timeout=timeout)
+        if event is self.__CLOSED:
+            self.__queue.put(self.__CLOSED)
+            raise queue.Empty()
+        return event
+
+    # Private methods
+    def __put(self, event):
+        if self.maxsize and self.__queue.qsize() >= self.maxsize:
+            self.dropped += 1
+        else:
+            self.__queue.put(event)
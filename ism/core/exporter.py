@@ -0,0 +1,158 @@
+"""Serve the ISM's metrics in the Prometheus text format
+
+Enabled by a metrics section in the properties file. ISM.start() starts the exporter
+on its own thread, serving GET /metrics over a local TCP port or a Unix socket:
+
+    metrics:
+      enabled: True
+      host: 127.0.0.1
+      # 0 picks a free port. See MetricsExporter.address
+      port: 9464
+      # Or serve on a Unix socket instead of a port
+      # socket: /tmp/ism/metrics.sock
+
+Samples are collected when scraped, on the exporter's thread, so the only cost to the
+ISM thread is the counters it keeps anyway.
+"""
+
+# Standard library imports
+import http.server
+import logging
+import os
+import socketserver
+import threading
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+HELP = {
+    'ism_action_executions_total': 'Dispatches of each action.',
+    'ism_active_actions': 'Actions currently active, in any phase.',
+    'ism_db_statement_seconds_total': 'Total time spent executing SQL, by kind.',
+    'ism_db_statements_total': 'SQL queries and statements executed, by kind.',
+    'ism_deadline_misses_total': 'Dispatches that waited longer than the action deadline.',
+    'ism_phase': 'The current execution phase. 1 for the current phase.',
+    'ism_ready_actions': 'Actions ready to dispatch in the current phase.',
+    'ism_recurring_timer_drift_seconds': 'How late the latest recurring timer firing was.',
+    'ism_recurring_timer_drift_seconds_total': 'Total lateness of the recurring timer firings.',
+    'ism_recurring_timer_firings_total': 'Recurring timer firings.',
+    'ism_recurring_timer_missed_total': 'Recurring timer firings skipped because the loop stalled past them.',
+    'ism_recurring_timers': 'Recurring timers scheduled.',
+    'ism_ticks_per_second': 'Main loop ticks per second since the previous scrape.',
+    'ism_ticks_total': 'Main loop ticks.',
+    'ism_timer_lag_seconds': 'How long the oldest overdue timer has been overdue.',
+    'ism_timers_overdue': 'Active timers past their expiry.',
+    'ism_timers_pending': 'Active timers.',
+    'ism_watchdog_overruns_total': 'Dispatches that overran the watchdog budget.'
+}
+
+
+def _escape(label) -> str:
+    return str(label).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def render(samples) -> str:
+    """Render (name, type, labels, value) samples in the Prometheus text format. Samples of a name must be adjacent."""
+
+    lines = []
+    previous = None
+    for name, metric_type, labels, value in samples:
+        if name != previous:
+            if name in HELP:
+                lines.append(f'# HELP {name} {HELP[name]}')
+            lines.append(f'# TYPE {name} {metric_type}')
+            previous = name
+        if labels:
+            label_text = ','.join(f'{key}="{_escape(label)}"' for key, label in sorted(labels.items()))
+            lines.append(f'{name}{{{label_text}}} {value}')
+        else:
+            lines.append(f'{name} {value}')
+    return '\n'.join(lines) + '\n'
+
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        if self.path.split('?')[0] not in ('/', '/metrics'):
+            self.send_error(404)
+            return
+        try:
+            body = render(self.server.collect()).encode('utf-8')
+        except Exception as e:
+            logging.getLogger('ism.exporter.MetricsExporter').error(f'Failed collecting metrics. ({e})')
+            self.send_error(500)
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', CONTENT_TYPE)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        """Scrapes aren't logged"""
+        pass
+
+
+class _TCPServer(socketserver.ThreadingMixIn, http.server.HTTPServer):
+    daemon_threads = True
+
+
+class _UnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+class MetricsExporter:
+    """HTTP endpoint serving the samples returned by collect.
+
+    Attributes
+    ----------
+    collect: callable
+        Returns the samples as (name, type, labels, value), grouped by name.
+    host: str
+        Interface the TCP port is bound to.
+    port: int
+        TCP port. 0 picks a free one.
+    socket_path: str
+        Optional. Serve on this Unix socket instead of the TCP port.
+    """
+
+    def __init__(self, collect, host='127.0.0.1', port=9464, socket_path=None):
+        self.collect = collect
+        self.host = host
+        self.port = port
+        self.socket_path = socket_path
+        self.logger = logging.getLogger('ism.exporter.MetricsExporter')
+        self.server = None
+        self.thread = None
+
+    @property
+    def address(self):
+        """The socket path, or (host, port) actually bound"""
+        return self.socket_path if self.socket_path else self.server.server_address[:2]
+
+    def start(self):
+        """Bind the endpoint and serve it on a daemon thread"""
+
+        if self.socket_path:
+            if os.path.exists(self.socket_path):
+                os.remove(self.socket_path)
+            self.server = _UnixServer(self.socket_path, _Handler)
+        else:
+            self.server = _TCPServer((self.host, self.port), _Handler)
+        self.server.collect = self.collect
+        # A short poll so stop() doesn't hold up the ISM thread's exit
+        self.thread = threading.Thread(
+            target=self.server.serve_forever, args=(0.05,), name='ism-metrics', daemon=True
+        )
+        self.thread.start()
+        self.logger.info(f'Serving metrics on ({self.address})')
+
+    def stop(self):
+        """Stop serving and release the port or socket"""
+
+        if self.server is None:
+            return
+        self.server.shutdown()
+        self.server.server_close()
+        if self.socket_path and os.path.exists(self.socket_path):
+            os.remove(self.socket_path)
+        self.server = None
@@ -0,0 +1,144 @@
+"""In-memory flight recorder of state transitions
+
+Debug logging is too expensive to leave on for a production run, so when a run
+hits an emergency shutdown we usually have very little idea of how it got there.
+The flight recorder keeps a fixed size ring buffer of the most recent state
+transitions, each stamped with time.monotonic_ns(). Recording an event is a
+couple of list assignments so it can stay on for every run.
+
+The buffer is dumped to a compact binary file in the run directory on emergency
+shutdown, on an unhandled exception in the main loop or on demand. Decode a dump
+with read_flight_record() or from the command line:
+
+    python -m ism.core.flight_recorder <dump file>
+
+File format (little endian):
+    header  - magic (8s), wall clock ns (q), monotonic ns (q) at the time of the dump,
+              string count (I), record count (I)
+    strings - length (H) followed by the utf-8 bytes, once for each distinct subject
+    records - monotonic ns (q), event code (B), string index (I)
+"""
+
+# Standard library imports
+import collections
+import os
+import struct
+import sys
+import time
+
+DISPATCH = 0
+ACTIVATE = 1
+DEACTIVATE = 2
+PAYLOAD = 3
+TIMER = 4
+PHASE = 5
+
+EVENT_NAMES = ('dispatch', 'activate', 'deactivate', 'payload', 'timer', 'phase')
+
+MAGIC = b'ISMFR001'
+HEADER = struct.Struct('<8sqqII')
+STRING_LENGTH = struct.Struct('<H')
+RECORD = struct.Struct('<qBI')
+
+FlightRecord = collections.namedtuple('FlightRecord', ['timestamp_ns', 'event', 'subject'])
+
+
+class FlightRecorder:
+    """Fixed size ring buffer of state transitions.
+
+    Attributes
+    ----------
+    size: int
+        The number of records held before the oldest is overwritten.
+    dump_dir: str
+        Directory the dump files are written to.
+    """
+
+    def __init__(self, size, dump_dir):
+        self.size = size
+        self.dump_dir = dump_dir
+        self.__times = [0] * size
+        self.__events = [0] * size
+        self.__subjects = [''] * size
+        self.__count = 0
+
+    def record(self, event: int, subject: str = ''):
+        """Record an event in the ring buffer, overwriting the oldest record if full."""
+
+        if self.size:
+            index = self.__count % self.size
+            self.__times[index] = time.monotonic_ns()
+            self.__events[index] = event
+            self.__subjects[index] = subject
+            self.__count += 1
+
+    def records(self) -> list:
+        """Return the buffered records, oldest first."""
+
+        count = min(self.__count, self.size)
+        start = self.__count - count
+        return [
+            FlightRecord(self.__times[i % self.size], EVENT_NAMES[self.__events[i % self.size]],
+                         self.__subjects[i % self.size])
+            for i in range(start, start + count)
+        ]
+
+    def dump(self, reason: str = 'on_demand') -> str:
+        """Write the buffered records to a binary file in the dump directory.
+
+        :param reason Used as the prefix of the file name. e.g. emergency_shutdown
+        :return The path to the dump file
+        """
+
+        records = self.records()
+        strings = {}
+        for record in records:
+            strings.setdefault(record.subject, len(strings))
+
+        os.makedirs(self.dump_dir, exist_ok=True)
+        path = f'{self.dump_dir}{os.path.sep}{reason}_{time.time_ns()}.fr'
+        with open(path, 'wb') as file:
+            file.write(HEADER.pack(MAGIC, time.time_ns(), time.monotonic_ns(), len(strings), len(records)))
+            for subject in strings:
+                encoded = subject.encode('utf-8')
+                file.write(STRING_LENGTH.pack(len(encoded)))
+                file.write(encoded)
+            codes = {name: code for code, name in enumerate(EVENT_NAMES)}
+            file.write(b''.join(
+                RECORD.pack(record.timestamp_ns, codes[record.event], strings[record.subject])
+                for record in records
+            ))
+        return path
+
+
+def read_flight_record(path) -> list:
+    """Decode a flight recorder dump.
+
+    :param path The dump file written by FlightRecorder.dump()
+    :return FlightRecord tuples, oldest first, with timestamps converted to wall clock epoch nanoseconds
+    """
+
+    with open(path, 'rb') as file:
+        data = file.read()
+
+    magic, wall_ns, monotonic_ns, string_count, record_count = HEADER.unpack_from(data, 0)
+    if magic != MAGIC:
+        raise ValueError(f'File ({path}) is not a flight recorder dump')
+
+    offset = HEADER.size
+    strings = []
+    for _ in range(string_count):
+        length, = STRING_LENGTH.unpack_from(data, offset)
+        offset += STRING_LENGTH.size
+        strings.append(data[offset:offset + length].decode('utf-8'))
+        offset += length
+
+    records = []
+    for timestamp, code, index in RECORD.iter_unpack(data[offset:offset + record_count * RECORD.size]):
+        records.append(FlightRecord(wall_ns - (monotonic_ns - timestamp), EVENT_NAMES[code], strings[index]))
+    return records
+
+
+if __name__ == '__main__':
+    for entry in read_flight_record(sys.argv[1]):
+        print(f'{entry.timestamp_ns / 1e9:.6f} {entry.event:<10} {entry.subject}')
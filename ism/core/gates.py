@@ -0,0 +1,107 @@
+"""Track the actions that must complete before a phase transition
+
+The ISM only moves from STARTING to RUNNING once every startup action has finished,
+and from NORMAL_SHUTDOWN to STOPPED once every shutdown action has. An action registers
+for this by naming the phase it gates in the gates_phase class attribute:
+
+    class ActionBeforeLoadReferenceData(BaseAction):
+        gates_phase = 'RUNNING'
+
+The gates keep the set of active gating actions for each phase, updated from the
+activate and deactivate events, so ActionConfirmReadyToRun and ActionConfirmReadyToStop
+check whether a phase is open in constant time instead of querying the control database.
+Changes made to the actions table with SQL directly, rather than through BaseAction,
+aren't seen.
+
+Action packs written before gates_phase are still recognised by name, ActionBefore*
+gating RUNNING and *After* gating STOPPED, with a warning.
+"""
+
+# Standard library imports
+import logging
+import threading
+
+# Local application imports
+from ism.core import events
+
+RUNNING = 'RUNNING'
+STOPPED = 'STOPPED'
+
+
+class Gates:
+    """The outstanding gating actions for each phase."""
+
+    def __init__(self, dao, event_bus):
+        self.dao = dao
+        self.logger = logging.getLogger('ism.gates.Gates')
+        self.__lock = threading.Lock()
+        self.__registered = {}
+        self.__outstanding = {RUNNING: set(), STOPPED: set()}
+        event_bus.subscribe(events.ACTIVATE, self.__on_activate)
+        event_bus.subscribe(events.DEACTIVATE, self.__on_deactivate)
+
+    def gated_phase(self, action):
+        """The phase the action must complete before, or None if it isn't a gating action"""
+
+        if action.gates_phase is not None:
+            if action.gates_phase not in self.__outstanding:
+                raise ValueError(
+                    f'Action ({action.action_name}) gates unrecognised phase ({action.gates_phase}). '
+                    f'Expected one of {tuple(self.__outstanding)}'
+                )
+            return action.gates_phase
+        if action.action_name.startswith('ActionBefore'):
+            phase = RUNNING
+        elif 'After' in action.action_name:
+            phase = STOPPED
+        else:
+            return None
+        self.logger.warning(f'Action ({action.action_name}) gates phase ({phase}) by its name. '
+                            f'Declare gates_phase = \'{phase}\' instead.')
+        return phase
+
+    def is_open(self, phase: str) -> bool:
+        """True if none of the actions gating the phase are active"""
+        return not self.__outstanding[phase]
+
+    def is_outstanding(self, action_name: str) -> bool:
+        """True if the action is registered as gating a phase and is active"""
+
+        phase = self.__registered.get(action_name)
+        return phase is not None and action_name in self.__outstanding[phase]
+
+    def outstanding(self, phase: str) -> int:
+        """The number of active actions gating the phase"""
+        return len(self.__outstanding[phase])
+
+    def registered_phase(self, action_name: str):
+        """The phase the registered action gates, or None"""
+        return self.__registered.get(action_name)
+
+    def register(self, action):
+        """Register the action if it gates a phase. Its row must already be in the actions table."""
+
+        phase = self.gated_phase(action)
+        if phase is None:
+            return
+        sql = self.dao.prepare_parameterised_statement('SELECT active FROM actions WHERE action = ?')
+        rows = self.dao.execute_sql_query(sql, (action.action_name,))
+        with self.__lock:
+            self.__registered[action.action_name] = phase
+            if rows and rows[0][0]:
+                self.__outstanding[phase].add(action.action_name)
+            else:
+                self.__outstanding[phase].discard(action.action_name)
+
+    # Private methods
+    def __on_activate(self, event):
+        phase = self.__registered.get(event.subject)
+        if phase is not None:
+            with self.__lock:
+                self.__outstanding[phase].add(event.subject)
+
+    def __on_deactivate(self, event):
+        phase = self.__registered.get(event.subject)
+        if phase is not None:
+            with self.__lock:
+                self.__outstanding[phase].discard(event.subject)
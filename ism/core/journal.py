@@ -0,0 +1,180 @@
+"""Write-ahead journal of the state changes made through BaseAction
+
+When enabled, every change an action makes to the run's state through BaseAction, e.g.
+activate, set_payload, set_execution_phase or set_recurring_timer, is appended to the
+journal before it is made to the control database. Appends are sequential writes to a segment log, made
+durable by its fsync policy. Under the always policy nothing journalled is lost. Under
+the interval policy the ISM ticks the journal every loop, so a crash loses at most the
+last fsync_interval_ms of changes, however long the run then sits idle. Either costs
+the disk less time than syncing the control database after every statement, so pair
+the journal with a durability profile that relaxes the database's own syncing.
+
+Each record is the JSON array [epoch millis, operation, subject, sql, params]. The
+operation and subject, e.g. "activate" and the action's name, give the run's history.
+The SQL and its params reproduce the change.
+
+A checkpoint is the journal's compaction. The control database is copied, the journal
+moves to a new segment and, once the manifest records that segment, the older ones are
+deleted. The journal lock is held throughout, so every change is either in the copy or
+in the new segments, never both. A run resumed from the checkpoint replays the
+segments written since, recovering the changes made between the checkpoint and a crash.
+
+Enable it in the properties file. The ISM checkpoints when it starts so the journal
+always has a base to replay onto:
+
+    journal:
+      enabled: True
+      # always, interval or rotate. See ism.core.segment_log
+      fsync: interval
+      fsync_interval_ms: 100
+      segment_bytes: 67108864
+
+Changes made by other means, e.g. SQL run directly through the dao or importing an
+action pack, are only captured by the next checkpoint. Action packs writing tables of
+their own should do so through BaseAction.mutate, or mutate() here outside an action.
+
+
+Rebuild the control database of a Sqlite3 run offline, from its checkpoint and journal,
+or list the changes journalled since the checkpoint:
+
+    python -m ism.core.journal <run_dir> --output rebuilt.db
+    python -m ism.core.journal <run_dir> --list
+"""
+
+# Standard library imports
+import argparse
+import base64
+import json
+import os
+import sqlite3
+import sys
+import threading
+
+# Local application imports
+from ism.core.clock import SystemClock
+from ism.core.segment_log import SegmentReader, SegmentWriter, segment_paths
+
+PREFIX = 'journal'
+
+
+def _encode(param):
+    return {'base64': base64.b64encode(param).decode('ascii')} if isinstance(param, bytes) else param
+
+
+def _decode(param):
+    return base64.b64decode(param['base64']) if isinstance(param, dict) else param
+
+
+def mutate(journal, dao, operation: str, subject: str, sql: str, params=()):
+    """Make a change to the run's state through the dao, journalling it first if journal isn't None.
+
+    See BaseAction.mutate.
+    """
+
+    if journal is None:
+        dao.execute_sql_statement(sql, params)
+        return
+    with journal.lock:
+        journal.append(operation, subject, sql, params)
+        dao.execute_sql_statement(sql, params)
+
+
+def records(directory: str, start: str) -> list:
+    """The records in the segments from start, oldest first, as (millis, operation, subject, sql, params)"""
+
+    with SegmentReader(directory, PREFIX, os.path.join(directory, start)) as reader:
+        return [
+            (millis, operation, subject, sql, tuple(_decode(param) for param in params))
+            for millis, operation, subject, sql, params in (json.loads(record) for record in reader.read())
+        ]
+
+
+def replay(execute, directory: str, start: str) -> int:
+    """Apply the changes journalled in the segments from start.
+
+    :param execute Callable taking sql and params, e.g. dao.execute_sql_statement.
+    :return The number applied
+    """
+
+    applied = 0
+    for millis, operation, subject, sql, params in records(directory, start):
+        execute(sql, params)
+        applied += 1
+    return applied
+
+
+class Journal:
+    """Appends the changes to the run's state to a segment log under directory.
+
+    Attributes
+    ----------
+    lock: threading.RLock
+        Held while a change is journalled and made, and while a checkpoint is taken.
+    clock: SystemClock
+        Or SimulatedClock, whose time the changes are stamped with. See ism.core.clock.
+    """
+
+    def __init__(self, directory, fsync='interval', fsync_interval_ms=100, segment_bytes=67108864, clock=None):
+        self.directory = directory
+        self.lock = threading.RLock()
+        self.clock = clock if clock is not None else SystemClock()
+        self.writer = SegmentWriter(directory, PREFIX, segment_bytes, fsync, fsync_interval_ms)
+
+    def append(self, operation: str, subject: str, sql: str, params=()):
+        """Journal a change. Call with the lock held, then make the change"""
+
+        self.writer.append(json.dumps(
+            [self.clock.time_ns() // 1000000, operation, subject, sql, [_encode(param) for param in params]]
+        ).encode('utf-8'))
+
+    def close(self):
+        self.writer.close()
+
+    def tick(self):
+        """Sync the changes journalled since the last sync once the fsync interval has passed.
+        Called by the ISM every loop."""
+        self.writer.tick()
+
+    def prune(self, start: str):
+        """Delete the segments before start, once a checkpoint's manifest records it"""
+
+        for path in self.writer.segments():
+            if os.path.basename(path) < start:
+                os.remove(path)
+
+    def rotate(self) -> str:
+        """Move to a new segment after the control database has been copied, and return its name"""
+
+        self.writer.rotate()
+        return os.path.basename(self.writer.path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Rebuild a Sqlite3 run\'s control database from its journal')
+    parser.add_argument('run_dir', help='The run directory')
+    parser.add_argument('--output', help='Write the rebuilt database here')
+    parser.add_argument('--list', action='store_true', help='Print the changes journalled since the checkpoint')
+    args = parser.parse_args()
+
+    with open(os.path.join(args.run_dir, 'checkpoint', 'checkpoint.json')) as file:
+        manifest = json.load(file)
+    directory = os.path.join(args.run_dir, PREFIX)
+    if not manifest.get('journal') or not segment_paths(directory, PREFIX):
+        sys.exit(f'No journal found for the checkpoint in ({args.run_dir})')
+
+    if args.list:
+        for record in records(directory, manifest['journal']):
+            print(json.dumps([record[0], record[1], record[2], record[3], [_encode(p) for p in record[4]]]))
+    if args.output:
+        checkpoint = sqlite3.connect(manifest['database'])
+        output = sqlite3.connect(args.output)
+        checkpoint.backup(output)
+        checkpoint.close()
+        with output:
+            applied = replay(output.execute, directory, manifest['journal'])
+        output.close()
+        print(f'Rebuilt ({args.output}) from the checkpoint taken at ({manifest["created"]}) and ({applied}) changes')
+
+
+if __name__ == '__main__':
+    main()
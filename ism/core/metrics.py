@@ -0,0 +1,52 @@
+"""Counters and gauges describing a running ISM
+
+A minimal, thread safe registry. Samples are keyed by name and an optional dict of
+labels, following the Prometheus data model. e.g.
+
+    metrics.increment('ism_deadline_misses_total', {'action': 'ActionEmergencyShutdown'})
+"""
+
+# Standard library imports
+import threading
+
+
+class Metrics:
+    """Registry of counters and gauges."""
+
+    def __init__(self):
+        self.__lock = threading.Lock()
+        self.__values = {}
+        self.__types = {}
+
+    def get(self, name: str, labels: dict = None, default=0):
+        """The current value of the sample"""
+        return self.__values.get((name, self.__key(labels)), default)
+
+    def increment(self, name: str, labels: dict = None, value=1):
+        """Add value to a counter"""
+
+        key = (name, self.__key(labels))
+        with self.__lock:
+            self.__types[name] = 'counter'
+            self.__values[key] = self.__values.get(key, 0) + value
+
+    def samples(self) -> list:
+        """Every sample as (name, type, labels, value), sorted by name"""
+
+        with self.__lock:
+            return [
+                (name, self.__types[name], dict(labels), value)
+                for (name, labels), value in sorted(self.__values.items())
+            ]
+
+    def set(self, name: str, value, labels: dict = None):
+        """Set the value of a gauge"""
+
+        with self.__lock:
+            self.__types[name] = 'gauge'
+            self.__values[(name, self.__key(labels))] = value
+
+    # Private methods
+    @staticmethod
+    def __key(labels) -> tuple:
+        return tuple(sorted(labels.items())) if labels else ()
@@ -0,0 +1,125 @@
+"""Store for payloads too large for the control database
+
+BaseAction.set_payload writes a payload larger than the store's threshold to a file of its
+own under <run_dir>/payloads, once, and puts only a reference to it in actions.payload.
+The receiving action reads it with get_payload_view(), a memoryview of the file mapped
+read only, so a multi-megabyte document isn't copied in and out of the database:
+
+    view = self.get_payload_view()
+    document = json.loads(view.tobytes())  # Or parse the view directly
+
+get_payload() still returns the payload as text, at the cost of a copy, so existing
+actions work unchanged. Set the threshold in the properties file:
+
+    payloads:
+      # Payloads longer than this many bytes go to the store
+      threshold_bytes: 1048576
+
+Files no longer referenced by the actions or timers tables are removed when a checkpoint
+is taken. Until then a restore could bring their references back.
+"""
+
+# Standard library imports
+import logging
+import mmap
+import os
+import threading
+import uuid
+
+PREFIX = 'ism-payload:'
+
+
+def is_reference(payload) -> bool:
+    """True if the payload is a reference to a file in the store"""
+    return isinstance(payload, str) and payload.startswith(PREFIX)
+
+
+class PayloadStore:
+    """Payload files under a directory, referenced by name from the control database.
+
+    Attributes
+    ----------
+    directory: str
+        Where the payload files are written. Created when the first is.
+    threshold: int
+        Payloads longer than this many bytes are stored.
+    """
+
+    def __init__(self, directory, threshold=1048576):
+        self.directory = directory
+        self.threshold = threshold
+        self.logger = logging.getLogger('ism.payload_store.PayloadStore')
+        self.__lock = threading.Lock()
+        # Files written but not yet referenced in the database. See put() and referenced()
+        self.__pending = set()
+
+    def collect(self, dao) -> int:
+        """Remove the payload files not referenced by the actions or timers tables.
+
+        :return The number removed
+        """
+
+        if not os.path.isdir(self.directory):
+            return 0
+        with self.__lock:
+            pending = set(self.__pending)
+        referenced = set()
+        for table in ('actions', 'timers'):
+            for (payload,) in dao.execute_sql_query(f"SELECT payload FROM {table} WHERE payload LIKE '{PREFIX}%'"):
+                referenced.add(payload[len(PREFIX):])
+        removed = 0
+        for name in os.listdir(self.directory):
+            if name not in referenced and name not in pending:
+                os.remove(os.path.join(self.directory, name))
+                removed += 1
+        return removed
+
+    def put(self, payload) -> str:
+        """Write the payload, text or bytes, to a new file.
+
+        The file is kept by collect() until referenced() is called, once the reference is in the database.
+
+        :return The reference to keep in the control database
+        """
+
+        if isinstance(payload, str):
+            payload = payload.encode('utf-8')
+        os.makedirs(self.directory, exist_ok=True)
+        name = uuid.uuid4().hex
+        with open(os.path.join(self.directory, name), 'wb') as file:
+            file.write(payload)
+        with self.__lock:
+            self.__pending.add(name)
+        return f'{PREFIX}{name}'
+
+    def referenced(self, reference: str):
+        """Note the reference returned by put() is now in the control database"""
+
+        with self.__lock:
+            self.__pending.discard(reference[len(PREFIX):])
+
+    def stores(self, payload) -> bool:
+        """True if the payload, text or bytes, is more than the threshold's bytes once encoded"""
+
+        if payload is None:
+            return False
+        if isinstance(payload, str) and self.threshold // 4 < len(payload) <= self.threshold:
+            # Between a byte and four per character, so only encoding it tells
+            return len(payload.encode('utf-8')) > self.threshold
+        return len(payload) > self.threshold
+
+    def text(self, reference: str) -> str:
+        """The referenced payload decoded as text"""
+
+        with open(self.__path(reference), 'rb') as file:
+            return file.read().decode('utf-8')
+
+    def view(self, reference: str) -> memoryview:
+        """A read only memoryview of the referenced payload, mapped from its file without copying"""
+
+        with open(self.__path(reference), 'rb') as file:
+            return memoryview(mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ))
+
+    # Private methods
+    def __path(self, reference: str) -> str:
+        return os.path.join(self.directory, reference[len(PREFIX):])
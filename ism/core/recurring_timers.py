@@ -0,0 +1,199 @@
+"""Recurring timers, fired from a timing wheel
+
+A recurring timer activates an action, with an optional payload, every interval_ms or on
+a cron schedule until it is cancelled:
+
+    self.set_recurring_timer('ActionPollFeed', interval_ms=500)
+    self.set_recurring_timer('ActionDailyReport', cron='0 6 * * *')
+
+The definitions are kept in the recurring_timers table, and journalled when the journal
+is enabled, so they survive a checkpoint and resume. They are scheduled on a TimingWheel
+driven by the ISM's monotonic clock. ActionCheckTimers advances the wheel each tick, so
+the cost of a tick is the wheel ticks elapsed and the timers fired, not a scan of every
+timer. Cron schedules run in local wall clock time and are converted to monotonic
+deadlines when scheduled.
+
+A firing's drift is how late it fired. A loop stalled for longer than a period doesn't
+fire a burst to catch up. The periods skipped are counted as missed and the timer fires
+once, then carries on from the next period. Drift and misses are reported in the
+ism_recurring_timer_* metrics and misses are logged.
+"""
+
+# Standard library imports
+import datetime
+import logging
+import threading
+
+# Local application imports
+from ism.core import journal
+from ism.core.clock import SystemClock
+from ism.core.timing_wheel import Cron, TimingWheel
+
+
+class RecurringTimer:
+    """A recurring timer's definition and when it is next due"""
+
+    __slots__ = ('timer_id', 'action', 'payload', 'interval_ms', 'cron', 'due_ns')
+
+    def __init__(self, timer_id, action, payload, interval_ms, cron, due_ns):
+        self.timer_id = timer_id
+        self.action = action
+        self.payload = payload
+        self.interval_ms = interval_ms
+        self.cron = cron
+        self.due_ns = due_ns
+
+
+class RecurringTimers:
+    """Schedules the recurring timers defined in the control database.
+
+    Attributes
+    ----------
+    dao: DAOInterface
+        The DAO for the run's control database.
+    metrics: Metrics
+        Where firings, misses and drift are reported.
+    resolution_ms: int
+        The duration of one tick of the timing wheel.
+    clock: SystemClock
+        Or SimulatedClock. See ism.core.clock.
+    journal: Journal
+        Optional. Where the definitions and cancellations are journalled. See ism.core.journal.
+    """
+
+    def __init__(self, dao, metrics, resolution_ms=10, clock=None, journal=None):
+        self.dao = dao
+        self.journal = journal
+        self.metrics = metrics
+        self.resolution_ns = int(resolution_ms * 1000000)
+        self.clock = clock if clock is not None else SystemClock()
+        self.logger = logging.getLogger('ism.recurring_timers.RecurringTimers')
+        self.wheel = TimingWheel(self.clock.monotonic_ns() // self.resolution_ns)
+        self.__lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.wheel)
+
+    def advance(self) -> list:
+        """Fire the timers that are due and schedule their next firing. Called each tick on the ISM thread.
+
+        :return (action, payload) for each firing
+        """
+
+        now_ns = self.clock.monotonic_ns()
+        fired = []
+        with self.__lock:
+            expired = self.wheel.advance(now_ns // self.resolution_ns)
+            for timer_id, timer in expired:
+                drift_ns = now_ns - timer.due_ns
+                missed = self.__reschedule(timer, now_ns)
+                self.metrics.increment('ism_recurring_timer_firings_total')
+                self.metrics.increment('ism_recurring_timer_drift_seconds_total', value=drift_ns / 1e9)
+                self.metrics.set('ism_recurring_timer_drift_seconds', drift_ns / 1e9)
+                if missed:
+                    self.metrics.increment('ism_recurring_timer_missed_total', value=missed)
+                    self.logger.warning(f'Recurring timer ({timer_id}) for action ({timer.action}) missed '
+                                        f'({missed}) firings. Fired ({drift_ns / 1e6:.1f})ms late')
+                fired.append((timer.action, timer.payload))
+        return fired
+
+    def cancel(self, timer_id: int) -> bool:
+        """Stop a recurring timer.
+
+        :return False if there is no such timer
+        """
+
+        sql = self.dao.prepare_parameterised_statement('UPDATE recurring_timers SET active = ? WHERE id = ?')
+        with self.__lock:
+            journal.mutate(self.journal, self.dao, 'cancel_recurring_timer', str(timer_id), sql, (False, timer_id))
+            return self.wheel.cancel(timer_id)
+
+    def create(self, action: str, payload: str = None, interval_ms: int = None, cron: str = None) -> int:
+        """Define a recurring timer in the control database and schedule it.
+
+        :return The id of the timer, to cancel it
+        :raise ValueError unless given exactly one of a positive interval_ms or a valid cron schedule
+        """
+
+        if (interval_ms is None) == (cron is None):
+            raise ValueError('A recurring timer needs either interval_ms or cron')
+        if interval_ms is not None and interval_ms <= 0:
+            raise ValueError(f'Recurring timer interval_ms ({interval_ms}) must be positive')
+        schedule = Cron(cron) if cron is not None else None
+
+        insert = self.dao.prepare_parameterised_statement(
+            'INSERT INTO recurring_timers (active, action, payload, interval_ms, cron) VALUES (?, ?, ?, ?, ?)'
+        )
+        select = self.dao.prepare_parameterised_statement('SELECT MAX(id) FROM recurring_timers WHERE action = ?')
+        with self.__lock:
+            params = (True, action, payload, interval_ms, cron)
+            journal.mutate(self.journal, self.dao, 'set_recurring_timer', action, insert, params)
+            timer_id = self.dao.execute_sql_query(select, (action,))[0][0]
+            self.__schedule(RecurringTimer(timer_id, action, payload, interval_ms, schedule, None))
+        return timer_id
+
+    def load(self):
+        """Schedule the active recurring timers defined in the control database, e.g. on resume"""
+
+        sql = self.dao.prepare_parameterised_statement(
+            'SELECT id, action, payload, interval_ms, cron FROM recurring_timers WHERE active = ?'
+        )
+        with self.__lock:
+            for timer_id, action, payload, interval_ms, cron in self.dao.execute_sql_query(sql, (True,)):
+                self.__schedule(RecurringTimer(
+                    timer_id, action, payload, interval_ms, Cron(cron) if cron else None, None
+                ))
+
+    def next_due_ns(self):
+        """The monotonic time the next firing is due, to the wheel's resolution, or None if there are no timers"""
+
+        with self.__lock:
+            tick = self.wheel.earliest()
+        return None if tick is None else tick * self.resolution_ns
+
+    # Private methods
+    def __next_cron_ns(self, cron: Cron, now_ns: int) -> int:
+        """The monotonic time of the cron schedule's next run"""
+
+        now = self.clock.now()
+        return now_ns + int((cron.next_after(now) - now).total_seconds() * 1e9)
+
+    def __reschedule(self, timer: RecurringTimer, now_ns: int) -> int:
+        """Schedule the next firing after now.
+
+        :return The number of firings missed since the one that was due
+        """
+
+        if timer.cron is None:
+            interval_ns = timer.interval_ms * 1000000
+            periods = (now_ns - timer.due_ns) // interval_ns
+            timer.due_ns += (periods + 1) * interval_ns
+            missed = periods
+        else:
+            now = self.clock.now()
+            # Count the runs that fell between the one that was due and now
+            moment = now - datetime.timedelta(seconds=(now_ns - timer.due_ns) / 1e9)
+            missed = 0
+            while missed < 1000:
+                moment = timer.cron.next_after(moment)
+                if moment > now:
+                    break
+                missed += 1
+            timer.due_ns = self.__next_cron_ns(timer.cron, now_ns)
+        self.wheel.insert(timer.timer_id, self.__tick(timer.due_ns), timer)
+        return missed
+
+    def __schedule(self, timer: RecurringTimer):
+        """Schedule the first firing from now"""
+
+        now_ns = self.clock.monotonic_ns()
+        if timer.cron is None:
+            timer.due_ns = now_ns + timer.interval_ms * 1000000
+        else:
+            timer.due_ns = self.__next_cron_ns(timer.cron, now_ns)
+        self.wheel.insert(timer.timer_id, self.__tick(timer.due_ns), timer)
+
+    def __tick(self, ns: int) -> int:
+        """The wheel tick for a deadline. Rounded up, and the wheel advanced to the tick rounded down, so
+        a timer never fires early."""
+        return -(-ns // self.resolution_ns)
@@ -0,0 +1,159 @@
+"""Compact in-memory registry of the installed actions
+
+Testing whether an action is ready used to cost two queries of the control database
+for every action, every tick. With per-entity state machines of tens of thousands of
+actions, that grows with the number installed rather than the number with work to do.
+
+The registry gives each action name a dense integer id and keeps:
+    * A bytearray of active flags indexed by id.
+    * The execution phase of each id, interned so equal phases share one string.
+    * The set of active ids, so finding the ready actions costs the number active.
+    * The scheduling declared for each action name in its pack's data.json, which
+      overrides the priority, deadline and budget declared by the action's class.
+
+It is loaded from the actions table once the rows are inserted, then kept up to date
+from the activate, deactivate and phase events. The control database is still written
+to, so checkpoints and queries see the same state, but changes made to the actions
+table with SQL directly, rather than through BaseAction, aren't seen until load() is
+called again.
+"""
+
+# Standard library imports
+import logging
+import sys
+
+# Local application imports
+from ism.core import events
+from ism.exceptions.exceptions import DuplicateDataInControlDatabase, MissingDataInControlDatabase
+
+
+class ActionRegistry:
+    """Active flags and execution phases of the installed actions, indexed by integer id."""
+
+    def __init__(self, dao, event_bus):
+        self.dao = dao
+        self.logger = logging.getLogger('ism.registry.ActionRegistry')
+        self.phase = None
+        self.__ids = {}
+        self.__actions = []
+        self.__phases = []
+        self.__flags = bytearray()
+        self.__active = set()
+        self.__duplicates = set()
+        self.__scheduling = {}
+        event_bus.subscribe(events.ACTIVATE, self.__on_activate)
+        event_bus.subscribe(events.DEACTIVATE, self.__on_deactivate)
+        event_bus.subscribe(events.PHASE, self.__on_phase)
+
+    def __len__(self):
+        return len(self.__ids)
+
+    def active_count(self) -> int:
+        """The number of active actions, in any phase"""
+        return len(self.__active)
+
+    def add(self, action) -> int:
+        """Add an action object, replacing any of the same name.
+
+        :return The action's id
+        """
+
+        action_id = self.__id(action.action_name)
+        self.__actions[action_id] = action
+        return action_id
+
+    def schedule(self, action_name: str, attribute: str, value):
+        """Override a scheduling attribute, e.g. priority, for the named action only"""
+        self.__scheduling.setdefault(action_name, {})[attribute] = value
+
+    def scheduling(self, action, attribute: str):
+        """The action's scheduling attribute, overridden for its name or else declared by its class"""
+
+        overrides = self.__scheduling.get(action.action_name)
+        if overrides is not None and attribute in overrides:
+            return overrides[attribute]
+        return getattr(action, attribute)
+
+    def get(self, action_name: str):
+        """The action object registered under the name, or None"""
+
+        action_id = self.__ids.get(action_name)
+        return None if action_id is None else self.__actions[action_id]
+
+    def id(self, action_name: str) -> int:
+        """The action's id, or None if it isn't registered"""
+        return self.__ids.get(action_name)
+
+    def is_active(self, action_name: str) -> bool:
+        """True if the action is active in the current execution phase.
+
+        :raise MissingDataInControlDatabase if the action has no row in the actions table
+        :raise DuplicateDataInControlDatabase if it has more than one
+        """
+
+        action_id = self.__ids.get(action_name)
+        if action_id is None or self.__phases[action_id] is None:
+            raise MissingDataInControlDatabase(f'Missing record for action {action_name}')
+        if action_name in self.__duplicates:
+            raise DuplicateDataInControlDatabase(f'Duplicate records for action {action_name} found')
+        return bool(self.__flags[action_id]) and self.__phases[action_id] in (self.phase, 'ALL')
+
+    def load(self):
+        """Load the actions table and the current execution phase from the control database"""
+
+        duplicates = set()
+        seen = set()
+        for action_name, execution_phase, active in self.dao.execute_sql_query(
+                'SELECT action, execution_phase, active FROM actions'):
+            if action_name in seen:
+                duplicates.add(action_name)
+            seen.add(action_name)
+            action_id = self.__id(action_name)
+            self.__phases[action_id] = sys.intern(execution_phase)
+            self.__set(action_id, active)
+        self.__duplicates = duplicates
+        phases = self.dao.execute_sql_query('SELECT execution_phase FROM phases WHERE state = 1')
+        self.phase = phases[0][0] if phases else None
+
+    def ready(self, execution_phase: str) -> list:
+        """The action objects active in the execution phase, as (id, action) in no particular order"""
+
+        actions = self.__actions
+        phases = self.__phases
+        return [
+            (action_id, actions[action_id]) for action_id in list(self.__active)
+            if actions[action_id] is not None and phases[action_id] in (execution_phase, 'ALL')
+        ]
+
+    # Private methods
+    def __id(self, action_name: str) -> int:
+        """The id of the action, allocating the next one if it is new"""
+
+        action_id = self.__ids.get(action_name)
+        if action_id is None:
+            action_id = len(self.__actions)
+            self.__ids[sys.intern(action_name)] = action_id
+            self.__actions.append(None)
+            self.__phases.append(None)
+            self.__flags.append(0)
+        return action_id
+
+    def __set(self, action_id: int, active):
+        self.__flags[action_id] = 1 if active else 0
+        if active:
+            self.__active.add(action_id)
+        else:
+            self.__active.discard(action_id)
+
+    def __on_activate(self, event):
+        action_id = self.__ids.get(event.subject)
+        if action_id is not None:
+            self.__set(action_id, True)
+
+    def __on_deactivate(self, event):
+        action_id = self.__ids.get(event.subject)
+        if action_id is not None:
+            self.__set(action_id, False)
+
+    def __on_phase(self, event):
+        self.phase = event.subject
@@ -0,0 +1,324 @@
+"""Append only log of records split into segment files
+
+A SegmentWriter appends records to the current segment through a buffered file and
+starts a new segment once it reaches segment_bytes. Segments are named
+<prefix>-<sequence>.log, the sequence zero padded so they sort in the order written.
+Each record is framed by its length and CRC32:
+
+    uint32 length  uint32 crc32  bytes record      (big endian)
+
+How often the appends are made durable is the fsync policy:
+    * always - Flush and fsync every append. Nothing acknowledged is lost.
+    * interval - Flush and fsync when fsync_interval_ms has passed since the last. A crash
+    loses at most that long of appends, provided tick() is called at least that often, or
+    the writer was created with background=True, so appends followed by a lull are synced
+    too. Otherwise they wait in the writer's buffer for the next append.
+    * rotate - Only fsync when a segment is finished or the log closed. The OS decides
+    when the rest reaches the disk.
+
+Appends are only visible to readers once flushed from the writer's buffer, by the policy,
+by tick() or by calling flush().
+
+A SegmentReader tails the segments from another thread or process. It keeps its place
+and each call to read() returns the records completed since the last, following the
+writer into new segments. A record torn by a crash at the end of the last segment is
+never returned. Nor is one that fails its checksum with no valid record after it, as a
+crash can leave the last record's length written but not all of its bytes. That is
+logged and the record dropped. A record that fails its checksum with valid records
+after it raises CorruptSegmentLog.
+"""
+
+# Standard library imports
+import logging
+import os
+import struct
+import threading
+import time
+import zlib
+
+# Local application imports
+from ism.exceptions.exceptions import CorruptSegmentLog
+
+FSYNC_ALWAYS = 'always'
+FSYNC_INTERVAL = 'interval'
+FSYNC_ROTATE = 'rotate'
+FSYNC_POLICIES = (FSYNC_ALWAYS, FSYNC_INTERVAL, FSYNC_ROTATE)
+
+RECORD = struct.Struct('>II')
+
+
+def segment_paths(directory: str, prefix: str) -> list:
+    """The segments in the directory, oldest first"""
+
+    if not os.path.isdir(directory):
+        return []
+    return [
+        os.path.join(directory, name) for name in sorted(os.listdir(directory))
+        if name.startswith(f'{prefix}-') and name.endswith('.log')
+    ]
+
+
+class SegmentWriter:
+    """Appends framed records to the newest segment in a directory.
+
+    Attributes
+    ----------
+    directory: str
+        Where the segments are written. Created if need be.
+    prefix: str
+        Names the segments of this log.
+    segment_bytes: int
+        A segment is finished and the next started once it is this large.
+    fsync: str
+        always, interval or rotate.
+    fsync_interval_ms: int
+        For the interval policy, and how often tick() makes the buffered appends visible.
+    background: bool
+        Call tick() every fsync_interval_ms on a daemon thread until the writer is closed,
+        for owners without a loop of their own to call it from.
+    """
+
+    def __init__(self, directory, prefix='segment', segment_bytes=67108864, fsync=FSYNC_INTERVAL,
+                 fsync_interval_ms=100, buffer_bytes=65536, background=False):
+        if fsync not in FSYNC_POLICIES:
+            raise ValueError(f'fsync policy ({fsync}) must be one of {FSYNC_POLICIES}')
+        self.directory = directory
+        self.prefix = prefix
+        self.segment_bytes = segment_bytes
+        self.fsync = fsync
+        self.fsync_interval_ns = int(fsync_interval_ms * 1000000)
+        self.buffer_bytes = buffer_bytes
+        self.logger = logging.getLogger('ism.segment_log.SegmentWriter')
+        self.file = None
+        self.path = None
+        self.size = 0
+        self.synced_ns = time.monotonic_ns()
+        # Appends not yet flushed from the buffer
+        self.pending = False
+        self.__lock = threading.RLock()
+        self.__closed = threading.Event()
+        os.makedirs(directory, exist_ok=True)
+        # Never append after a tail that may be torn. Start the next segment
+        existing = segment_paths(directory, prefix)
+        self.sequence = int(existing[-1][-len('0000000000.log'):-len('.log')]) if existing else 0
+        self.rotate()
+        if background:
+            threading.Thread(target=self.__tick_until_closed, name=f'ism-{prefix}-sync', daemon=True).start()
+
+    def append(self, record: bytes):
+        """Append a record, syncing and rotating as the policy and segment size require"""
+
+        with self.__lock:
+            self.file.write(RECORD.pack(len(record), zlib.crc32(record)))
+            self.file.write(record)
+            self.size += RECORD.size + len(record)
+            self.pending = True
+            if self.fsync == FSYNC_ALWAYS:
+                self.flush(sync=True)
+            elif self.fsync == FSYNC_INTERVAL and time.monotonic_ns() - self.synced_ns >= self.fsync_interval_ns:
+                self.flush(sync=True)
+            if self.size >= self.segment_bytes:
+                self.rotate()
+
+    def close(self):
+        """Flush, fsync and close the current segment, and stop any background thread"""
+
+        self.__closed.set()
+        self.__finish()
+
+    def flush(self, sync=False):
+        """Make the appends visible to readers and, if sync, durable"""
+
+        with self.__lock:
+            self.file.flush()
+            self.pending = False
+            if sync:
+                os.fsync(self.file.fileno())
+                self.synced_ns = time.monotonic_ns()
+
+    def rotate(self):
+        """Finish the current segment and start the next"""
+
+        with self.__lock:
+            self.__finish()
+            self.__start()
+
+    def segments(self) -> list:
+        """Every segment of this log, oldest first"""
+        return segment_paths(self.directory, self.prefix)
+
+    def tick(self):
+        """Flush the buffered appends once fsync_interval_ms has passed since the last sync, and fsync
+        them under the interval policy. Call it periodically so the interval bounds what a crash loses
+        even when the appends stop."""
+
+        with self.__lock:
+            if self.file is None or not self.pending or \
+                    time.monotonic_ns() - self.synced_ns < self.fsync_interval_ns:
+                return
+            if self.fsync == FSYNC_INTERVAL:
+                self.flush(sync=True)
+            else:
+                self.flush()
+                # Under the rotate policy nothing is synced, so only the visibility is timed
+                self.synced_ns = time.monotonic_ns()
+
+    # Private methods
+    def __finish(self):
+        """Flush, fsync and close the current segment"""
+
+        with self.__lock:
+            if self.file is not None:
+                self.flush(sync=True)
+                self.file.close()
+                self.file = None
+
+    def __start(self):
+        """Start the next segment"""
+
+        self.sequence += 1
+        self.path = os.path.join(self.directory, f'{self.prefix}-{self.sequence:010d}.log')
+        self.file = open(self.path, 'ab', buffering=self.buffer_bytes)
+        self.size = 0
+        if self.fsync != FSYNC_ROTATE:
+            # Make the new segment's directory entry durable too
+            self.__sync_directory()
+
+    def __sync_directory(self):
+        if not hasattr(os, 'O_DIRECTORY'):
+            return
+        descriptor = os.open(self.directory, os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(descriptor)
+        finally:
+            os.close(descriptor)
+
+    def __tick_until_closed(self):
+        while not self.__closed.wait(self.fsync_interval_ns / 1e9):
+            self.tick()
+
+
+class SegmentReader:
+    """Tails the segments of a log, from the oldest or from the segment path given as start."""
+
+    def __init__(self, directory, prefix='segment', start=None):
+        self.directory = directory
+        self.prefix = prefix
+        self.path = start
+        self.file = None
+        self.buffer = b''
+        self.logger = logging.getLogger('ism.segment_log.SegmentReader')
+        self.__torn = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    def follow(self, poll_interval=0.05, timeout=None):
+        """Yield records as they are appended, waiting up to timeout, or forever, for each"""
+
+        while True:
+            records = self.read()
+            if records:
+                yield from records
+                continue
+            waited = 0
+            while not records:
+                if timeout is not None and waited >= timeout:
+                    return
+                time.sleep(poll_interval)
+                waited += poll_interval
+                records = self.read()
+            yield from records
+
+    def read(self) -> list:
+        """The records completed since the last read, in the order appended"""
+
+        records = []
+        while True:
+            if self.file is None and not self.__open_next():
+                return records
+            data = self.file.read()
+            if data:
+                self.buffer += data
+                records.extend(self.__parse())
+                continue
+            # At the end of this segment. It is finished if the writer has started another
+            following = self.__following()
+            if following is None:
+                return records
+            # Anything appended before the writer moved on
+            self.buffer += self.file.read()
+            records.extend(self.__parse())
+            if self.buffer:
+                self.logger.warning(f'Skipped ({len(self.buffer)}) bytes torn from the end of segment ({self.path})')
+            self.close()
+            self.buffer = b''
+            self.__torn = False
+            self.path = following
+
+    # Private methods
+    def __following(self):
+        """The segment after the current one, if there is one yet"""
+
+        for path in segment_paths(self.directory, self.prefix):
+            if path > self.path:
+                return path
+        return None
+
+    def __open_next(self) -> bool:
+        if self.path is None:
+            paths = segment_paths(self.directory, self.prefix)
+            if not paths:
+                return False
+            self.path = paths[0]
+        self.file = open(self.path, 'rb')
+        return True
+
+    def __parse(self) -> list:
+        """Take the complete records from the buffer"""
+
+        records = []
+        position = 0
+        buffer = self.buffer
+        while len(buffer) - position >= RECORD.size:
+            length, crc = RECORD.unpack_from(buffer, position)
+            end = position + RECORD.size + length
+            if len(buffer) < end:
+                break
+            record = buffer[position + RECORD.size:end]
+            if zlib.crc32(record) != crc:
+                if self.__valid_record_at(buffer, end):
+                    raise CorruptSegmentLog(f'Record at ({position}) in segment ({self.path}) failed its checksum')
+                # Torn by a crash, unless a valid record turns up after it
+                if not self.__torn:
+                    self.logger.warning(
+                        f'Dropped the record at ({position}) in segment ({self.path}). It failed its checksum '
+                        f'with nothing valid after it, so was torn by a crash'
+                    )
+                    self.__torn = True
+                break
+            records.append(record)
+            position = end
+        self.buffer = buffer[position:]
+        return records
+
+    @staticmethod
+    def __valid_record_at(buffer: bytes, position: int) -> bool:
+        """True if a complete record that passes its checksum starts at position.
+
+        Empty records don't count, as they are what the zeros a crash can leave look like.
+        """
+
+        if len(buffer) - position < RECORD.size:
+            return False
+        length, crc = RECORD.unpack_from(buffer, position)
+        end = position + RECORD.size + length
+        return 0 < length and end <= len(buffer) and zlib.crc32(buffer[position + RECORD.size:end]) == crc
@@ -0,0 +1,97 @@
+"""Run the startup actions concurrently
+
+Startup actions gating the RUNNING phase often do slow setup, like creating directories,
+warming caches or loading reference data. Dispatched one after another their times add
+up. With a startup section in the properties file, the dispatcher hands them to a
+bounded pool of worker threads during STARTING instead, so the time to RUNNING is the
+longest chain of dependent actions rather than the sum of them all:
+
+    startup:
+      # Number of worker threads running the startup actions
+      workers: 4
+
+An action can wait for others to complete first by naming them in its depends_on class
+attribute. A dependency is complete once it is no longer active:
+
+    class ActionBeforeWarmCache(BaseAction):
+        gates_phase = 'RUNNING'
+        depends_on = ('ActionBeforeLoadReferenceData',)
+
+Actions running on the pool share the control database through their own connections and
+are not watched by the watchdog. An exception raised by one is raised on the ISM thread
+at the next tick.
+"""
+
+# Standard library imports
+import concurrent.futures
+import inspect
+import logging
+
+# Local application imports
+from ism.core import gates
+
+
+class StartupPool:
+    """Bounded pool of worker threads for the actions gating RUNNING.
+
+    Attributes
+    ----------
+    gates: Gates
+        Identifies the startup actions and whether their dependencies are complete.
+    workers: int
+        The most startup actions executing at once.
+    """
+
+    def __init__(self, phase_gates, workers):
+        self.gates = phase_gates
+        self.workers = workers
+        self.logger = logging.getLogger('ism.startup.StartupPool')
+        self.executor = None
+        self.running = {}
+
+    def accepts(self, action, execution_phase: str) -> bool:
+        """True if the action should be run on the pool rather than the ISM thread"""
+        return execution_phase == 'STARTING' and self.gates.registered_phase(action.action_name) == gates.RUNNING
+
+    def reap(self):
+        """Forget the actions that have finished executing. Raises any exception one of them raised."""
+
+        for action_name, future in list(self.running.items()):
+            if future.done():
+                del self.running[action_name]
+                future.result()
+
+    def shutdown(self):
+        """Stop the worker threads once the actions executing have finished"""
+
+        if self.executor is not None:
+            self.executor.shutdown(wait=False)
+            self.executor = None
+
+    def submit(self, action) -> bool:
+        """Execute the action on a worker unless it is already executing or waiting on its dependencies.
+
+        :return True if the action was submitted
+        """
+
+        if action.action_name in self.running:
+            return False
+        waiting = [name for name in action.depends_on if self.gates.is_outstanding(name)]
+        if waiting:
+            return False
+        if self.executor is None:
+            self.executor = concurrent.futures.ThreadPoolExecutor(
+                max_workers=self.workers, thread_name_prefix='ism-startup'
+            )
+        self.running[action.action_name] = self.executor.submit(self.__execute, action)
+        return True
+
+    # Private methods
+    @staticmethod
+    def __execute(action):
+        """Execute the action. There is no tick to time slice a generator so run it to completion."""
+
+        result = action.execute()
+        if inspect.isgenerator(result):
+            for _ in result:
+                pass
@@ -0,0 +1,221 @@
+"""Hierarchical timing wheel and cron schedules for the recurring timers
+
+The wheel holds timers in levels of 256 slots. Level 0 has a slot per tick, level 1 a
+slot per 256 ticks and so on, so four levels span 2^32 ticks. A timer is inserted in
+the lowest level whose span covers its delay, in O(1). Each tick advances level 0 by
+a slot, firing whatever is in it. When level 0 wraps, the next slot of level 1 is
+cascaded down into the levels below, and likewise for the higher levels. So the cost
+of advancing is the number of ticks elapsed plus the timers fired, however many are
+waiting. Timers beyond the top level's span are parked in its furthest slot and
+re-inserted when it cascades. Advancing further than there are timers, e.g. when a
+simulated clock jumps hours ahead, skips to the next expiry and re-inserts the timers
+instead, so it costs the timers waiting rather than the ticks elapsed.
+
+Cron schedules use the five standard fields, minute hour day-of-month month day-of-week,
+each a *, a value, a range a-b, a step */n or a-b/n, or a comma separated list of them.
+Day of week 0 and 7 are Sunday. As in cron, if both day fields are restricted a day
+matching either will do.
+"""
+
+# Standard library imports
+import datetime
+
+SLOT_BITS = 8
+SLOTS = 1 << SLOT_BITS
+SLOT_MASK = SLOTS - 1
+LEVELS = 4
+
+
+class TimingWheel:
+    """Timers keyed by any hashable, each expiring at an integer tick.
+
+    Attributes
+    ----------
+    now: int
+        The tick the wheel has advanced to.
+    """
+
+    def __init__(self, now=0):
+        self.now = now
+        self.__levels = [[{} for _ in range(SLOTS)] for _ in range(LEVELS)]
+        self.__due = {}
+        self.__locations = {}
+
+    def __len__(self):
+        return len(self.__locations)
+
+    def __contains__(self, key):
+        return key in self.__locations
+
+    def advance(self, tick: int) -> list:
+        """Advance the wheel to tick.
+
+        :return (key, value) of each timer that expired, in expiry order
+        """
+
+        fired = self.__take_due()
+        if not self.__locations:
+            self.now = max(self.now, tick)
+            return fired
+
+        # Ticks before the horizon are known not to be worth skipping
+        horizon = self.now
+        while self.now < tick:
+            if self.now >= horizon and tick - self.now > len(self.__locations) + SLOTS:
+                horizon = min(tick, self.earliest())
+                if horizon - 1 > self.now:
+                    self.__skip(horizon - 1)
+            self.now += 1
+            self.__cascade()
+            # Timers cascaded down on the tick they expire are due now
+            fired.extend(self.__take_due())
+            slot = self.__levels[0][self.now & SLOT_MASK]
+            if slot:
+                for key, (expiry, value) in slot.items():
+                    del self.__locations[key]
+                    fired.append((key, value))
+                slot.clear()
+            if not self.__locations:
+                self.now = tick
+        return fired
+
+    def earliest(self):
+        """The tick the next timer expires at, or None if the wheel is empty. O(n), for the simulated clock"""
+
+        return min((slot[key][0] for key, slot in self.__locations.items()), default=None)
+
+    def cancel(self, key) -> bool:
+        """Remove a timer. :return False if it wasn't in the wheel"""
+
+        location = self.__locations.pop(key, None)
+        if location is None:
+            return False
+        if location is self.__due:
+            del self.__due[key]
+        else:
+            del location[key]
+        return True
+
+    def insert(self, key, expiry: int, value=None):
+        """Add a timer expiring at the tick, replacing any with the same key.
+
+        A timer expiring at or before now fires at the next advance.
+        """
+
+        if key in self.__locations:
+            self.cancel(key)
+        delay = expiry - self.now
+        if delay <= 0:
+            slot = self.__due
+        else:
+            level = 0
+            while level < LEVELS - 1 and delay >= 1 << (SLOT_BITS * (level + 1)):
+                level += 1
+            # Beyond the top level's span, park it in the furthest slot until that cascades
+            position = min(expiry, self.now + (1 << (SLOT_BITS * LEVELS)) - 1)
+            slot = self.__levels[level][(position >> (SLOT_BITS * level)) & SLOT_MASK]
+        slot[key] = (expiry, value)
+        self.__locations[key] = slot
+
+    # Private methods
+    def __skip(self, tick: int):
+        """Move now to a tick before the next expiry without stepping through those between"""
+
+        timers = [(key, slot.pop(key)) for key, slot in list(self.__locations.items())]
+        self.__locations.clear()
+        self.now = tick
+        for key, (expiry, value) in timers:
+            self.insert(key, expiry, value)
+
+    def __take_due(self) -> list:
+        """Remove the timers due at or before now"""
+
+        due = [(key, value) for key, (expiry, value) in self.__due.items()]
+        for key, value in due:
+            del self.__locations[key]
+        self.__due.clear()
+        return due
+
+    def __cascade(self):
+        """Move the timers in the higher levels' current slots down, once the levels below have wrapped"""
+
+        level = 1
+        while level < LEVELS and (self.now & ((1 << (SLOT_BITS * level)) - 1)) == 0:
+            level += 1
+        for level in range(level - 1, 0, -1):
+            slot = self.__levels[level][(self.now >> (SLOT_BITS * level)) & SLOT_MASK]
+            if slot:
+                timers = list(slot.items())
+                slot.clear()
+                for key, (expiry, value) in timers:
+                    del self.__locations[key]
+                    self.insert(key, expiry, value)
+
+
+class Cron:
+    """A cron schedule of five fields, minute hour day-of-month month day-of-week."""
+
+    RANGES = ((0, 59), (0, 23), (1, 31), (1, 12), (0, 7))
+
+    def __init__(self, expression: str):
+        fields = expression.split()
+        if len(fields) != 5:
+            raise ValueError(f'Cron expression ({expression}) must have five fields')
+        self.expression = expression
+        self.minutes, self.hours, self.days, self.months, weekdays = (
+            self.__parse(field, low, high) for field, (low, high) in zip(fields, self.RANGES)
+        )
+        self.weekdays = {day % 7 for day in weekdays}
+        self.any_day = fields[2] == '*'
+        self.any_weekday = fields[4] == '*'
+
+    def matches_day(self, date) -> bool:
+        """True if the schedule runs on the date"""
+
+        day = date.day in self.days
+        # isoweekday is 1 for Monday to 7 for Sunday
+        weekday = date.isoweekday() % 7 in self.weekdays
+        if self.any_day or self.any_weekday:
+            return day and weekday
+        return day or weekday
+
+    def next_after(self, moment: datetime.datetime) -> datetime.datetime:
+        """The first time the schedule runs after moment"""
+
+        moment = moment.replace(second=0, microsecond=0) + datetime.timedelta(minutes=1)
+        # Every matching day recurs within a few years, e.g. 29th February
+        limit = moment + datetime.timedelta(days=366 * 8)
+        while moment < limit:
+            if moment.month not in self.months:
+                year, month = (moment.year + 1, 1) if moment.month == 12 else (moment.year, moment.month + 1)
+                moment = moment.replace(year=year, month=month, day=1, hour=0, minute=0)
+            elif not self.matches_day(moment):
+                moment = (moment + datetime.timedelta(days=1)).replace(hour=0, minute=0)
+            elif moment.hour not in self.hours:
+                moment = (moment + datetime.timedelta(hours=1)).replace(minute=0)
+            elif moment.minute not in self.minutes:
+                moment += datetime.timedelta(minutes=1)
+            else:
+                return moment
+        raise ValueError(f'Cron expression ({self.expression}) never runs')
+
+    # Private methods
+    @staticmethod
+    def __parse(field: str, low: int, high: int) -> set:
+        """The values a field allows"""
+
+        values = set()
+        for part in field.split(','):
+            span, _, step = part.partition('/')
+            if span == '*':
+                start, end = low, high
+            elif '-' in span:
+                start, end = (int(bound) for bound in span.split('-'))
+            else:
+                start = end = int(span)
+                if step:
+                    end = high
+            if start < low or end > high or start > end:
+                raise ValueError(f'Cron field ({field}) is out of the range {low}-{high}')
+            values.update(range(start, end + 1, int(step) if step else 1))
+        return values
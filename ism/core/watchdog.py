@@ -0,0 +1,107 @@
+"""Watch for actions that run too long
+
+Nothing stops an action's execute method from running for seconds and starving
+every other action. The dispatcher tells the watchdog which action it is executing
+and when it started. The watchdog's own thread checks on it every interval_ms and
+when the action overruns its budget:
+    * Logs a warning with a stack sample of the ISM thread, showing where the action is.
+    * Counts the overrun in the ism_watchdog_overruns_total metric.
+    * Optionally, once execute returns, deactivates the action or activates
+    ActionEmergencyShutdown.
+
+The budget defaults to watchdog:budget_ms in the properties file. An action can set
+its own with the budget_ms class attribute or in its pack's data.json scheduling section.
+"""
+
+# Standard library imports
+import logging
+import sys
+import threading
+import time
+import traceback
+
+LOG = 'log'
+DEACTIVATE = 'deactivate'
+EMERGENCY_SHUTDOWN = 'emergency_shutdown'
+
+
+class Watchdog:
+    """Enforces a time budget on each dispatch of an action.
+
+    Attributes
+    ----------
+    budget_ms: float
+        The default budget for an action's execute method.
+    on_overrun: str
+        log, deactivate or emergency_shutdown.
+    interval_ms: float
+        How often the watchdog thread checks the executing action.
+    """
+
+    def __init__(self, metrics, budget_ms, on_overrun=LOG, interval_ms=10):
+        if on_overrun not in (LOG, DEACTIVATE, EMERGENCY_SHUTDOWN):
+            raise ValueError(f'Unrecognised watchdog on_overrun ({on_overrun})')
+        self.metrics = metrics
+        self.budget_ms = budget_ms
+        self.on_overrun = on_overrun
+        self.interval_ms = interval_ms
+        self.logger = logging.getLogger('ism.watchdog.Watchdog')
+        self.thread = None
+        self.watched = None
+        self.__current = None
+        self.__overrun = None
+        self.__stopped = threading.Event()
+
+    def begin(self, action, budget_ms=None):
+        """Called on the ISM thread before an action executes, with its budget if it has its own"""
+        self.__current = (action, time.monotonic_ns(), budget_ms if budget_ms is not None else self.budget_ms)
+
+    def end(self):
+        """Called on the ISM thread after an action executes.
+
+        :return The verdict on an overrunning action, deactivate or emergency_shutdown, else None
+        """
+
+        current, self.__current = self.__current, None
+        overrun, self.__overrun = self.__overrun, None
+        # The overrun may be left over from a dispatch that ended as it was reported
+        return None if overrun is not current or self.on_overrun == LOG else self.on_overrun
+
+    def start(self, watched: threading.Thread):
+        """Start watching the thread that executes the actions"""
+
+        self.watched = watched
+        self.__stopped.clear()
+        self.thread = threading.Thread(target=self.__watch, name='ism-watchdog', daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """Stop the watchdog thread"""
+        self.__stopped.set()
+
+    # Private methods
+    def __report(self, action, elapsed_ms, budget_ms):
+        """Log the overrun with a stack sample from the watched thread and count it"""
+
+        frame = sys._current_frames().get(self.watched.ident)
+        stack = ''.join(traceback.format_stack(frame)) if frame is not None else 'No stack available\n'
+        self.metrics.increment('ism_watchdog_overruns_total', {'action': action.action_name})
+        self.logger.warning(
+            f'Action ({action.action_name}) has been executing for ({elapsed_ms:.1f})ms, over its budget '
+            f'of ({budget_ms})ms. Stack sample:\n{stack}'
+        )
+
+    def __watch(self):
+        """Check the executing action every interval_ms. Each dispatch is reported once."""
+
+        reported = None
+        while not self.__stopped.wait(self.interval_ms / 1000):
+            current = self.__current
+            if current is None or current is reported:
+                continue
+            action, started, budget_ms = current
+            elapsed_ms = (time.monotonic_ns() - started) / 1000000
+            if elapsed_ms > budget_ms:
+                reported = current
+                self.__overrun = current
+                self.__report(action, elapsed_ms, budget_ms)
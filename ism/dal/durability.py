@@ -0,0 +1,72 @@
+"""Durability profiles for the control database
+
+Every statement is committed, and synced to disk, as it is executed by default. Runs
+that can afford to lose the last moments of their state on a crash can trade some of
+that durability for throughput by naming a profile in the database section of the
+properties file:
+
+    database:
+      # strict, balanced or fast
+      durability: balanced
+      # Optional. Overrides the profile's group commit interval
+      group_commit_ms: 50
+
+The profiles are:
+    * strict - The default. Sqlite3 synchronous=FULL and MySql innodb_flush_log_at_trx_commit=1.
+    Each statement is committed and synced as it is executed. Nothing committed is lost.
+    * balanced - Sqlite3 synchronous=NORMAL and MySql innodb_flush_log_at_trx_commit=2. Each
+    statement is still committed as it is executed, so a crash of the ISM loses nothing, but
+    the last commits before a power failure or OS crash can be.
+    * fast - Sqlite3 synchronous=OFF and MySql innodb_flush_log_at_trx_commit=0, with the ISM
+    thread's statements group committed every group_commit_ms. A crash loses up to that
+    long of changes.
+
+Group commit holds the ISM thread's statements in one open transaction, committed by the
+loop once the interval has passed, before a checkpoint and when the run stops. Other
+threads and snapshots see the changes once committed, and their writes wait for it.
+Pair the fast profile with the journal, see ism.core.journal, to keep a resumable record
+of the changes the database may lose.
+
+MySql's innodb_flush_log_at_trx_commit and sync_binlog are server wide, affecting every
+database on the server, so the server's settings are kept and logged unless the database
+section opts in with mysql_set_global: True. The run's user then needs the privilege to set
+them, and they are put back when the run stops.
+
+See ism.benchmarks.bench_durability for the throughput of each profile.
+"""
+
+# Standard library imports
+import collections
+
+# Local application imports
+from ism.exceptions.exceptions import DurabilityProfileNotRecognised
+
+DurabilityProfile = collections.namedtuple(
+    'DurabilityProfile', ['name', 'synchronous', 'group_commit_ms', 'flush_log_at_trx_commit', 'sync_binlog']
+)
+
+STRICT = 'strict'
+BALANCED = 'balanced'
+FAST = 'fast'
+
+PROFILES = {
+    STRICT: DurabilityProfile(STRICT, 'FULL', 0, 1, 1),
+    BALANCED: DurabilityProfile(BALANCED, 'NORMAL', 0, 2, 0),
+    FAST: DurabilityProfile(FAST, 'OFF', 1000, 0, 0)
+}
+
+
+def profile(database: dict) -> DurabilityProfile:
+    """The profile named in the database section of the properties, strict by default.
+
+    :raise DurabilityProfileNotRecognised if there is no such profile
+    """
+
+    name = database.get('durability', STRICT)
+    try:
+        selected = PROFILES[str(name).lower()]
+    except KeyError:
+        raise DurabilityProfileNotRecognised(f'Durability profile ({name}) must be one of {list(PROFILES)}')
+    if database.get('group_commit_ms') is not None:
+        selected = selected._replace(group_commit_ms=database['group_commit_ms'])
+    return selected
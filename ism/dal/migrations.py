@@ -0,0 +1,136 @@
+"""
+Schema versioning for the core and action pack schemas.
+
+A schema.json may declare a version and the migrations that take its schema from one
+version to the next. The tables list is version 1. e.g.
+
+    "sqlite3": {
+        "version": 2,
+        "tables": [ "CREATE TABLE ..." ],
+        "migrations": {
+            "2": [ "CREATE INDEX ..." ]
+        }
+    }
+
+The version of each package's schema in the control database is recorded in the
+schema_versions table. A new run executes the tables and every migration. A resumed
+run applies only the migrations newer than the recorded version. Databases created
+before versioning have no record and are treated as version 1.
+
+The SHA1 digest of each table and data statement an action pack executes is recorded
+in the action_pack_statements table, so reloading the pack executes only the statements
+added since. Statements are identified by their text, so change data with a new UPDATE
+rather than by editing an INSERT that has already run.
+"""
+
+# Standard library imports
+import hashlib
+import logging
+
+VERSION_TABLE = {
+    'mysql': "CREATE TABLE IF NOT EXISTS schema_versions (package VARCHAR(255) NOT NULL COMMENT 'The package the "
+             "schema belongs to. e.g. ism.core', version INTEGER NOT NULL COMMENT 'The schema version applied', "
+             "PRIMARY KEY(package))",
+    'sqlite3': "CREATE TABLE IF NOT EXISTS schema_versions (\npackage TEXT NOT NULL PRIMARY KEY, -- The package the "
+               "schema belongs to. e.g. ism.core\nversion INTEGER NOT NULL -- The schema version applied\n)"
+}
+
+
+class SchemaMigrator:
+    """Creates and upgrades versioned schemas in the control database.
+
+    Attributes
+    ----------
+    dao: DAOInterface
+        The DAO for the run's control database.
+    rdbms: str
+        The RDBMS in use, used to select the version table DDL.
+    """
+
+    def __init__(self, dao, rdbms):
+        self.dao = dao
+        self.rdbms = rdbms.lower()
+        self.logger = logging.getLogger('ism.migrations.SchemaMigrator')
+
+    @staticmethod
+    def latest_version(schema: dict) -> int:
+        """The version a schema declares, 1 if it doesn't declare one"""
+        return int(schema.get('version', 1))
+
+    def create_statements(self, package: str, schema: dict) -> list:
+        """The statements that create a schema at its latest version in a new database.
+
+        :param package The name of the package the schema belongs to.
+        :param schema The RDBMS section of the package's schema.json.
+        """
+
+        statements = [VERSION_TABLE[self.rdbms]]
+        statements.extend(schema.get('tables', []))
+        statements.extend(self.__migration_statements(schema, 1))
+        statements.extend(self.__record_version_statements(package, self.latest_version(schema)))
+        return statements
+
+    @staticmethod
+    def digest(statement: str) -> str:
+        """The digest identifying a statement in the action_pack_statements table"""
+        return hashlib.sha1(statement.encode('utf-8')).hexdigest()
+
+    def executed_digests(self, package: str) -> set:
+        """The digests of the statements recorded as executed for the package"""
+
+        sql = self.dao.prepare_parameterised_statement('SELECT digest FROM action_pack_statements WHERE package = ?')
+        return {row[0] for row in self.dao.execute_sql_query(sql, (package,))}
+
+    def record_statements(self, package: str, statements: list) -> list:
+        """The statements that record the package's statements as executed"""
+
+        return [
+            f"INSERT INTO action_pack_statements VALUES('{package}', '{self.digest(statement)}')"
+            for statement in dict.fromkeys(statements)
+        ]
+
+    def get_version(self, package: str) -> int:
+        """The version of the package's schema recorded in the control database"""
+
+        self.dao.execute_sql_statement(VERSION_TABLE[self.rdbms])
+        sql = self.dao.prepare_parameterised_statement('SELECT version FROM schema_versions WHERE package = ?')
+        rows = self.dao.execute_sql_query(sql, (package,))
+        return rows[0][0] if rows else 1
+
+    def upgrade(self, package: str, schema: dict) -> int:
+        """Apply any migrations newer than the version recorded in the control database.
+
+        :return The number of migrations applied
+        """
+
+        current = self.get_version(package)
+        latest = self.latest_version(schema)
+        if current >= latest:
+            return 0
+
+        for statement in self.__migration_statements(schema, current):
+            self.dao.execute_sql_statement(statement)
+        for statement in self.__record_version_statements(package, latest):
+            self.dao.execute_sql_statement(statement)
+        self.logger.info(f'Upgraded schema for ({package}) from version ({current}) to ({latest})')
+        return latest - current
+
+    # Private methods
+    @staticmethod
+    def __migration_statements(schema: dict, current: int) -> list:
+        """The statements for every migration newer than current, in version order"""
+
+        statements = []
+        for version in sorted(int(version) for version in schema.get('migrations', {})):
+            if version > current:
+                statements.extend(schema['migrations'][str(version)])
+        return statements
+
+    @staticmethod
+    def __record_version_statements(package: str, version: int) -> list:
+        """The statements that record the package's schema version"""
+
+        return [
+            f"DELETE FROM schema_versions WHERE package = '{package}'",
+            f"INSERT INTO schema_versions VALUES('{package}', {version})"
+        ]
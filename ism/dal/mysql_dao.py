@@ -1,20 +1,30 @@
 """
 Methods for handling DB creation and CRUD operations in MySql.
+
+The durability profile sets whether the ISM thread's statements are group committed and,
+if the properties opt in with mysql_set_global, the server's log flushing for the length
+of the run. See ism.dal.durability.
 """
 
 # Standard library imports
+import contextlib
 import logging
+import queue
+import threading
+import time
 import mysql.connector
 from mysql.connector import errorcode
 
 # Local application imports
+from ism.dal import durability
 from ism.exceptions.exceptions import UnrecognisedParameterisationCharacter, ExecutionPhaseNotFound
+from ism.dal.snapshot import Snapshot
+from ism.dal.statement_stats import QUERY, STATEMENT
 from ism.interfaces.dao_interface import DAOInterface
 
 
 class MySqlDAO(DAOInterface):
 
-    cnx = None
     host = None
     password = None
     run_db = None
@@ -28,28 +38,98 @@ class MySqlDAO(DAOInterface):
         self.run_db = args[0]['database']['run_db']
         self.user = args[0]['database']['user']
         self.raise_on_sql_error = args[0].get('database', {}).get('raise_on_sql_error', False)
+        self.durability = durability.profile(args[0].get('database', {}))
+        self.set_global = args[0].get('database', {}).get('mysql_set_global', False)
+        # The server's log flushing before it was changed for the profile, restored when the run stops
+        self.__changed_globals = {}
+        self.__local = threading.local()
+        # Idle connections reused by snapshot()
+        self.__readers = queue.SimpleQueue()
+        # The thread whose statements are group committed, its connection kept open between them
+        self.__group_thread = None
+        self.__group_pending = False
+        self.__group_committed_ns = 0
+        # Optional StatementStats counting and timing the SQL executed
+        self.stats = None
+
+    @property
+    def cnx(self):
+        """The connection is per thread so callers outside the ISM thread don't close its connection"""
+        return getattr(self.__local, 'cnx', None)
+
+    @cnx.setter
+    def cnx(self, cnx):
+        self.__local.cnx = cnx
+
+    def backup_database(self, target):
+        """Copy every table in the run database into the target database.
+
+        Statements held back by group commit are committed first.
+        """
+
+        self.commit_group(force=True)
+        self.__copy_tables(self.run_db, target)
+
+    def begin_group_commit(self):
+        """Hold back the commits of the calling thread's statements for the durability profile's
+        group commit interval. Does nothing if the profile doesn't group commit."""
+
+        if self.durability.group_commit_ms:
+            self.__group_thread = threading.get_ident()
+            self.__group_committed_ns = time.monotonic_ns()
 
     def close_connection(self):
         """Close the connection if open"""
-        if self.cnx is not None:
+        if self.cnx is not None and not self.__grouping():
             self.cnx.close()
+            self.cnx = None
+
+    def close_snapshot_connections(self):
+        """Close the idle connections kept for snapshots"""
+
+        while True:
+            try:
+                self.__readers.get_nowait().close()
+            except queue.Empty:
+                return
+
+    def commit_group(self, force=False):
+        """Commit the statements held back by group commit once the interval has passed, or now if force"""
+
+        if not self.__grouping() or not self.__group_pending:
+            return
+        now_ns = time.monotonic_ns()
+        if force or now_ns - self.__group_committed_ns >= self.durability.group_commit_ms * 1000000:
+            self.cnx.commit()
+            self.__group_pending = False
+            self.__group_committed_ns = now_ns
 
     def create_database(self, *args):
-        """Create the control database."""
+        """Create the control database and apply the durability profile's log flushing."""
         self.open_connection(*args)
         sql = f'CREATE DATABASE {args[0]["database"]["run_db"]}'
         try:
             cursor = self.cnx.cursor()
             cursor.execute(sql)
+            self.__set_log_flushing(cursor)
             self.close_connection()
         except mysql.connector.Error as err:
             self.logger.error(err.msg)
 
+    def end_group_commit(self):
+        """Commit the statements held back, close the connection and commit each statement again"""
+
+        if self.__grouping():
+            self.commit_group(force=True)
+            self.__group_thread = None
+            self.close_connection()
+
     def execute_sql_query(self, sql, params=()):
         """Execute a SQL query and return the result.
 
         Assumes DB is already created.
         """
+        started = time.perf_counter_ns()
         try:
             self.open_connection_to_database()
             cursor = self.cnx.cursor()
@@ -61,22 +141,33 @@ class MySqlDAO(DAOInterface):
             self.logger.error(err.msg)
             if self.raise_on_sql_error:
                 raise err
+        finally:
+            if self.stats is not None:
+                self.stats.record(QUERY, time.perf_counter_ns() - started)
 
     def execute_sql_statement(self, sql, params=()):
         """Execute a SQL statement
 
         Assumes DB is already created.
         """
+        started = time.perf_counter_ns()
         try:
             self.open_connection_to_database()
             cursor = self.cnx.cursor()
             cursor.execute(sql, params)
-            self.cnx.commit()
+            if self.__grouping():
+                self.__group_pending = True
+                self.commit_group()
+            else:
+                self.cnx.commit()
             self.close_connection()
         except mysql.connector.Error as err:
             self.logger.error(err.msg)
             if self.raise_on_sql_error:
                 raise err
+        finally:
+            if self.stats is not None:
+                self.stats.record(STATEMENT, time.perf_counter_ns() - started)
 
     def open_connection(self, *args):
         """Opens a database connection.
@@ -100,9 +191,14 @@ class MySqlDAO(DAOInterface):
                 self.cnx.close()
 
     def open_connection_to_database(self, *args):
-        """Opens a database connection to a specific database."""
+        """Opens a database connection to a specific database.
+
+        A thread whose statements are group committed reuses its open connection.
+        """
 
         try:
+            if self.cnx is not None and self.__grouping():
+                return
             self.cnx = mysql.connector.connect(
                 user=self.user,
                 host=self.host,
@@ -117,6 +213,63 @@ class MySqlDAO(DAOInterface):
             else:
                 self.cnx.close()
 
+    def restore_database(self, source):
+        """Replace every table in the run database with the copy in the source database."""
+
+        self.__copy_tables(source, self.run_db)
+
+    def restore_log_flushing(self):
+        """Put back the server's log flushing, if it was changed for the durability profile"""
+
+        if not self.__changed_globals:
+            return
+        try:
+            cnx = mysql.connector.connect(user=self.user, host=self.host, password=self.password)
+            try:
+                cursor = cnx.cursor()
+                for variable, value in self.__changed_globals.items():
+                    cursor.execute(f'SET GLOBAL {variable} = {value}')
+            finally:
+                cnx.close()
+            self.__changed_globals = {}
+        except mysql.connector.Error as err:
+            self.logger.warning(
+                f'Failed to restore the server\'s log flushing ({self.__changed_globals}). ({err.msg})'
+            )
+
+    @contextlib.contextmanager
+    def snapshot(self):
+        """Context manager yielding a Snapshot of the database.
+
+        Reads in a READ ONLY transaction started WITH CONSISTENT SNAPSHOT, on a connection of its own.
+        Errors are logged and raised, whether reading the snapshot or in the body of the with.
+        """
+
+        try:
+            reader = self.__readers.get_nowait()
+        except queue.Empty:
+            reader = None
+        try:
+            if reader is None or not reader.is_connected():
+                reader = mysql.connector.connect(
+                    user=self.user,
+                    host=self.host,
+                    password=self.password,
+                    database=self.run_db
+                )
+            reader.start_transaction(consistent_snapshot=True, readonly=True)
+            yield Snapshot(reader.cursor(), self.prepare_parameterised_statement)
+        except mysql.connector.Error as err:
+            self.logger.error(f'Error reading snapshot: {err.msg}')
+            raise
+        finally:
+            if reader is not None:
+                try:
+                    reader.rollback()
+                    self.__readers.put(reader)
+                except mysql.connector.Error:
+                    reader.close()
+
     @staticmethod
     def prepare_parameterised_statement(sql: str) -> str:
         """Prepare a parameterised sql statement for this RDBMS.
@@ -159,4 +312,56 @@ class MySqlDAO(DAOInterface):
                 f'SELECT execution_phase FROM phases WHERE state = 1'
             )[0][0]
         except IndexError as e:
-            raise ExecutionPhaseNotFound(f'Current execution_phase not found in control database. ({e})')
\ No newline at end of file
+            raise ExecutionPhaseNotFound(f'Current execution_phase not found in control database. ({e})')
+
+    # Private methods
+    def __grouping(self) -> bool:
+        """True if the calling thread's statements are group committed"""
+        return self.__group_thread is not None and self.__group_thread == threading.get_ident()
+
+    def __set_log_flushing(self, cursor):
+        """Apply the profile's log flushing if the properties opt in with mysql_set_global.
+
+        The settings are server wide, affecting every database on it, so otherwise the server's
+        are logged and kept. Changed settings are remembered so restore_log_flushing can put them back.
+        """
+
+        try:
+            cursor.execute('SELECT @@GLOBAL.innodb_flush_log_at_trx_commit, @@GLOBAL.sync_binlog')
+            current = dict(zip(('innodb_flush_log_at_trx_commit', 'sync_binlog'), cursor.fetchall()[0]))
+            wanted = {
+                'innodb_flush_log_at_trx_commit': self.durability.flush_log_at_trx_commit,
+                'sync_binlog': self.durability.sync_binlog
+            }
+            if not self.set_global:
+                self.logger.info(
+                    f'Keeping the server\'s log flushing ({current}) for durability profile ({self.durability.name}). '
+                    f'Set database:mysql_set_global to apply the profile\'s ({wanted}).'
+                )
+                return
+            for variable, value in wanted.items():
+                if int(current[variable]) != value:
+                    cursor.execute(f'SET GLOBAL {variable} = {value}')
+                    self.__changed_globals.setdefault(variable, int(current[variable]))
+        except mysql.connector.Error as err:
+            self.logger.warning(
+                f'Keeping the server\'s log flushing for durability profile ({self.durability.name}). ({err.msg})'
+            )
+
+    def __copy_tables(self, source, target):
+        """Copy the tables and their rows from the source database to the target database."""
+        try:
+            self.open_connection_to_database()
+            cursor = self.cnx.cursor()
+            cursor.execute(f'CREATE DATABASE IF NOT EXISTS {target}')
+            cursor.execute(f'SHOW TABLES FROM {source}')
+            for table in [row[0] for row in cursor.fetchall()]:
+                cursor.execute(f'DROP TABLE IF EXISTS {target}.{table}')
+                cursor.execute(f'CREATE TABLE {target}.{table} LIKE {source}.{table}')
+                cursor.execute(f'INSERT INTO {target}.{table} SELECT * FROM {source}.{table}')
+            self.cnx.commit()
+            self.close_connection()
+        except mysql.connector.Error as err:
+            self.logger.error(err.msg)
+            if self.raise_on_sql_error:
+                raise err
@@ -0,0 +1,42 @@
+"""Consistent read-only views of the control database
+
+A Snapshot is a read transaction on a connection of its own, separate from the one the
+ISM thread writes through. Every query made through it sees the database as it was when
+the snapshot was opened, whatever the loop commits meanwhile, so a dashboard or report
+can make several related SELECTs and get consistent answers.
+
+    with ism.snapshot() as snapshot:
+        phase = snapshot.query('SELECT execution_phase FROM phases WHERE state = ?', (1,))
+        active = snapshot.query('SELECT action FROM actions WHERE active = ?', (1,))
+
+For Sqlite3 the control database is put in WAL mode, where readers neither block nor are
+blocked by the writer. For MySql the snapshot is a READ ONLY transaction started WITH
+CONSISTENT SNAPSHOT, which InnoDB serves without locking the rows read.
+"""
+
+
+class Snapshot:
+    """Queries against one read transaction.
+
+    Attributes
+    ----------
+    cursor:
+        A DB API cursor on the snapshot's connection.
+    prepare: callable
+        The DAO's prepare_parameterised_statement.
+    """
+
+    def __init__(self, cursor, prepare):
+        self.cursor = cursor
+        self.prepare = prepare
+
+    def query(self, sql, params=()) -> list:
+        """Execute a SELECT and return the rows.
+
+        Parameterised SQL may use either ? or %s. It is prepared for the RDBMS in use.
+        """
+
+        if params:
+            sql = self.prepare(sql)
+        self.cursor.execute(sql, params)
+        return self.cursor.fetchall()
@@ -1,13 +1,26 @@
 """
 Methods for handling DB creation and CRUD operations in Sqlite3.
+
+The database is put in WAL mode so snapshots can read it on their own connections
+without blocking, or being blocked by, the ISM thread's writes. Each connection's
+synchronous setting, and whether the ISM thread's statements are group committed, come
+from the durability profile. See ism.dal.durability.
 """
 
 # Standard library imports
+import contextlib
 import logging
+import os
+import queue
 import sqlite3
+import threading
+import time
 
 # Local application imports
+from ism.dal import durability
 from ism.exceptions.exceptions import UnrecognisedParameterisationCharacter
+from ism.dal.snapshot import Snapshot
+from ism.dal.statement_stats import QUERY, STATEMENT
 from ism.interfaces.dao_interface import DAOInterface
 
 
@@ -19,26 +32,104 @@ class Sqlite3DAO(DAOInterface):
         self.raise_on_sql_error = args[0].get('database', {}).get('raise_on_sql_error', False)
         self.logger = logging.getLogger('ism.sqlite3_dao.Sqlite3DAO')
         self.logger.info('Initialising Sqlite3DAO.')
-        self.cnx = None
+        self.durability = durability.profile(args[0].get('database', {}))
+        self.__local = threading.local()
+        # Idle read-only connections reused by snapshot()
+        self.__readers = queue.SimpleQueue()
+        # The thread whose statements are group committed, its connection kept open between them
+        self.__group_thread = None
+        self.__group_pending = False
+        self.__group_committed_ns = 0
+        # Optional StatementStats counting and timing the SQL executed
+        self.stats = None
+        # Statements executed, so the template cache can tell if anything else wrote to the database
+        self.writes = 0
+
+    @property
+    def cnx(self):
+        """The connection is per thread so callers outside the ISM thread don't close its connection"""
+        return getattr(self.__local, 'cnx', None)
+
+    @cnx.setter
+    def cnx(self, cnx):
+        self.__local.cnx = cnx
+
+    def backup_database(self, target):
+        """Copy the database to the target path using the Sqlite3 backup API.
+
+        The copy is made to a temporary file and moved into place so that the
+        target is never left half written. Statements held back by group commit
+        are committed first.
+        """
+
+        self.commit_group(force=True)
+        temp = f'{target}.{os.getpid()}.tmp'
+        source = sqlite3.connect(self.db_path)
+        destination = sqlite3.connect(temp)
+        try:
+            source.backup(destination)
+        finally:
+            destination.close()
+            source.close()
+        os.replace(temp, target)
+
+    def begin_group_commit(self):
+        """Hold back the commits of the calling thread's statements for the durability profile's
+        group commit interval. Does nothing if the profile doesn't group commit."""
+
+        if self.durability.group_commit_ms:
+            self.__group_thread = threading.get_ident()
+            self.__group_committed_ns = time.monotonic_ns()
 
     def close_connection(self):
-        if self.cnx:
+        if self.cnx and not self.__grouping():
             self.cnx.close()
+            self.cnx = None
+
+    def close_snapshot_connections(self):
+        """Close the idle connections kept for snapshots"""
+
+        while True:
+            try:
+                self.__readers.get_nowait().close()
+            except queue.Empty:
+                return
+
+    def commit_group(self, force=False):
+        """Commit the statements held back by group commit once the interval has passed, or now if force"""
+
+        if not self.__grouping() or not self.__group_pending:
+            return
+        now_ns = time.monotonic_ns()
+        if force or now_ns - self.__group_committed_ns >= self.durability.group_commit_ms * 1000000:
+            self.cnx.commit()
+            self.__group_pending = False
+            self.__group_committed_ns = now_ns
 
     def create_database(self, *args):
-        """Calling open_connection creates the database in SQLITE3
+        """Calling open_connection creates the database in SQLITE3, in WAL mode.
 
         Seems redundant but is useful to honour the interface.
         """
 
         self.open_connection(*args)
+        self.__enable_wal(self.cnx)
         self.close_connection()
 
+    def end_group_commit(self):
+        """Commit the statements held back, close the connection and commit each statement again"""
+
+        if self.__grouping():
+            self.commit_group(force=True)
+            self.__group_thread = None
+            self.close_connection()
+
     def execute_sql_query(self, sql, params=()):
         """Execute a SQL query and return the result.
 
         @:param query. { sql: 'SELECT ...', params: params
         """
+        started = time.perf_counter_ns()
         try:
             self.open_connection()
             cursor = self.cnx.cursor()
@@ -50,31 +141,90 @@ class Sqlite3DAO(DAOInterface):
             logging.error(f'Error executing sql query ({sql}) ({params}): {e}')
             if self.raise_on_sql_error:
                 raise e
+        finally:
+            if self.stats is not None:
+                self.stats.record(QUERY, time.perf_counter_ns() - started)
 
     def execute_sql_statement(self, sql, params=()):
         """Execute a SQL statement and return the exit code"""
+        started = time.perf_counter_ns()
+        self.writes += 1
         try:
             self.open_connection()
             cursor = self.cnx.cursor()
             cursor.execute(sql, params)
-            self.cnx.commit()
+            if self.__grouping():
+                self.__group_pending = True
+                self.commit_group()
+            else:
+                self.cnx.commit()
             self.close_connection()
         except sqlite3.Error as e:
             logging.error(f'Error executing sql query ({sql}) ({params}): {e}')
             if self.raise_on_sql_error:
                 raise e
+        finally:
+            if self.stats is not None:
+                self.stats.record(STATEMENT, time.perf_counter_ns() - started)
 
     def open_connection(self, *args) -> sqlite3.Connection:
         """Creates a database connection.
 
-        Opens a SQLITE3 database connection and returns a connector.
+        Opens a SQLITE3 database connection and returns a connector. A thread whose
+        statements are group committed reuses its open connection.
         """
         try:
+            if self.cnx is not None and self.__grouping():
+                return self.cnx
             self.cnx = sqlite3.connect(self.db_path)
+            self.cnx.execute(f'PRAGMA synchronous={self.durability.synchronous}')
             return self.cnx
         except sqlite3.Error as error:
             self.logger.error("Error while connecting to Sqlite3 database.", error)
 
+    def restore_database(self, source):
+        """Replace the database with the copy at the source path using the Sqlite3 backup API."""
+
+        checkpoint = sqlite3.connect(source)
+        destination = sqlite3.connect(self.db_path)
+        try:
+            checkpoint.backup(destination)
+            # The copy brings the checkpoint's journal mode with it
+            self.__enable_wal(destination)
+        finally:
+            destination.close()
+            checkpoint.close()
+
+    @contextlib.contextmanager
+    def snapshot(self):
+        """Context manager yielding a Snapshot of the database, read on a read-only connection.
+
+        The read transaction is started on entry, so every query sees the database as it was then.
+        Errors are logged and raised, whether reading the snapshot or in the body of the with.
+        """
+
+        try:
+            reader = self.__readers.get_nowait()
+        except queue.Empty:
+            reader = sqlite3.connect(
+                f'file:{self.db_path}?mode=ro', uri=True, isolation_level=None, check_same_thread=False
+            )
+        try:
+            cursor = reader.cursor()
+            cursor.execute('BEGIN')
+            # A deferred transaction takes its snapshot at the first read
+            cursor.execute('SELECT COUNT(*) FROM sqlite_master')
+            yield Snapshot(cursor, self.prepare_parameterised_statement)
+        except sqlite3.Error as e:
+            self.logger.error(f'Error reading snapshot: {e}')
+            raise
+        finally:
+            try:
+                reader.rollback()
+                self.__readers.put(reader)
+            except sqlite3.Error:
+                reader.close()
+
     @staticmethod
     def prepare_parameterised_statement(sql: str) -> str:
         """Prepare a parameterised sql statement for this RDBMS.
@@ -101,3 +251,13 @@ class Sqlite3DAO(DAOInterface):
             raise UnrecognisedParameterisationCharacter(
                 f'Parameterisation character not recognised / found in SQL string ({sql})'
             )
+
+    # Private methods
+    def __grouping(self) -> bool:
+        """True if the calling thread's statements are group committed"""
+        return self.__group_thread is not None and self.__group_thread == threading.get_ident()
+
+    @staticmethod
+    def __enable_wal(cnx):
+        """Put the database in WAL mode. The mode is persistent, so only needed once per database file."""
+        cnx.execute('PRAGMA journal_mode=WAL')
@@ -0,0 +1,34 @@
+"""Count and time the SQL executed through a DAO
+
+Enabled by setting the DAO's stats attribute, as the ISM does when its metrics exporter
+is enabled. Each query or statement adds one to the count and its duration to the total
+for its kind, so the mean latency is the total over the count.
+"""
+
+# Standard library imports
+import threading
+
+QUERY = 'query'
+STATEMENT = 'statement'
+
+
+class StatementStats:
+    """Thread safe totals of the SQL executed, by kind."""
+
+    def __init__(self):
+        self.__lock = threading.Lock()
+        self.__counts = {QUERY: 0, STATEMENT: 0}
+        self.__nanoseconds = {QUERY: 0, STATEMENT: 0}
+
+    def record(self, kind: str, elapsed_ns: int):
+        """Add one execution of kind, query or statement, taking elapsed_ns"""
+
+        with self.__lock:
+            self.__counts[kind] += 1
+            self.__nanoseconds[kind] += elapsed_ns
+
+    def totals(self) -> dict:
+        """kind -> (count, total seconds)"""
+
+        with self.__lock:
+            return {kind: (self.__counts[kind], self.__nanoseconds[kind] / 1e9) for kind in self.__counts}
@@ -0,0 +1,116 @@
+"""
+Cache of initialised Sqlite3 control databases.
+
+Creating a run replays the core schema.json and data.json, then the files of every
+imported action pack, one statement at a time. The template cache stores the database
+that results from each step, keyed by a hash chained over the content of every file
+replayed so far and the name of the package each came from. A new run with the same
+core and packs clones the cached database with the Sqlite3 backup API instead of
+replaying the statements.
+
+A template is only a faithful copy while the control database has received nothing but
+that chain of statements. The ISM stops using the cache for the rest of a run once
+anything else has been written to it, e.g. a timer set between creating the ISM and
+importing an action pack, so the write is neither stored in a template nor overwritten
+by a clone.
+
+Keys are derived from file content, so editing a schema or data file produces a new
+key and the template built from the old content is never used again. Templates that
+are no longer used are pruned, least recently used first, once the cache holds more
+than max_templates.
+"""
+
+# Standard library imports
+import hashlib
+import logging
+import os
+import sqlite3
+
+# Bump to invalidate every template if the way they are built changes
+TEMPLATE_FORMAT = '2'
+
+
+class TemplateCache:
+    """Stores and clones initialised Sqlite3 databases.
+
+    Attributes
+    ----------
+    directory: str
+        Where the template databases are stored.
+    max_templates: int
+        The number of templates kept before the least recently used are pruned.
+    hits: int
+        Count of statements sets satisfied from the cache.
+    misses: int
+        Count of statements sets that had to be replayed.
+    """
+
+    def __init__(self, directory, max_templates=32):
+        self.directory = directory
+        self.max_templates = max_templates
+        self.hits = 0
+        self.misses = 0
+        self.logger = logging.getLogger('ism.template_cache.TemplateCache')
+        os.makedirs(self.directory, exist_ok=True)
+
+    @staticmethod
+    def root_key(rdbms: str) -> str:
+        """The key that every chain of templates starts from"""
+        return hashlib.sha256(f'{TEMPLATE_FORMAT}:{rdbms}:{sqlite3.sqlite_version}'.encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def key(previous: str, package: str, source: bytes) -> str:
+        """Chain the key for the database after replaying the package's source on top of previous"""
+        return hashlib.sha256(previous.encode('utf-8') + b'\0' + package.encode('utf-8') + b'\0' + source).hexdigest()
+
+    def path(self, key: str) -> str:
+        """The path to the template for key"""
+        return f'{self.directory}{os.path.sep}{key}.db'
+
+    def contains(self, key: str) -> bool:
+        """Test if there is a template for key"""
+        return os.path.exists(self.path(key))
+
+    def clone(self, key: str, dao) -> bool:
+        """Replace the control database with the template for key.
+
+        :return False if the template is missing or unreadable, in which case it is removed
+        """
+
+        path = self.path(key)
+        if not os.path.exists(path):
+            return False
+        try:
+            dao.restore_database(path)
+            os.utime(path)
+            self.hits += 1
+            return True
+        except (OSError, sqlite3.Error) as e:
+            self.logger.warning(f'Discarding unusable template ({path}). ({e})')
+            self.__remove(path)
+            return False
+
+    def store(self, key: str, dao):
+        """Store the control database as the template for key"""
+
+        dao.backup_database(self.path(key))
+        self.misses += 1
+        self.__prune()
+
+    # Private methods
+    def __prune(self):
+        """Remove the least recently used templates beyond max_templates"""
+
+        templates = [
+            f'{self.directory}{os.path.sep}{file}' for file in os.listdir(self.directory) if file.endswith('.db')
+        ]
+        if len(templates) > self.max_templates:
+            templates.sort(key=os.path.getmtime)
+            for path in templates[:len(templates) - self.max_templates]:
+                self.__remove(path)
+
+    def __remove(self, path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
@@ -8,6 +8,27 @@ class ActivationOutOfPhase(Exception):
         super().__init__(self.message)
 
 
+class ActionPackNotImported(Exception):
+
+    def __init__(self, message='Action pack has not been imported into the run'):
+        self.message = message
+        super().__init__(self.message)
+
+
+class CheckpointNotFound(Exception):
+
+    def __init__(self, message='Checkpoint not found in run directory'):
+        self.message = message
+        super().__init__(self.message)
+
+
+class CorruptSegmentLog(Exception):
+
+    def __init__(self, message='Record in segment log failed its checksum'):
+        self.message = message
+        super().__init__(self.message)
+
+
 class DuplicateDataInControlDatabase(Exception):
 
     def __init(self, message='Duplicate records found in control database'):
@@ -15,6 +36,13 @@ class DuplicateDataInControlDatabase(Exception):
         super().__init__(self.message)
 
 
+class DurabilityProfileNotRecognised(Exception):
+
+    def __init__(self, message='Durability profile not recognised'):
+        self.message = message
+        super().__init__(self.message)
+
+
 class ExecutionPhaseNotFound(Exception):
 
     def __init(self, message='Current execution_phase not found in control database'):
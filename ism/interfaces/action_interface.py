@@ -5,5 +5,8 @@ class ActionInterface:
 
     def execute(self):
         """Primary method of any action is to execute the code required to
-        fulfil the action"""
+        fulfil the action.
+
+        May be a generator. Each dispatch of the action then advances it to its
+        next yield, so long running work doesn't block the other actions."""
         pass
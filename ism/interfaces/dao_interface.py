@@ -5,14 +5,35 @@ Interface defines required methods for a Data Access Layer.
 
 class DAOInterface:
 
+    def backup_database(self, target):
+        """Copy the control database to the target for a checkpoint."""
+        pass
+
+    def begin_group_commit(self):
+        """Hold back the commits of the calling thread's statements for the durability profile's
+        group commit interval. See ism.dal.durability."""
+        pass
+
     def close_connection(self):
         """Close the connection if open"""
         pass
 
+    def close_snapshot_connections(self):
+        """Close the idle connections kept for snapshots"""
+        pass
+
+    def commit_group(self, force=False):
+        """Commit the statements held back by group commit once the interval has passed, or now if force"""
+        pass
+
     def create_database(self, *args):
         """Create the control database."""
         pass
 
+    def end_group_commit(self):
+        """Commit the statements held back and commit each statement as it is executed again"""
+        pass
+
     def execute_sql_query(self, sql, params=()):
         """Execute a SQL query and return the result."""
         pass
@@ -29,6 +50,18 @@ class DAOInterface:
         """Creates a connection to the specific DB"""
         pass
 
+    def restore_database(self, source):
+        """Replace the contents of the control database with the checkpoint copy in source."""
+        pass
+
+    def restore_log_flushing(self):
+        """Put back any server wide settings changed for the durability profile"""
+        pass
+
+    def snapshot(self):
+        """Context manager yielding a read-only ism.dal.snapshot.Snapshot of the control database"""
+        pass
+
     @staticmethod
     def prepare_parameterised_statement(sql: str) -> str:
         """Prepare a parameterised sql statement for this RDBMS."""
@@ -0,0 +1,324 @@
+"""Soak an ISM under sustained load and report how its memory and latency change over time
+
+Installs N synthetic entity actions and drives them from an action on the loop at the
+activation, payload and timer rates given, for the duration given. An entity reads and
+clears its payload and deactivates itself when it runs. At every sample interval the
+generator records:
+    * The process's resident set size.
+    * The memory traced by tracemalloc and the allocators that have grown most since the
+    first sample.
+    * The size of the control database, including its WAL.
+    * The tick latency percentiles over the interval, timed between the driver's runs.
+    * The activations, payloads and timers driven.
+
+    python -m ism.loadgen --duration 3600 --actions 10000 --activations 50 --payloads 20 --timers 5
+
+Each activation costs the entity a few statements, so with the default strict durability
+profile a few hundred a second is enough to saturate the loop. See ism.dal.durability.
+
+The report is written as JSON to the run directory, or --report, and summarised on
+stdout. The first --warmup fraction of the samples is ignored. Over the rest the report
+fits a line to each memory series and the database size and flags:
+    * leak - RSS or traced memory growing faster than --leak-mb-per-hour, and by more than
+    --leak-min-mb over the run, so the settling of a short run isn't taken for a leak.
+    * db_growth - The control database growing faster than --db-mb-per-hour. e.g. timers
+    are deactivated once fired but never deleted.
+    * latency_degradation - The p99 tick latency of the last quarter of the samples over
+    --degradation times that of the first.
+
+Uses ism/loadgen.yaml, a Sqlite3 run without the checkpoints, metrics exporter, watchdog
+and debug logging of the unit tests' properties, unless --properties is given. tracemalloc slows the loop down considerably. --no-tracemalloc leaves it off.
+"""
+
+# Standard library imports
+import argparse
+import collections
+import json
+import os
+import random
+import resource
+import sys
+import threading
+import time
+import tracemalloc
+
+# Local application imports
+from ism.ISM import ISM
+from ism.core.base_action import BaseAction
+
+PROPERTIES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'loadgen.yaml')
+
+
+class ActionLoadEntity(BaseAction):
+    """A synthetic entity. Reads and clears its payload, then deactivates."""
+
+    __slots__ = ()
+
+    def execute(self):
+        if self.active():
+            if self.get_payload()[0][0] is not None:
+                self.clear_payload()
+            self.deactivate()
+
+
+class ActionLoadDriver(BaseAction):
+    """Activates entities, sets their payloads and sets timers for them at the configured rates.
+
+    Times the interval between its runs, one a tick, and shuts the ISM down after the duration.
+    The times are queued for the sampler's thread, which pops them off the other end.
+    """
+
+    settings = None
+    ticks_ns = collections.deque()
+    driven = {'activations': 0, 'payloads': 0, 'timers': 0}
+
+    def execute(self):
+        if not self.active():
+            return
+        settings = self.settings
+        now = time.perf_counter()
+        if 'started' not in settings:
+            settings['started'] = now
+            settings['random'] = random.Random(settings['seed'])
+            settings['payload'] = json.dumps({'load': 'x' * max(settings['payload_bytes'] - 11, 0)})
+        else:
+            self.ticks_ns.append(int((now - settings['previous']) * 1e9))
+        settings['previous'] = now
+        elapsed = now - settings['started']
+        if elapsed >= settings['duration']:
+            self.deactivate()
+            self.activate('ActionNormalShutdown')
+            return
+
+        entities = settings['actions']
+        chooser = settings['random']
+        for kind in ('payloads', 'activations', 'timers'):
+            due = int(elapsed * settings[kind]) - self.driven[kind]
+            for _ in range(due):
+                entity = f'ActionLoadEntity{chooser.randrange(entities)}'
+                if kind == 'activations':
+                    self.activate(entity)
+                elif kind == 'payloads':
+                    self.set_payload(entity, settings['payload'])
+                else:
+                    self.set_timer(entity, None, self.set_timer_expiry(milliseconds=chooser.randint(1, 1000)))
+            self.driven[kind] += due
+
+
+def install(ism: ISM, actions: int):
+    """Insert the rows for the entity actions and the driver, and create the actions"""
+
+    if ism.properties['database']['rdbms'].lower() == 'sqlite3':
+        name = "'ActionLoadEntity' || n"
+    else:
+        name = "CONCAT('ActionLoadEntity', n)"
+    ism.dao.execute_sql_statement(
+        f"INSERT INTO actions (action, execution_phase, payload, active) "
+        f"WITH RECURSIVE seq(n) AS (SELECT 0 UNION ALL SELECT n + 1 FROM seq WHERE n < {actions - 1}) "
+        f"SELECT {name}, 'RUNNING', NULL, 0 FROM seq"
+    )
+    ism.dao.execute_sql_statement(
+        "INSERT INTO actions (action, execution_phase, payload, active) VALUES ('ActionLoadDriver', 'RUNNING', NULL, 1)"
+    )
+    for n in range(actions):
+        ism.create_action(ActionLoadEntity, f'ActionLoadEntity{n}')
+    ism.create_action(ActionLoadDriver)
+    ism.registry.load()
+
+
+def rss_bytes() -> int:
+    """The resident set size of the process, or its peak where the current size isn't available"""
+
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Kilobytes on Linux, bytes on macOS
+        return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def db_bytes(ism: ISM) -> int:
+    """The size of a Sqlite3 control database and its WAL. None for MySql."""
+
+    path = ism.properties['database'].get('db_path')
+    if not path:
+        return None
+    return sum(os.path.getsize(file) for file in (path, f'{path}-wal') if os.path.exists(file))
+
+
+def percentile(ordered: list, fraction: float):
+    """The value at the fraction of the way through the sorted list, or None if it is empty"""
+
+    if not ordered:
+        return None
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def slope_per_hour(samples: list, key: str):
+    """Least squares growth of a sampled series, in its units per hour"""
+
+    points = [(sample['elapsed_s'], sample[key]) for sample in samples if sample[key] is not None]
+    if len(points) < 2:
+        return None
+    mean_x = sum(x for x, _ in points) / len(points)
+    mean_y = sum(y for _, y in points) / len(points)
+    variance = sum((x - mean_x) ** 2 for x, _ in points)
+    if not variance:
+        return None
+    return sum((x - mean_x) * (y - mean_y) for x, y in points) / variance * 3600
+
+
+def analyse(samples: list, warmup: float, leak_mb_per_hour: float, leak_min_mb: float, db_mb_per_hour: float,
+            degradation: float) -> dict:
+    """Fit the trends of the samples after the warm up and flag leaks, database growth and slowing ticks"""
+
+    steady = samples[int(len(samples) * warmup):]
+    trends = {
+        'rss_mb_per_hour': slope_per_hour(steady, 'rss_bytes'),
+        'traced_mb_per_hour': slope_per_hour(steady, 'traced_bytes'),
+        'db_mb_per_hour': slope_per_hour(steady, 'db_bytes')
+    }
+    trends = {key: None if value is None else value / 1048576 for key, value in trends.items()}
+    flags = []
+    hours = (steady[-1]['elapsed_s'] - steady[0]['elapsed_s']) / 3600 if steady else 0
+    for key in ('rss_mb_per_hour', 'traced_mb_per_hour'):
+        if trends[key] is not None and trends[key] > leak_mb_per_hour and trends[key] * hours > leak_min_mb:
+            flags.append(f'leak: {key[:-len("_mb_per_hour")]} growing {trends[key]:.1f}MB/hour')
+    if trends['db_mb_per_hour'] is not None and trends['db_mb_per_hour'] > db_mb_per_hour:
+        flags.append(f'db_growth: control database growing {trends["db_mb_per_hour"]:.1f}MB/hour')
+
+    quarter = max(len(steady) // 4, 1)
+    first = [sample['tick_p99_us'] for sample in steady[:quarter] if sample['tick_p99_us'] is not None]
+    last = [sample['tick_p99_us'] for sample in steady[-quarter:] if sample['tick_p99_us'] is not None]
+    trends['tick_p99_ratio'] = None
+    if len(steady) >= 4 and first and last and max(first):
+        trends['tick_p99_ratio'] = max(last) / max(first)
+        if trends['tick_p99_ratio'] > degradation:
+            flags.append(f'latency_degradation: tick p99 up {trends["tick_p99_ratio"]:.1f}x '
+                         f'from {max(first):.0f}us to {max(last):.0f}us')
+    return {'trends': trends, 'flags': flags}
+
+
+class Sampler:
+    """Samples the running ISM on a thread of its own every interval seconds"""
+
+    def __init__(self, ism: ISM, interval: float, top: int):
+        self.ism = ism
+        self.interval = interval
+        self.top = top
+        self.samples = []
+        self.baseline = None
+        self.started = time.perf_counter()
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.__run, name='ism-loadgen-sampler', daemon=True)
+
+    def sample(self) -> dict:
+        queued = ActionLoadDriver.ticks_ns
+        ordered = sorted(queued.popleft() for _ in range(len(queued)))
+        sample = {
+            'elapsed_s': round(time.perf_counter() - self.started, 3),
+            'rss_bytes': rss_bytes(),
+            'traced_bytes': None,
+            'db_bytes': db_bytes(self.ism),
+            'ticks': len(ordered),
+            'tick_p50_us': None if not ordered else percentile(ordered, 0.5) / 1000,
+            'tick_p95_us': None if not ordered else percentile(ordered, 0.95) / 1000,
+            'tick_p99_us': None if not ordered else percentile(ordered, 0.99) / 1000,
+            'tick_max_us': None if not ordered else ordered[-1] / 1000,
+            'driven': dict(ActionLoadDriver.driven),
+            'top_allocators': []
+        }
+        if tracemalloc.is_tracing():
+            sample['traced_bytes'] = tracemalloc.get_traced_memory()[0]
+            snapshot = tracemalloc.take_snapshot()
+            if self.baseline is None:
+                self.baseline = snapshot
+            sample['top_allocators'] = [
+                {'where': str(stat.traceback), 'size_bytes': stat.size, 'growth_bytes': stat.size_diff}
+                for stat in snapshot.compare_to(self.baseline, 'lineno')[:self.top]
+            ]
+        self.samples.append(sample)
+        return sample
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+        self.thread.join()
+        self.sample()
+
+    # Private methods
+    def __run(self):
+        while not self.stopped.wait(self.interval):
+            sample = self.sample()
+            print(f'{sample["elapsed_s"]:>9.0f}s rss {sample["rss_bytes"] / 1048576:>8.1f}MB '
+                  f'db {(sample["db_bytes"] or 0) / 1048576:>8.1f}MB ticks {sample["ticks"]:>8} '
+                  f'p99 {sample["tick_p99_us"] or 0:>9.0f}us', flush=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Soak an ISM under load and report memory and latency growth')
+    parser.add_argument('--properties', default=PROPERTIES, help='ISM properties file')
+    parser.add_argument('--duration', type=float, default=60, help='Seconds to run for')
+    parser.add_argument('--actions', type=int, default=1000, help='Number of entity actions installed')
+    parser.add_argument('--activations', type=float, default=50, help='Activations a second')
+    parser.add_argument('--payloads', type=float, default=20, help='Payloads set a second')
+    parser.add_argument('--timers', type=float, default=5, help='Timers set a second, expiring within a second')
+    parser.add_argument('--payload-bytes', type=int, default=256)
+    parser.add_argument('--interval', type=float, default=5, help='Seconds between samples')
+    parser.add_argument('--top', type=int, default=10, help='Number of allocators sampled')
+    parser.add_argument('--no-tracemalloc', action='store_true')
+    parser.add_argument('--warmup', type=float, default=0.2, help='Fraction of the samples ignored')
+    parser.add_argument('--leak-mb-per-hour', type=float, default=10)
+    parser.add_argument('--leak-min-mb', type=float, default=4)
+    parser.add_argument('--db-mb-per-hour', type=float, default=100)
+    parser.add_argument('--degradation', type=float, default=2, help='Tick p99 ratio flagged')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--report', help='Report path. loadgen_report.json in the run directory by default')
+    args = parser.parse_args()
+
+    ism = ISM({'properties_file': args.properties})
+    install(ism, args.actions)
+    ActionLoadDriver.settings = {
+        'duration': args.duration,
+        'actions': args.actions,
+        'activations': args.activations,
+        'payloads': args.payloads,
+        'timers': args.timers,
+        'payload_bytes': args.payload_bytes,
+        'seed': args.seed
+    }
+    if not args.no_tracemalloc:
+        tracemalloc.start()
+    sampler = Sampler(ism, args.interval, args.top)
+    sampler.sample()
+    sampler.start()
+    ism.start(join=True)
+    sampler.stop()
+    if tracemalloc.is_tracing():
+        tracemalloc.stop()
+
+    report = {
+        'settings': {key: value for key, value in vars(args).items()},
+        'run_dir': ism.properties['runtime']['run_dir'],
+        'samples': sampler.samples
+    }
+    report.update(analyse(
+        sampler.samples, args.warmup, args.leak_mb_per_hour, args.leak_min_mb, args.db_mb_per_hour, args.degradation
+    ))
+    path = args.report or os.path.join(ism.properties['runtime']['run_dir'], 'loadgen_report.json')
+    with open(path, 'w') as file:
+        json.dump(report, file, indent=2)
+
+    last = sampler.samples[-1]
+    print(f'Driven {last["driven"]} in {last["elapsed_s"]:.0f}s')
+    for key, value in report['trends'].items():
+        print(f'{key:<20} {"-" if value is None else f"{value:.2f}"}')
+    print('\n'.join(report['flags']) if report['flags'] else 'No leaks or degradation flagged')
+    print(f'Report written to ({path})')
+
+
+if __name__ == '__main__':
+    main()
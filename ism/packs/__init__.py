@@ -0,0 +1,4 @@
+"""Action packs shipped with the ISM. Import one into a run by name, e.g.
+
+    ism.import_action_pack('ism.packs.shm_ring')
+"""
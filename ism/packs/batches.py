@@ -0,0 +1,54 @@
+"""Pass batches of messages to actions as their payloads
+
+Used by the packs that receive messages in bulk. An action is passed the messages that
+arrived for it as one payload, a JSON array, and activated once however many there were.
+If it hasn't consumed its last batch yet, it is still active with that payload, so the
+new messages are added to the end of it rather than replacing it. A pending payload that
+isn't a JSON array, e.g. one set by set_payload, isn't a batch. It is replaced, with a
+warning.
+"""
+
+# Standard library imports
+import json
+
+# Local application imports
+from ism.core.payload_store import is_reference
+
+
+def deliver(action, batches: dict):
+    """Set the payloads of the actions in batches and activate them.
+
+    :param action The action delivering the batches, whose dao and payload store are used.
+    :param batches Action name -> list of the JSON texts, str or bytes, of its messages.
+    """
+
+    sql = action.dao.prepare_parameterised_statement('SELECT payload, active FROM actions WHERE action = ?')
+    for name, messages in batches.items():
+        batch = b','.join(message if isinstance(message, bytes) else message.encode('utf-8') for message in messages)
+        batch = batch.decode('utf-8')
+        rows = action.dao.execute_sql_query(sql, (name,))
+        if not rows:
+            action.logger.error(f'Dropped ({len(messages)}) messages for unknown action ({name})')
+            continue
+        pending, active = rows[0]
+        payload = f'[{batch}]'
+        if active and pending:
+            if is_reference(pending):
+                pending = action.payloads.text(pending)
+            if _is_batch(pending):
+                pending = pending.strip()
+                # The messages are spliced in as text rather than parsed and serialised again
+                payload = f'{pending[:-1]},{batch}]' if pending[1:-1].strip() else payload
+            else:
+                action.logger.warning(f'Replaced the pending payload of action ({name}), which isn\'t a batch')
+        action.set_payload(name, payload)
+        action.activate(name)
+
+
+def _is_batch(payload: str) -> bool:
+    """True if the payload is a JSON array"""
+
+    try:
+        return isinstance(json.loads(payload), list)
+    except ValueError:
+        return False
@@ -0,0 +1,25 @@
+"""Inbound channel for producer processes on the same host, over a shared memory ring buffer
+
+ActionIngestRing creates the ring when the run enters RUNNING and, each tick, drains every
+message written since the last. The messages for each action are passed to it as one
+payload, a JSON array of the message payloads in the order sent, and the action is
+activated. A batch not yet consumed by its action is extended, not replaced.
+
+Producers attach to the ring by name:
+
+    from ism.packs.shm_ring.ring_buffer import RingProducer
+
+    with RingProducer('ism_ring') as producer:
+        while not producer.send('ActionProcessOrder', '{"order": 42}'):
+            time.sleep(0.001)  # The ring is full. Back off
+
+send() returns False rather than blocking when the ring is full. Payloads must be JSON.
+Messages that aren't, and any the ingest can't read, are logged and dropped.
+Configure the ring in the properties file:
+
+    shm_ring:
+      name: ism_ring
+      capacity_bytes: 4194304
+
+There must be only one producer process writing to a ring.
+"""
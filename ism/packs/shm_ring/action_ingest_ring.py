@@ -0,0 +1,78 @@
+"""Drain the shared memory ring into the payloads of the actions its messages are for
+
+See ism.packs.shm_ring.
+"""
+
+# Standard library imports
+import json
+from multiprocessing import shared_memory
+
+# Local application imports
+from ism.core import events
+from ism.core.base_action import BaseAction
+from ism.packs.batches import deliver
+from ism.packs.shm_ring.ring_buffer import RingBuffer
+
+
+class ActionIngestRing(BaseAction):
+    """Each tick, passes the messages written to the ring since the last to their actions and activates them.
+
+    Messages whose payload isn't JSON, or whose frame is corrupt, are logged and dropped.
+
+    Attributes
+    ----------
+    ring: RingBuffer
+        Created the first time the action runs and closed when the ISM shuts down.
+    received: int
+        Messages ingested.
+    """
+
+    ring = None
+    received = 0
+
+    def execute(self):
+
+        if self.active():
+
+            if self.ring is None:
+                self.__open()
+            dropped = self.ring.dropped
+            messages = self.ring.drain()
+            if self.ring.dropped > dropped:
+                self.logger.error(f'Dropped ({self.ring.dropped - dropped}) malformed messages from the ring')
+
+            batches = {}
+            for action, payload in messages:
+                try:
+                    json.loads(payload)
+                except ValueError as e:
+                    self.logger.error(f'Dropped message for action ({action}) with a payload that isn\'t JSON. ({e})')
+                    continue
+                batches.setdefault(action, []).append(payload)
+            if batches:
+                self.received += sum(len(payloads) for payloads in batches.values())
+                deliver(self, batches)
+
+    # Private methods
+    def __open(self):
+        """Create the ring and close it when the ISM shuts down"""
+
+        config = self.properties.get('shm_ring', {})
+        name = config.get('name', 'ism_ring')
+        capacity = config.get('capacity_bytes', 4194304)
+        try:
+            self.ring = RingBuffer(name, capacity)
+        except FileExistsError:
+            # Left behind by a run that didn't shut down cleanly
+            self.logger.warning(f'Replacing stale shared memory ring ({name})')
+            stale = shared_memory.SharedMemory(name=name)
+            stale.close()
+            stale.unlink()
+            self.ring = RingBuffer(name, capacity)
+        self.events.subscribe(events.SHUTDOWN, self.__close)
+        self.logger.info(f'Receiving messages on shared memory ring ({name}) of ({capacity}) bytes')
+
+    def __close(self, event):
+        self.events.unsubscribe(events.SHUTDOWN, self.__close)
+        self.ring.close()
+        self.ring = None
@@ -0,0 +1,195 @@
+"""Single producer, single consumer ring buffer in multiprocessing.shared_memory
+
+Layout, with the indices on separate cache lines so the producer and consumer don't
+contend for one:
+
+    0    capacity    uint64
+    64   head        uint64 Bytes ever written. Only the producer stores it.
+    128  tail        uint64 Bytes ever read. Only the consumer stores it.
+    192  data        capacity bytes, a power of two
+
+Each message is framed as a uint32 length, a uint16 action name length, the action name
+and the payload, all little endian and wrapping around the end of the data. The
+producer writes a message then publishes it by storing head. The consumer reads up to
+head then frees the space by storing tail. Neither takes a lock.
+
+The consumer doesn't trust the producer. A message whose action name isn't UTF-8 is
+dropped. A frame running past the end of the published bytes can't be stepped over, so
+it and everything after it in the drain is dropped. Both are counted in dropped.
+
+That relies on an aligned 8 byte store being atomic and not being reordered with the
+stores before it. x86-64 guarantees both. Weakly ordered CPUs, e.g. ARM64, don't
+guarantee the ordering. The indices are stored through a memoryview of native unsigned
+64 bit ints, which CPython writes with a single store. struct.pack_into('<Q') writes
+them a byte at a time, so a reader could see half of an update.
+"""
+
+# Standard library imports
+import struct
+from multiprocessing import resource_tracker, shared_memory
+
+HEADER = 192
+# Positions of the header fields as 8 byte words
+CAPACITY = 0
+HEAD = 8
+TAIL = 16
+FRAME = struct.Struct('<IH')
+
+# Rings created by this process, and its forks, which share its resource tracker
+_created = set()
+
+
+def _attach(name: str) -> shared_memory.SharedMemory:
+    """Attach to an existing block without the resource tracker unlinking it when this process exits"""
+
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        # Before Python 3.13 every attach is tracked. Untrack it unless the tracking is the creator's
+        memory = shared_memory.SharedMemory(name=name)
+        if name not in _created:
+            resource_tracker.unregister(memory._name, 'shared_memory')
+        return memory
+
+
+class _Ring:
+    """Reads and writes of the data region, wrapping at its end"""
+
+    def __init__(self, memory: shared_memory.SharedMemory):
+        self.memory = memory
+        self.buffer = memory.buf
+        self.header = memory.buf[:HEADER].cast('Q')
+        self.capacity = self.header[CAPACITY]
+        self.mask = self.capacity - 1
+
+    def close(self):
+        self.header.release()
+        self.header = None
+        self.buffer = None
+        self.memory.close()
+
+    def _copy_in(self, position: int, data):
+        offset = position & self.mask
+        first = min(len(data), self.capacity - offset)
+        self.buffer[HEADER + offset:HEADER + offset + first] = data[:first]
+        if first < len(data):
+            self.buffer[HEADER:HEADER + len(data) - first] = data[first:]
+
+    def _copy_out(self, position: int, length: int) -> bytes:
+        offset = position & self.mask
+        first = min(length, self.capacity - offset)
+        data = bytes(self.buffer[HEADER + offset:HEADER + offset + first])
+        if first < length:
+            data += bytes(self.buffer[HEADER:HEADER + length - first])
+        return data
+
+
+class RingBuffer(_Ring):
+    """The consumer's end of the ring. Creates the shared memory and unlinks it when closed.
+
+    Attributes
+    ----------
+    dropped: int
+        Malformed messages dropped by drain. A corrupt frame counts as one.
+    """
+
+    def __init__(self, name: str, capacity: int = 4194304):
+        if capacity < 64 or capacity & (capacity - 1):
+            raise ValueError(f'Ring capacity ({capacity}) must be a power of two of at least 64 bytes')
+        memory = shared_memory.SharedMemory(name=name, create=True, size=HEADER + capacity)
+        _created.add(name)
+        header = memory.buf[:HEADER].cast('Q')
+        header[HEAD] = 0
+        header[TAIL] = 0
+        # Last, as producers take a capacity of 0 to mean the ring isn't ready
+        header[CAPACITY] = capacity
+        header.release()
+        super().__init__(memory)
+        self.dropped = 0
+
+    def close(self):
+        """Close and unlink the shared memory"""
+
+        super().close()
+        self.memory.unlink()
+        _created.discard(self.memory.name)
+
+    def drain(self) -> list:
+        """Read every message published so far, dropping the malformed ones.
+
+        :return (action, payload bytes) for each, in the order sent
+        """
+
+        tail = self.header[TAIL]
+        head = self.header[HEAD]
+        if tail == head:
+            return []
+        # One copy of everything published, then slices of it
+        data = self._copy_out(tail, head - tail)
+        messages = []
+        position = 0
+        while position < len(data):
+            start = position + FRAME.size
+            if start > len(data):
+                self.dropped += 1
+                break
+            length, name_length = FRAME.unpack_from(data, position)
+            if name_length > length or start + length > len(data):
+                self.dropped += 1
+                break
+            try:
+                messages.append((
+                    data[start:start + name_length].decode('utf-8'),
+                    data[start + name_length:start + length]
+                ))
+            except UnicodeDecodeError:
+                self.dropped += 1
+            position = start + length
+        self.header[TAIL] = head
+        return messages
+
+    def pending(self) -> int:
+        """Bytes published but not yet drained"""
+        return self.header[HEAD] - self.header[TAIL]
+
+
+class RingProducer(_Ring):
+    """The producer's end of a ring created by RingBuffer, attached by name. Only one per ring.
+
+    :raise FileNotFoundError if the ring doesn't exist, or isn't ready yet
+    """
+
+    def __init__(self, name: str):
+        memory = _attach(name)
+        super().__init__(memory)
+        if self.capacity == 0:
+            self.close()
+            raise FileNotFoundError(f'Shared memory ring ({name}) is not ready')
+        self.head = self.header[HEAD]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def send(self, action: str, payload) -> bool:
+        """Write a message for the action. The payload is JSON, as text or bytes.
+
+        :return False, writing nothing, if the ring hasn't room for the message
+        """
+
+        name = action.encode('utf-8')
+        if isinstance(payload, str):
+            payload = payload.encode('utf-8')
+        length = len(name) + len(payload)
+        size = FRAME.size + length
+        if size > self.capacity:
+            raise ValueError(f'Message of ({size}) bytes is larger than the ring ({self.capacity})')
+        if self.head + size - self.header[TAIL] > self.capacity:
+            return False
+        self._copy_in(self.head, FRAME.pack(length, len(name)) + name + payload)
+        self.head += size
+        # Publish the message
+        self.header[HEAD] = self.head
+        return True
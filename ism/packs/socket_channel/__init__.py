@@ -0,0 +1,34 @@
+"""Inbound and outbound messages over a TCP or Unix domain socket
+
+ActionSocketChannel starts a server on an asyncio event loop on its own thread when the
+run enters RUNNING. Each message is a frame, a 4 byte big endian length followed by that
+many bytes of JSON:
+
+    {"action": "NameOfAction", "payload": {JSON Object}}
+
+Each tick the action drains the messages received since the last and passes each action
+its messages as one payload, a JSON array of {"reply_to": connection, "payload": ...}
+in the order received. To reply, insert the message into the outbound table:
+
+    sql = self.dao.prepare_parameterised_statement(
+        'INSERT INTO socket_channel_outbound (reply_to, message) VALUES (?, ?)'
+    )
+    self.mutate('reply', 'socket_channel_outbound', sql, (message['reply_to'], json.dumps(reply)))
+
+The replies inserted during a tick are framed the same way and written back on their
+connections at the next. When more than max_pending messages are waiting for the loop,
+the server stops reading from its connections until the loop has drained half of them,
+so fast producers are pushed back through TCP flow control rather than queued without
+limit. Configure the server in the properties file:
+
+    socket_channel:
+      host: 127.0.0.1
+      # 0 picks a free port. See SocketServer.address
+      port: 9470
+      # Or listen on a Unix socket instead of a port
+      # socket: /tmp/ism/channel.sock
+      max_pending: 10000
+      max_frame_bytes: 16777216
+
+ism.packs.socket_channel.client.SocketClient is a blocking client for scripts and tests.
+"""
@@ -0,0 +1,79 @@
+"""Pass the messages received on the socket channel to their actions and send their replies
+
+See ism.packs.socket_channel.
+"""
+
+# Standard library imports
+import json
+
+# Local application imports
+from ism.core import events
+from ism.core.base_action import BaseAction
+from ism.packs.batches import deliver
+from ism.packs.socket_channel.server import SocketServer
+
+
+class ActionSocketChannel(BaseAction):
+    """Each tick, writes the replies queued in the outbound table and delivers the messages received.
+
+    Attributes
+    ----------
+    server: SocketServer
+        Started the first time the action runs and stopped when the ISM shuts down.
+    received: int
+        Messages delivered.
+    """
+
+    server = None
+    received = 0
+
+    def execute(self):
+
+        if self.active():
+
+            if self.server is None:
+                self.__open()
+            self.__send_replies()
+
+            batches = {}
+            for connection_id, data in self.server.drain():
+                try:
+                    message = json.loads(data)
+                    entry = json.dumps({'reply_to': connection_id, 'payload': message['payload']})
+                    batches.setdefault(message['action'], []).append(entry)
+                except (ValueError, KeyError, TypeError) as e:
+                    self.logger.error(f'Dropped malformed message from connection ({connection_id}). ({e})')
+            if batches:
+                self.received += sum(len(entries) for entries in batches.values())
+                deliver(self, batches)
+
+    # Private methods
+    def __open(self):
+        """Start the server and stop it when the ISM shuts down"""
+
+        config = self.properties.get('socket_channel', {})
+        server = SocketServer(
+            config.get('host', '127.0.0.1'),
+            config.get('port', 9470),
+            config.get('socket', None),
+            config.get('max_pending', 10000),
+            config.get('max_frame_bytes', 16777216)
+        )
+        server.start()
+        self.server = server
+        self.events.subscribe(events.SHUTDOWN, self.__close)
+
+    def __close(self, event):
+        self.events.unsubscribe(events.SHUTDOWN, self.__close)
+        self.server.stop()
+        self.server = None
+
+    def __send_replies(self):
+        """Write the replies in the outbound table back on their connections and delete them"""
+
+        replies = self.dao.execute_sql_query('SELECT id, reply_to, message FROM socket_channel_outbound')
+        if not replies:
+            return
+        self.server.send([(reply_to, message.encode('utf-8')) for _, reply_to, message in replies])
+        sql = self.dao.prepare_parameterised_statement('DELETE FROM socket_channel_outbound WHERE id <= ?')
+        self.mutate('send_replies', 'socket_channel_outbound', sql, (max(reply[0] for reply in replies),))
@@ -0,0 +1,57 @@
+"""Blocking client for the socket channel
+
+    with SocketClient(('127.0.0.1', 9470)) as client:
+        client.send('ActionProcessOrder', {'order': 42})
+        reply = client.receive(timeout=5)
+"""
+
+# Standard library imports
+import json
+import socket
+
+# Local application imports
+from ism.packs.socket_channel.server import LENGTH, frame
+
+
+class SocketClient:
+    """One connection to the socket channel. address is (host, port) or a Unix socket path."""
+
+    def __init__(self, address):
+        family = socket.AF_UNIX if isinstance(address, str) else socket.AF_INET
+        self.socket = socket.socket(family, socket.SOCK_STREAM)
+        self.socket.connect(address)
+        self.buffer = b''
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.socket.close()
+
+    def receive(self, timeout=None):
+        """Block until a reply arrives and return it decoded.
+
+        :raise socket.timeout if there is none within timeout
+        :raise ConnectionError if the server closes the connection
+        """
+
+        self.socket.settimeout(timeout)
+        while True:
+            if len(self.buffer) >= LENGTH.size:
+                (length,) = LENGTH.unpack_from(self.buffer)
+                if len(self.buffer) >= LENGTH.size + length:
+                    message = self.buffer[LENGTH.size:LENGTH.size + length]
+                    self.buffer = self.buffer[LENGTH.size + length:]
+                    return json.loads(message)
+            data = self.socket.recv(65536)
+            if not data:
+                raise ConnectionError('Connection closed by the ISM')
+            self.buffer += data
+
+    def send(self, action: str, payload):
+        """Send a message for the action. Blocks while the ISM is pushing back."""
+
+        self.socket.sendall(frame(json.dumps({'action': action, 'payload': payload}).encode('utf-8')))
@@ -0,0 +1,185 @@
+"""Length prefixed JSON frames over asyncio, on a thread of its own
+
+The ISM thread and the event loop's thread share only the inbound deque, appended to by
+the loop and drained by the ISM, and call_soon_threadsafe, which the ISM uses to write
+replies and to resume reading.
+"""
+
+# Standard library imports
+import asyncio
+import collections
+import logging
+import os
+import struct
+import threading
+
+LENGTH = struct.Struct('>I')
+
+
+def frame(message: bytes) -> bytes:
+    """Prefix the message with its length"""
+    return LENGTH.pack(len(message)) + message
+
+
+class _Connection(asyncio.Protocol):
+    """Splits a connection's stream into frames and queues them for the ISM"""
+
+    def __init__(self, server):
+        self.server = server
+        self.transport = None
+        self.connection_id = None
+        self.buffer = bytearray()
+
+    def connection_made(self, transport):
+        self.transport = transport
+        self.connection_id = self.server.connected(self)
+
+    def connection_lost(self, exc):
+        self.server.disconnected(self.connection_id)
+
+    def data_received(self, data):
+        buffer = self.buffer
+        buffer += data
+        position = 0
+        while len(buffer) - position >= LENGTH.size:
+            (length,) = LENGTH.unpack_from(buffer, position)
+            if length > self.server.max_frame_bytes:
+                self.server.logger.error(
+                    f'Closing connection ({self.connection_id}). Frame of ({length}) bytes is over the limit'
+                )
+                self.transport.close()
+                return
+            end = position + LENGTH.size + length
+            if len(buffer) < end:
+                break
+            self.server.inbound.append((self.connection_id, bytes(buffer[position + LENGTH.size:end])))
+            position = end
+        del buffer[:position]
+        self.server.received()
+
+
+class SocketServer:
+    """Accepts connections and frames on an event loop on its own thread.
+
+    Attributes
+    ----------
+    host: str
+        Interface the TCP port is bound to.
+    port: int
+        TCP port. 0 picks a free one.
+    socket_path: str
+        Optional. Listen on this Unix socket instead of the TCP port.
+    max_pending: int
+        Stop reading from the connections once this many messages are waiting for drain().
+    max_frame_bytes: int
+        Connections sending a larger frame are closed.
+    pauses: int
+        Times reading was paused because the ISM fell behind.
+    """
+
+    def __init__(self, host='127.0.0.1', port=0, socket_path=None, max_pending=10000, max_frame_bytes=16777216):
+        self.host = host
+        self.port = port
+        self.socket_path = socket_path
+        self.max_pending = max_pending
+        self.max_frame_bytes = max_frame_bytes
+        self.logger = logging.getLogger('ism.socket_channel.SocketServer')
+        self.inbound = collections.deque()
+        self.paused = False
+        self.pauses = 0
+        self.loop = None
+        self.server = None
+        self.thread = None
+        self.__connections = {}
+        self.__next_id = 0
+
+    @property
+    def address(self):
+        """The socket path, or (host, port) actually bound"""
+        return self.socket_path if self.socket_path else self.server.sockets[0].getsockname()[:2]
+
+    def drain(self) -> list:
+        """Take the messages received so far, as (connection id, JSON bytes). Called on the ISM thread."""
+
+        messages = [self.inbound.popleft() for _ in range(len(self.inbound))]
+        if self.paused and len(self.inbound) <= self.max_pending // 2:
+            self.loop.call_soon_threadsafe(self.__resume)
+        return messages
+
+    def send(self, replies: list):
+        """Write each (connection id, JSON bytes) back on its connection. Called on the ISM thread."""
+
+        if replies:
+            self.loop.call_soon_threadsafe(self.__write, replies)
+
+    def start(self):
+        """Start the event loop thread and listen"""
+
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, name='ism-socket', daemon=True)
+        self.thread.start()
+        if self.socket_path:
+            if os.path.exists(self.socket_path):
+                os.remove(self.socket_path)
+            listen = self.loop.create_unix_server(lambda: _Connection(self), self.socket_path)
+        else:
+            listen = self.loop.create_server(lambda: _Connection(self), self.host, self.port)
+        self.server = asyncio.run_coroutine_threadsafe(listen, self.loop).result()
+        self.logger.info(f'Listening for messages on ({self.address})')
+
+    def stop(self):
+        """Close the connections, stop listening and stop the event loop thread"""
+
+        if self.loop is None:
+            return
+        asyncio.run_coroutine_threadsafe(self.__close(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.close()
+        self.loop = None
+        if self.socket_path and os.path.exists(self.socket_path):
+            os.remove(self.socket_path)
+
+    # Called on the event loop's thread
+    def connected(self, connection) -> int:
+        self.__next_id += 1
+        self.__connections[self.__next_id] = connection
+        if self.paused:
+            connection.transport.pause_reading()
+        return self.__next_id
+
+    def disconnected(self, connection_id):
+        self.__connections.pop(connection_id, None)
+
+    def received(self):
+        """Push back on the producers if the ISM has fallen behind"""
+
+        if not self.paused and len(self.inbound) >= self.max_pending:
+            self.paused = True
+            self.pauses += 1
+            self.logger.warning(f'({len(self.inbound)}) messages waiting. Pausing reads')
+            for connection in self.__connections.values():
+                connection.transport.pause_reading()
+
+    # Private methods
+    async def __close(self):
+        self.server.close()
+        for connection in list(self.__connections.values()):
+            connection.transport.close()
+        await self.server.wait_closed()
+
+    def __resume(self):
+        if not self.paused:
+            return
+        self.paused = False
+        self.logger.info('Resuming reads')
+        for connection in self.__connections.values():
+            connection.transport.resume_reading()
+
+    def __write(self, replies):
+        for connection_id, message in replies:
+            connection = self.__connections.get(connection_id)
+            if connection is None:
+                self.logger.debug(f'Dropped reply for closed connection ({connection_id})')
+                continue
+            connection.transport.write(frame(message))
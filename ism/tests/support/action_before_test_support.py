@@ -15,8 +15,10 @@ from ism.core.base_action import BaseAction
 
 class ActionBeforeTestSupport(BaseAction):
 
+    gates_phase = 'RUNNING'
+
     def execute(self):
-        if self.active:
+        if self.active():
 
             try:
                 inbound = self.properties['test']['support']['inbound']
@@ -12,6 +12,8 @@ Messages arrive as:
 
 .json being the message file and .smp being the semaphore file.
 
+Messages sent in-process through the ISM's MessageChannel are processed the same way.
+
 Message format is:
 {
     sender_id: integer
@@ -32,10 +34,15 @@ from ism.exceptions.exceptions import OrphanedSemaphoreFile
 class ActionInboundTestMsg(BaseAction):
 
     def execute(self):
-        if self.active:
+        if self.active():
             inbound_dir = self.properties['test']['support']['inbound']
             archive_dir = self.properties['test']['support']['archive']
 
+            # Pick up any messages sent in-process
+            if self.channel is not None:
+                for message in self.channel.receive():
+                    self.__process_message(message)
+
             # Pick up any semaphore files in the inbound directory
             for file in [fn for fn in os.listdir(inbound_dir) if fn.endswith('.smp')]:
                 # Semaphore file should have an associated msg file of same name
@@ -45,19 +52,9 @@ class ActionInboundTestMsg(BaseAction):
                 if not os.path.exists(msg_file):
                     raise OrphanedSemaphoreFile(f'Semaphore file ({file}) without associated message file.')
 
-                # Message file found so read it into the DB test messages table
+                # Message file found so read it
                 with open(msg_file, 'r') as message_file:
                     message = json.loads(message_file.read())
-                    sql = self.dao.prepare_parameterised_statement(
-                        'INSERT INTO test_support_messages_inbound (action, payload) VALUES (?, ?)'
-                    )
-                    self.dao.execute_sql_statement(
-                            sql,
-                            (
-                                message['action'],
-                                json.dumps(message['payload'])
-                            )
-                       )
 
                 # Archive the file so we don't process it again
                 destination = f'{archive_dir}{os.path.sep}{file_name}.json'
@@ -65,16 +62,33 @@ class ActionInboundTestMsg(BaseAction):
                 destination = f'{archive_dir}{os.path.sep}{file_name}.smp'
                 os.rename(f'{inbound_dir}{os.path.sep}{file_name}.smp', destination)
 
-                # Update the test action's payload
-                sql = self.dao.prepare_parameterised_statement(
-                    'UPDATE actions SET payload = ? WHERE action = ?'
-                )
-                self.dao.execute_sql_statement(
-                    sql,
-                    (
-                        json.dumps(message['payload']),
-                        message['action']
-                    )
-                )
-                # Enable the test action
-                self.activate(message['action'])
+                self.__process_message(message)
+
+    # Private methods
+    def __process_message(self, message):
+        """Read the message into the DB test messages table and pass its payload to the test action"""
+
+        sql = self.dao.prepare_parameterised_statement(
+            'INSERT INTO test_support_messages_inbound (action, payload) VALUES (?, ?)'
+        )
+        self.dao.execute_sql_statement(
+            sql,
+            (
+                message['action'],
+                json.dumps(message['payload'])
+            )
+        )
+
+        # Update the test action's payload
+        sql = self.dao.prepare_parameterised_statement(
+            'UPDATE actions SET payload = ? WHERE action = ?'
+        )
+        self.dao.execute_sql_statement(
+            sql,
+            (
+                json.dumps(message['payload']),
+                message['action']
+            )
+        )
+        # Enable the test action
+        self.activate(message['action'])
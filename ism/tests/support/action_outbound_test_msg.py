@@ -2,7 +2,17 @@
 harness to interact with the state machine's primary thread without causing
 contention for resources like the Sqlite3 database.
 
-This action checks the outbound table in the database for messages and writes them to file.
+This action checks the outbound table in the database for messages and writes them to file,
+or replies through the ISM's MessageChannel if the message was sent in-process.
+
+If the properties set test:support:outbound_log, replies are appended to a segment log in
+<run_dir>/outbound instead of a file each. Read them with ism.core.segment_log.SegmentReader.
+
+    outbound_log:
+      segment_bytes: 67108864
+      # always, interval or rotate
+      fsync: interval
+      fsync_interval_ms: 100
 """
 
 # Standard library imports
@@ -10,11 +20,15 @@ import json
 import os
 
 # Local application imports
+from ism.core import events
 from ism.core.base_action import BaseAction
+from ism.core.segment_log import SegmentWriter
 
 
 class ActionOutboundTestMsg(BaseAction):
 
+    log = None
+
     def execute(self):
 
         if self.active():
@@ -22,13 +36,41 @@ class ActionOutboundTestMsg(BaseAction):
             # Have an outbound message to send so get it from the DB
             payload = json.loads(self.get_payload()[0][0])
 
-            # Write it to file in the outbound directory
-            out_dir = self.properties.get('test', {}).get('support', {}).get('outbound', None)
-            path = f'{out_dir}{os.path.sep}{payload["sender_id"]}.json'
-            with open(path, 'w') as file:
-                file.write(json.dumps(payload))
+            # Reply in-process if the sender is waiting on the channel, else write it to
+            # the outbound log or to file in the outbound directory
+            if self.channel is None or not self.channel.reply(payload['sender_id'], payload):
+                config = self.properties.get('test', {}).get('support', {})
+                if config.get('outbound_log') is not None:
+                    if self.log is None:
+                        self.__open_log(config['outbound_log'])
+                    self.log.append(json.dumps(payload).encode('utf-8'))
+                else:
+                    out_dir = config.get('outbound', None)
+                    path = f'{out_dir}{os.path.sep}{payload["sender_id"]}.json'
+                    with open(path, 'w') as file:
+                        file.write(json.dumps(payload))
 
             # Clear the payload for completeness
             self.clear_payload()
 
             self.deactivate()
+
+    # Private methods
+    def __open_log(self, config):
+        """Start a segment of the outbound log and close it when the ISM shuts down"""
+
+        config = config or {}
+        self.log = SegmentWriter(
+            f'{self.properties["runtime"]["run_dir"]}{os.path.sep}outbound',
+            'outbound',
+            config.get('segment_bytes', 67108864),
+            config.get('fsync', 'interval'),
+            config.get('fsync_interval_ms', 100),
+            background=True
+        )
+        self.events.subscribe(events.SHUTDOWN, self.__close_log)
+
+    def __close_log(self, event):
+        self.events.unsubscribe(events.SHUTDOWN, self.__close_log)
+        self.log.close()
+        self.log = None
@@ -0,0 +1,46 @@
+"""Express test actions for the concurrent startup unit tests
+
+Two slow startup actions with no dependencies and a third that depends on both. Each
+notes when it started and finished executing in its timeline.
+"""
+
+# Standard library imports
+import time
+
+# Local application imports
+from ism.core.base_action import BaseAction
+
+
+class ActionBeforeTestStartupA(BaseAction):
+
+    gates_phase = 'RUNNING'
+
+    def __init__(self, *args):
+        super().__init__(*args)
+        self.timeline = None
+
+    def execute(self):
+        if self.active():
+            started = time.monotonic()
+            time.sleep(0.2)
+            self.timeline = (started, time.monotonic())
+            self.deactivate()
+
+
+class ActionBeforeTestStartupB(ActionBeforeTestStartupA):
+    pass
+
+
+class ActionBeforeTestStartupDependent(BaseAction):
+
+    gates_phase = 'RUNNING'
+    depends_on = ('ActionBeforeTestStartupA', 'ActionBeforeTestStartupB')
+
+    def __init__(self, *args):
+        super().__init__(*args)
+        self.timeline = None
+
+    def execute(self):
+        if self.active():
+            self.timeline = (time.monotonic(), time.monotonic())
+            self.deactivate()
@@ -0,0 +1,28 @@
+"""Express a test action for the generator action unit tests
+
+"""
+from ism.core.base_action import BaseAction
+
+
+class ActionTestGenerator(BaseAction):
+    """Action works through a batch one item per dispatch, then shuts the ISM down.
+
+    Unit tests check the other actions are dispatched between the items.
+    """
+
+    batch = ['first', 'second', 'third']
+
+    def __init__(self, *args):
+        super().__init__(*args)
+        self.processed = []
+
+    def execute(self):
+
+        if self.active():
+
+            for item in self.batch:
+                self.processed.append(item)
+                yield
+
+            self.activate('ActionNormalShutdown')
+            self.deactivate()
@@ -14,15 +14,30 @@ The module contains the following functions:
 """
 
 # Standard library imports
+import concurrent.futures
 import json
 import os
 import re
+import sqlite3
+import sys
+import tempfile
 import unittest
+import urllib.request
 import yaml
 
 # Local application imports
 from time import sleep
 from ism.ISM import ISM
+from ism.core.channel import MessageChannel
+from ism.core.flight_recorder import FlightRecorder, read_flight_record
+from ism.core.journal import records
+from ism.core.segment_log import SegmentReader
+from ism.dal.template_cache import TemplateCache
+from ism.exceptions.exceptions import DurabilityProfileNotRecognised
+from ism.packs.batches import deliver
+from ism.packs.shm_ring.ring_buffer import FRAME, HEAD, RingBuffer, RingProducer
+from ism.packs.socket_channel.client import SocketClient
+from ism.packs.socket_channel.server import SocketServer
 
 
 class TestISM(unittest.TestCase):
@@ -52,16 +67,17 @@ class TestISM(unittest.TestCase):
             semaphore.write('')
 
     @staticmethod
-    def wait_for_test_message_reply(sender_id, outbound, retries=10) -> bool:
+    def wait_for_test_message_reply(sender_id, outbound, timeout=10) -> bool:
         """Wait for an expected reply to a test support message"""
 
         expected_file = f'{outbound}{os.path.sep}{sender_id}.json'
+        retries = int(timeout / 0.01)
 
         while retries > 0:
             if os.path.exists(expected_file):
                 break
             retries -= 1
-            sleep(1)
+            sleep(0.01)
 
         if retries == 0:
             return False
@@ -177,6 +193,46 @@ class TestISM(unittest.TestCase):
         # End of test
         ism.stop()
 
+    def test_test_support_channel(self):
+        """Test that a test support message sent in-process gets its reply in-process.
+
+        Same as test_action_import_sqlite3 without the round trip through the inbound and outbound directories.
+        """
+
+        args = {
+            'properties_file': self.sqlite3_properties
+        }
+        ism = ISM(args)
+        ism.import_action_pack('ism.tests.support')
+        ism.start()
+
+        message = {
+            "action": "ActionRunSqlQuery",
+            "payload": {
+                "sql": "SELECT * from actions;",
+                "sender_id": 1
+            }
+        }
+        actions = ism.channel.request(message, timeout=5)
+
+        self.assertEqual(1, actions['sender_id'])
+        for action in actions['query_result']:
+            if action[1] == 'ActionConfirmReadyToRun':
+                self.assertEqual(0, action[4], 'ActionConfirmReadyToRun should be inactive')
+            if action[1] == 'ActionInboundTestMsg':
+                self.assertEqual(1, action[4], 'ActionInboundTestMsg should be active')
+
+        ism.stop()
+
+    def test_channel_request_timeout(self):
+        """Test that a request that times out is forgotten, so a late reply to it isn't matched"""
+
+        channel = MessageChannel()
+        message = {'action': 'ActionRunSqlQuery', 'payload': {'sql': 'SELECT 1', 'sender_id': 7}}
+        with self.assertRaises(concurrent.futures.TimeoutError):
+            channel.request(message, timeout=0.01)
+        self.assertFalse(channel.reply(7, {'sender_id': 7}))
+
     def test_action_import_mysql(self):
         """Test that the ism imports the core actions.
 
@@ -257,14 +313,124 @@ class TestISM(unittest.TestCase):
         }
         ism = ISM(args)
         ism.import_action_pack('ism.tests.test_import_action_pack')
-        ism.start()
-        sleep(1)
+        with ism.events.queue(['deactivate']) as deactivated:
+            ism.start()
+            while deactivated.get(timeout=10).subject != 'ActionTestPlugin':
+                pass
         ism.stop()
-        sleep(1)
+        ism.ism_thread.join()
         self.assertTrue(os.path.exists(test_file))
         with open(test_file, 'r') as file:
             self.assertTrue(len(file.readlines()) == 1, f'Unexpected line count for {test_file}, 1 expected.')
 
+    def test_phase_gates(self):
+        """Test that the ISM only enters RUNNING once the actions gating it have deactivated.
+
+        ActionBeforeTestSupport declares it gates RUNNING so it is outstanding until it has run.
+        """
+
+        args = {
+            'properties_file': self.sqlite3_properties
+        }
+        ism = ISM(args)
+        ism.import_action_pack('ism.tests.support')
+        self.assertEqual(1, ism.gates.outstanding('RUNNING'))
+        self.assertFalse(ism.gates.is_open('RUNNING'))
+        self.assertTrue(ism.gates.is_open('STOPPED'))
+
+        ism.start()
+        self.assertTrue(ism.wait_for_phase('RUNNING', timeout=10))
+        self.assertTrue(ism.gates.is_open('RUNNING'))
+        ism.stop()
+        ism.ism_thread.join()
+
+    def test_concurrent_startup(self):
+        """Test that the startup actions run concurrently on the startup pool, respecting their dependencies.
+
+        ActionBeforeTestStartupA and B each take 0.2s and should overlap. ActionBeforeTestStartupDependent
+        should only start once both have finished.
+        """
+
+        args = {
+            'properties_file': self.sqlite3_properties
+        }
+        ism = ISM(args)
+        ism.import_action_pack('ism.tests.test_concurrent_startup')
+        ism.start()
+        self.assertTrue(ism.wait_for_phase('RUNNING', timeout=10))
+        ism.stop()
+        ism.ism_thread.join()
+
+        timeline = {action.action_name: getattr(action, 'timeline', None) for action in ism.actions}
+        a, b, dependent = (
+            timeline['ActionBeforeTestStartupA'],
+            timeline['ActionBeforeTestStartupB'],
+            timeline['ActionBeforeTestStartupDependent']
+        )
+        self.assertTrue(a[0] < b[1] and b[0] < a[1], 'Expected the independent startup actions to overlap')
+        self.assertGreaterEqual(dependent[0], max(a[1], b[1]), 'Expected the dependent action to run last')
+
+    def test_reload_action_pack(self):
+        """Test that a changed action pack is reloaded into a running ISM.
+
+        Version 1 of the pack has an action that does nothing. Version 2 changes it to set its payload
+        and adds a new action with a new insert. The original insert and the pending timer must survive.
+        """
+
+        root = tempfile.mkdtemp()
+        pack = os.path.join(root, 'ism_test_reload_pack')
+        os.makedirs(pack)
+        open(os.path.join(pack, '__init__.py'), 'w').close()
+        action = (
+            'from ism.core.base_action import BaseAction\n\n\n'
+            'class ActionTestReload(BaseAction):\n\n'
+            '    def execute(self):\n'
+            '        if self.active():\n'
+            '            {}\n'
+        )
+        inserts = ["INSERT INTO actions VALUES(NULL,'ActionTestReload','RUNNING',NULL,1)"]
+
+        def write_pack(version, execute):
+            with open(os.path.join(pack, 'action_test_reload.py'), 'w') as module:
+                module.write(action.format(execute))
+            with open(os.path.join(pack, 'data.json'), 'w') as data:
+                json.dump({'sqlite3': {'inserts': inserts}}, data)
+            # Source files rewritten within a second must not be mistaken for the cached bytecode
+            os.utime(os.path.join(pack, 'action_test_reload.py'), (version, version))
+
+        write_pack(1, 'pass')
+        sys.path.insert(0, root)
+        try:
+            ism = ISM({'properties_file': self.sqlite3_properties})
+            ism.import_action_pack('ism_test_reload_pack')
+            ism.start()
+            self.assertTrue(ism.wait_for_phase('RUNNING', timeout=10))
+            ism.actions[0].set_timer('ActionNormalShutdown', None, ism.actions[0].set_timer_expiry(hours=1))
+
+            inserts.append("INSERT INTO actions VALUES(NULL,'ActionTestReloadAdded','RUNNING',NULL,0)")
+            write_pack(2, "self.set_payload(self.action_name, 'v2')\n            self.deactivate()")
+            with open(os.path.join(pack, 'action_test_reload_added.py'), 'w') as module:
+                module.write(action.format('pass').replace('ActionTestReload', 'ActionTestReloadAdded'))
+
+            with ism.events.queue(['deactivate']) as deactivated:
+                swapped = ism.reload_action_pack('ism_test_reload_pack', timeout=10)
+                while deactivated.get(timeout=10).subject != 'ActionTestReload':
+                    pass
+            ism.stop()
+            ism.ism_thread.join()
+        finally:
+            sys.path.remove(root)
+
+        self.assertEqual(['ActionTestReload', 'ActionTestReloadAdded'], sorted(swapped))
+        self.assertEqual([('v2',)], ism.dao.execute_sql_query(
+            'SELECT payload FROM actions WHERE action = "ActionTestReload"'
+        ))
+        for name in ['ActionTestReload', 'ActionTestReloadAdded']:
+            self.assertEqual([(1,)], ism.dao.execute_sql_query(
+                'SELECT COUNT(*) FROM actions WHERE action = ?', (name,)
+            ))
+        self.assertEqual([(1,)], ism.dao.execute_sql_query('SELECT COUNT(*) FROM timers WHERE active = 1'))
+
     def test_timer_action(self):
         """Test the timer action ActionCheckTimers.
 
@@ -287,6 +453,806 @@ class TestISM(unittest.TestCase):
         # Assert true to give us a passed test because we reached here
         self.assertTrue(True)
 
+    def test_set_timer(self):
+        """Test that BaseAction.set_timer creates a timer that fires its action.
+
+        The timer expires immediately and triggers a normal shutdown, so the test hangs if it doesn't fire.
+        """
+
+        args = {
+            'properties_file': self.sqlite3_properties
+        }
+        ism = ISM(args)
+        action = ism.actions[0]
+        action.set_timer('ActionNormalShutdown', '{"test_msg": "test value"}', action.set_timer_expiry(milliseconds=1))
+        ism.start(join=True)
+        self.assertEqual('STOPPED', ism.get_execution_phase())
+
+    def test_flight_recorder_dump_on_emergency_shutdown(self):
+        """Test the flight recorder is dumped when ActionEmergencyShutdown runs.
+
+        Import an action pack with a single expired timer that activates ActionEmergencyShutdown. The dump
+        should record the timer firing and the change of phase.
+        """
+
+        args = {
+            'properties_file': self.sqlite3_properties
+        }
+        ism = ISM(args)
+        ism.import_action_pack('ism.tests.test_emergency_shutdown')
+        ism.start(join=True)
+
+        dump_dir = f'{ism.properties["runtime"]["run_dir"]}{os.path.sep}flight_recorder'
+        dumps = [file for file in os.listdir(dump_dir) if file.startswith('emergency_shutdown')]
+        self.assertEqual(1, len(dumps), 'Expected a single flight recorder dump')
+        records = [(record.event, record.subject)
+                   for record in read_flight_record(f'{dump_dir}{os.path.sep}{dumps[0]}')]
+        self.assertIn(('dispatch', 'ActionCheckTimers'), records)
+        self.assertIn(('timer', 'ActionEmergencyShutdown'), records)
+        self.assertIn(('phase', 'EMERGENCY_SHUTDOWN'), records)
+
+    def test_flight_recorder_dump_on_demand(self):
+        """Test the flight recorder can be dumped on demand and wraps when full."""
+
+        args = {
+            'properties_file': self.sqlite3_properties
+        }
+        ism = ISM(args)
+        ism.recorder = FlightRecorder(8, ism.recorder.dump_dir)
+        for index in range(20):
+            ism.recorder.record(0, f'Action{index}')
+        records = read_flight_record(ism.dump_flight_recorder())
+        self.assertEqual([f'Action{index}' for index in range(12, 20)], [record.subject for record in records])
+        self.assertTrue(all(a.timestamp_ns <= b.timestamp_ns for a, b in zip(records, records[1:])))
+
+    def test_resume_from_checkpoint(self):
+        """Test that a run resumes from its last checkpoint.
+
+        The resumed run should start in the checkpointed phase with its pending timers and
+        without replaying the inserts for the action packs imported before the checkpoint.
+        """
+
+        args = {
+            'properties_file': self.sqlite3_properties
+        }
+        ism = ISM(args)
+        ism.import_action_pack('ism.tests.support')
+        ism.start()
+        retries = 100
+        while ism.get_execution_phase() != 'RUNNING' and retries > 0:
+            retries -= 1
+            sleep(0.05)
+        ism.dao.execute_sql_statement(
+            'INSERT INTO timers VALUES(NULL,1,?,NULL,?)', ('ActionNormalShutdown', 4102444800000)
+        )
+        self.assertTrue(ism.checkpoint(timeout=5), 'Checkpoint not taken by the running ISM')
+        ism.stop()
+        ism.ism_thread.join()
+
+        args = {
+            'properties_file': self.sqlite3_properties,
+            'resume': ism.properties['runtime']['run_dir']
+        }
+        resumed = ISM(args)
+        resumed.import_action_pack('ism.tests.support')
+        self.assertEqual(ism.get_database_name(), resumed.get_database_name())
+        self.assertEqual('RUNNING', resumed.get_execution_phase())
+        self.assertEqual(
+            [(1,)],
+            resumed.dao.execute_sql_query('SELECT COUNT(*) FROM actions WHERE action = "ActionRunSqlQuery"')
+        )
+        self.assertEqual(
+            [('ActionNormalShutdown', 4102444800000)],
+            resumed.dao.execute_sql_query('SELECT action, expiry FROM timers WHERE active = 1')
+        )
+
+    def test_sqlite3_template_cache(self):
+        """Test that a second run with the same core and action packs is cloned from the template cache.
+
+        The cloned database must hold the same rows as the database built by replaying the statements.
+        """
+
+        args = {
+            'properties_file': self.sqlite3_properties
+        }
+        first = ISM(args)
+        first.import_action_pack('ism.tests.test_import_action_pack')
+        second = ISM(args)
+        second.import_action_pack('ism.tests.test_import_action_pack')
+
+        self.assertEqual(0, second.templates.misses, 'Expected every statement set to be found in the cache')
+        self.assertEqual(2, second.templates.hits, 'Expected the core and the action pack to be cloned')
+        for table in ['actions', 'phases', 'timers', 'properties', 'tests']:
+            self.assertEqual(
+                first.dao.execute_sql_query(f'SELECT * FROM {table}'),
+                second.dao.execute_sql_query(f'SELECT * FROM {table}')
+            )
+
+    def test_sqlite3_template_cache_other_writes(self):
+        """Test that writes made outside the chain of file statements are neither cached nor overwritten.
+
+        Once anything else is written, the run stops using the template cache.
+        """
+
+        properties = self.get_properties(self.sqlite3_properties)
+        properties['database']['template_cache'] = tempfile.mkdtemp()
+        with tempfile.NamedTemporaryFile('w', suffix='.yaml', delete=False) as file:
+            yaml.safe_dump(properties, file)
+        args = {
+            'properties_file': file.name
+        }
+        timer = "INSERT INTO timers (active, action, payload, expiry) VALUES (1, ?, NULL, 0)"
+        sql = 'SELECT action FROM timers WHERE action LIKE ?'
+
+        first = ISM(args)
+        first.dao.execute_sql_statement(timer, ('ActionStray',))
+        first.import_action_pack('ism.tests.test_import_action_pack')
+        self.assertEqual(0, first.templates.hits)
+        self.assertEqual(2, first.templates.misses, 'Expected only the core schema and data to be stored')
+
+        second = ISM(args)
+        second.import_action_pack('ism.tests.test_import_action_pack')
+        self.assertEqual([], second.dao.execute_sql_query(sql, ('ActionStray',)))
+
+        third = ISM(args)
+        third.dao.execute_sql_statement(timer, ('ActionOwn',))
+        third.import_action_pack('ism.tests.test_import_action_pack')
+        os.remove(file.name)
+        self.assertEqual(1, third.templates.hits, 'Expected only the core to be cloned')
+        self.assertEqual([('ActionOwn',)], third.dao.execute_sql_query(sql, ('Action%',)))
+        self.assertEqual(
+            second.dao.execute_sql_query('SELECT * FROM actions'), third.dao.execute_sql_query('SELECT * FROM actions')
+        )
+
+        # The same files from another package are another template
+        root = TemplateCache.root_key('sqlite3')
+        self.assertNotEqual(
+            TemplateCache.key(root, 'ism.packs.a', b'{}'), TemplateCache.key(root, 'ism.packs.b', b'{}')
+        )
+
+    def test_schema_indexes_created(self):
+        """Test that a new run applies the core schema migrations and records the schema version."""
+
+        args = {
+            'properties_file': self.sqlite3_properties
+        }
+        ism = ISM(args)
+        self.assertEqual([(5,)], ism.dao.execute_sql_query(
+            'SELECT version FROM schema_versions WHERE package = "ism.core"'
+        ))
+        plan = ism.dao.execute_sql_query(
+            'EXPLAIN QUERY PLAN SELECT active, execution_phase FROM actions WHERE action = ?', ('ActionCheckTimers',)
+        )
+        self.assertIn('USING INDEX actions_action', plan[0][3])
+
+    def test_schema_upgraded_on_resume(self):
+        """Test that resuming a run created before the indexes were declared upgrades its schema."""
+
+        args = {
+            'properties_file': self.sqlite3_properties
+        }
+        ism = ISM(args)
+        manifest = ism.checkpoints.save([])
+
+        # Roll the checkpoint back to a database created before schema versioning
+        with sqlite3.connect(manifest['database']) as cnx:
+            for index in ['actions_action', 'actions_active', 'phases_state', 'timers_active']:
+                cnx.execute(f'DROP INDEX {index}')
+            cnx.execute('DROP TABLE schema_versions')
+
+        args = {
+            'properties_file': self.sqlite3_properties,
+            'resume': ism.properties['runtime']['run_dir']
+        }
+        resumed = ISM(args)
+        self.assertEqual([(5,)], resumed.dao.execute_sql_query(
+            'SELECT version FROM schema_versions WHERE package = "ism.core"'
+        ))
+        indexes = resumed.dao.execute_sql_query('SELECT name FROM sqlite_master WHERE type = "index" AND sql IS NOT NULL ORDER BY name')
+        self.assertEqual([('actions_action',), ('actions_active',), ('phases_state',), ('timers_active',)], indexes)
+
+    def test_subscribe(self):
+        """Test that subscribers are pushed phase, timer, activation and shutdown events.
+
+        The timer action pack fires a timer that triggers a normal shutdown.
+        """
+
+        args = {
+            'properties_file': self.sqlite3_properties
+        }
+        ism = ISM(args)
+        ism.import_action_pack('ism.tests.test_timer_action')
+        received = []
+        for event_type in ['phase', 'timer', 'activate', 'shutdown']:
+            ism.subscribe(event_type, lambda event: received.append((event.type, event.subject)))
+
+        with ism.events.queue(['phase']) as phases:
+            ism.start(join=True)
+            self.assertEqual('RUNNING', phases.get(timeout=1).subject)
+
+        self.assertEqual(
+            [
+                ('phase', 'RUNNING'),
+                ('timer', 'ActionNormalShutdown'),
+                ('activate', 'ActionNormalShutdown'),
+                ('phase', 'NORMAL_SHUTDOWN'),
+                ('activate', 'ActionConfirmReadyToStop'),
+                ('phase', 'STOPPED'),
+                ('shutdown', 'STOPPED')
+            ],
+            [event for event in received if event != ('activate', 'ActionProcessInboundMessages')]
+        )
+        self.assertTrue(ism.wait_for_phase('STOPPED', timeout=0))
+
+    def test_dispatch_priority(self):
+        """Test that the ready actions are dispatched highest priority first."""
+
+        args = {
+            'properties_file': self.sqlite3_properties
+        }
+        ism = ISM(args)
+        ism.dao.execute_sql_statement('UPDATE actions SET active = 1 WHERE action LIKE "Action%Shutdown"')
+        ism.registry.load()
+        self.assertEqual(
+            ['ActionEmergencyShutdown', 'ActionNormalShutdown', 'ActionConfirmReadyToRun'],
+            [action.action_name for action in ism.dispatcher.ready('STARTING')]
+        )
+
+    def test_create_action(self):
+        """Test that many instances of one action class can be installed under their own names.
+
+        Only the active instances should be ready and each tests its own flag in the registry.
+        """
+
+        from ism.benchmarks.bench_registry import ActionBenchEntity, install
+
+        args = {
+            'properties_file': self.sqlite3_properties
+        }
+        ism = ISM(args)
+        install(ism, 1000, 2)
+        self.assertEqual(
+            ['ActionBenchEntity0', 'ActionBenchEntity1'],
+            sorted(action.action_name for action in ism.dispatcher.ready('STARTING')
+                   if isinstance(action, ActionBenchEntity))
+        )
+        self.assertTrue(ism.registry.get('ActionBenchEntity1').active())
+        self.assertFalse(ism.registry.get('ActionBenchEntity2').active())
+        self.assertFalse(hasattr(ism.registry.get('ActionBenchEntity2'), '__dict__'))
+
+        # An instance of a gating class holds up the phase it gates, as an imported one does
+        from ism.tests.test_concurrent_startup.action_before_test_startup import ActionBeforeTestStartupA
+        ism.dao.execute_sql_statement(
+            'INSERT INTO actions (action, execution_phase, payload, active) VALUES (?, ?, NULL, ?)',
+            ('ActionGatingEntity', 'STARTING', 1)
+        )
+        ism.create_action(ActionBeforeTestStartupA, 'ActionGatingEntity')
+        self.assertTrue(ism.gates.is_outstanding('ActionGatingEntity'))
+        self.assertFalse(ism.gates.is_open('RUNNING'))
+
+    def test_metrics_exporter(self):
+        """Test the metrics are served in the Prometheus text format while the ISM runs."""
+
+        args = {
+            'properties_file': self.sqlite3_properties
+        }
+        ism = ISM(args)
+        ism.import_action_pack('ism.tests.support')
+        ism.start()
+        self.assertTrue(ism.wait_for_phase('RUNNING', timeout=10))
+        host, port = ism.exporter.address
+        with urllib.request.urlopen(f'http://{host}:{port}/metrics', timeout=10) as response:
+            self.assertTrue(response.headers['Content-Type'].startswith('text/plain; version=0.0.4'))
+            samples = dict(
+                line.rsplit(' ', 1) for line in response.read().decode('utf-8').splitlines()
+                if not line.startswith('#')
+            )
+        ism.stop()
+        ism.ism_thread.join()
+
+        self.assertGreater(float(samples['ism_ticks_total']), 0)
+        self.assertEqual('1', samples['ism_phase{phase="RUNNING"}'])
+        self.assertEqual('0', samples['ism_phase{phase="STARTING"}'])
+        self.assertGreater(float(samples['ism_action_executions_total{action="ActionBeforeTestSupport"}']), 0)
+        self.assertGreater(float(samples['ism_db_statements_total{kind="query"}']), 0)
+        self.assertEqual('0', samples['ism_timers_overdue'])
+        for name in ['ism_active_actions', 'ism_ready_actions', 'ism_timers_pending', 'ism_timer_lag_seconds',
+                     'ism_ticks_per_second', 'ism_db_statement_seconds_total{kind="statement"}']:
+            self.assertIn(name, samples)
+
+    def test_deadline_miss(self):
+        """Test the scheduling declared in data.json is applied and deadline misses are reported.
+
+        ActionTestDeadline is activated by a timer and has a deadline of 0ms, so it always misses.
+        """
+
+        args = {
+            'properties_file': self.sqlite3_properties
+        }
+        ism = ISM(args)
+        ism.import_action_pack('ism.tests.test_scheduling')
+        action = [action for action in ism.actions if action.action_name == 'ActionTestDeadline'][0]
+        self.assertEqual(75, ism.registry.scheduling(action, 'priority'))
+        # The scheduling is declared for the action name, not its class
+        other = ism.create_action(type(action), 'ActionTestDeadline2')
+        self.assertEqual(0, ism.registry.scheduling(other, 'priority'))
+        self.assertEqual(0, type(action).priority)
+
+        ism.start(join=True)
+        self.assertEqual(1, ism.metrics.get('ism_deadline_misses_total', {'action': 'ActionTestDeadline'}))
+
+    def test_watchdog_overrun(self):
+        """Test that the watchdog reports an action that overruns its budget and deactivates it.
+
+        ActionTestOverrun sleeps for 200ms against a budget of 50ms.
+        """
+
+        args = {
+            'properties_file': self.sqlite3_properties
+        }
+        ism = ISM(args)
+        ism.import_action_pack('ism.tests.test_watchdog')
+        ism.watchdog.on_overrun = 'deactivate'
+
+        with self.assertLogs('ism.watchdog.Watchdog', level='WARNING') as logs:
+            with ism.events.queue(['deactivate']) as deactivated:
+                ism.start()
+                while deactivated.get(timeout=5).subject != 'ActionTestOverrun':
+                    pass
+        ism.stop()
+        ism.ism_thread.join()
+
+        self.assertEqual(1, ism.metrics.get('ism_watchdog_overruns_total', {'action': 'ActionTestOverrun'}))
+        self.assertIn('action_test_overrun.py', logs.output[0], 'Expected a stack sample of the overrunning action')
+
+    def test_generator_action(self):
+        """Test that an action whose execute method is a generator is advanced one step per dispatch.
+
+        ActionTestGenerator processes one item of its batch per dispatch. ActionCheckTimers should be
+        dispatched between each of them. The fourth dispatch finishes the generator.
+        """
+
+        args = {
+            'properties_file': self.sqlite3_properties
+        }
+        ism = ISM(args)
+        ism.import_action_pack('ism.tests.test_generator_action')
+        action = [action for action in ism.actions if action.action_name == 'ActionTestGenerator'][0]
+        ism.start(join=True)
+
+        self.assertEqual(['first', 'second', 'third'], action.processed)
+        dispatches = [record.subject for record in ism.recorder.records() if record.event == 'dispatch']
+        running = dispatches[dispatches.index('ActionTestGenerator'):]
+        self.assertEqual(
+            ['ActionTestGenerator', 'ActionCheckTimers'] * 3 + ['ActionTestGenerator'],
+            running[:7],
+            'Expected the generator to be resumed on each tick'
+        )
+
+    def test_recurring_timer(self):
+        """Test that a recurring timer activates its action every interval until cancelled.
+
+        ActionTestRecurring deactivates itself on each firing and shuts the ISM down after the third,
+        so it must have been re-activated by the timer twice.
+        """
+
+        args = {
+            'properties_file': self.sqlite3_properties
+        }
+        ism = ISM(args)
+        ism.import_action_pack('ism.tests.test_recurring_timer')
+        action = [action for action in ism.actions if action.action_name == 'ActionTestRecurring'][0]
+        timer_id = ism.recurring_timers.create('ActionTestRecurring', '{"tick": true}', interval_ms=20)
+        ism.start(join=True)
+
+        self.assertEqual([[('{"tick": true}',)]] * 3, action.fired)
+        self.assertGreaterEqual(ism.metrics.get('ism_recurring_timer_firings_total'), 3)
+        self.assertGreaterEqual(ism.metrics.get('ism_recurring_timer_drift_seconds_total'), 0)
+        self.assertEqual(1, len(ism.recurring_timers))
+        self.assertTrue(ism.recurring_timers.cancel(timer_id))
+        self.assertEqual(0, len(ism.recurring_timers))
+        self.assertEqual([(0,)], ism.dao.execute_sql_query(
+            f'SELECT active FROM recurring_timers WHERE id = {timer_id}'
+        ))
+        with self.assertRaises(ValueError):
+            ism.recurring_timers.create('ActionTestRecurring', interval_ms=20, cron='* * * * *')
+
+    def test_snapshot(self):
+        """Test that a snapshot reads consistently without blocking the loop's writes.
+
+        A write committed while the snapshot is open isn't seen by it, but is by a new one. In a
+        rollback journal the snapshot's read lock would fail the write with database is locked.
+        """
+
+        args = {
+            'properties_file': self.sqlite3_properties
+        }
+        ism = ISM(args)
+        sql = 'SELECT COUNT(*) FROM timers WHERE action = ?'
+        insert = "INSERT INTO timers (active, action, payload, expiry) VALUES (0, 'ActionSnapshot', NULL, 0)"
+        ism.dao.raise_on_sql_error = True
+
+        with ism.snapshot() as snapshot:
+            self.assertEqual([(0,)], snapshot.query(sql, ('ActionSnapshot',)))
+            ism.dao.execute_sql_statement(insert)
+            self.assertEqual([(0,)], snapshot.query(sql, ('ActionSnapshot',)))
+            self.assertEqual([(1,)], ism.query_snapshot(sql, ('ActionSnapshot',)))
+        self.assertEqual([('wal',)], ism.dao.execute_sql_query('PRAGMA journal_mode'))
+
+        # Errors in the body of the with are raised, not swallowed, whatever raise_on_sql_error says
+        ism.dao.raise_on_sql_error = False
+        with self.assertLogs('ism.sqlite3_dao.Sqlite3DAO', level='ERROR'):
+            with self.assertRaises(sqlite3.OperationalError):
+                with ism.snapshot() as snapshot:
+                    snapshot.query('SELECT * FROM no_such_table')
+
+        # Read while the loop is running
+        ism.start()
+        try:
+            self.assertTrue(ism.wait_for_phase('RUNNING', timeout=5))
+            with ism.snapshot() as snapshot:
+                self.assertEqual([('RUNNING',)], snapshot.query(
+                    'SELECT execution_phase FROM phases WHERE state = %s', (1,)
+                ))
+        finally:
+            ism.stop()
+            ism.ism_thread.join(5)
+
+    def test_payload_store(self):
+        """Test that payloads over the threshold are kept in the payload store and read back without copying.
+
+        Only a reference goes in the control database. Once no longer referenced, the file is removed
+        when a checkpoint is taken.
+        """
+
+        args = {
+            'properties_file': self.sqlite3_properties
+        }
+        ism = ISM(args)
+        ism.payloads.threshold = 64
+        # The threshold is in bytes once encoded, not characters
+        self.assertFalse(ism.payloads.stores('e' * 40))
+        self.assertTrue(ism.payloads.stores('\u00e9' * 40))
+        sender = [action for action in ism.actions if action.action_name == 'ActionCheckTimers'][0]
+        receiver = [action for action in ism.actions if action.action_name == 'ActionNormalShutdown'][0]
+        document = json.dumps({'rows': list(range(1000))})
+
+        sender.set_payload('ActionNormalShutdown', document)
+        reference = ism.dao.execute_sql_query("SELECT payload FROM actions WHERE action = 'ActionNormalShutdown'")[0][0]
+        self.assertTrue(reference.startswith('ism-payload:'))
+        files = os.listdir(ism.payloads.directory)
+        self.assertEqual(1, len(files))
+        view = receiver.get_payload_view()
+        self.assertIsInstance(view, memoryview)
+        self.assertTrue(view.readonly)
+        self.assertEqual(document.encode(), view)
+        self.assertEqual([(document,)], receiver.get_payload())
+
+        sender.set_payload('ActionNormalShutdown', '{"small": true}')
+        self.assertEqual([('{"small": true}',)], receiver.get_payload())
+        self.assertEqual(b'{"small": true}', receiver.get_payload_view())
+        self.assertTrue(ism.checkpoint())
+        self.assertEqual([], os.listdir(ism.payloads.directory))
+        receiver.clear_payload()
+        self.assertIsNone(receiver.get_payload_view())
+
+    def test_deliver_batches(self):
+        """Test that a batch is added to the pending batch of an active action, and replaces any other payload"""
+
+        args = {
+            'properties_file': self.sqlite3_properties
+        }
+        ism = ISM(args)
+        action = [action for action in ism.actions if action.action_name == 'ActionCheckTimers'][0]
+        sql = "SELECT payload FROM actions WHERE action = 'ActionNormalShutdown'"
+        action.set_payload('ActionNormalShutdown', '{"not": "a batch"}')
+        action.activate('ActionNormalShutdown')
+        with self.assertLogs('ActionCheckTimers', level='WARNING'):
+            deliver(action, {'ActionNormalShutdown': ['1']})
+        self.assertEqual([('[1]',)], ism.dao.execute_sql_query(sql))
+        deliver(action, {'ActionNormalShutdown': ['2', b'{"three": 3}']})
+        self.assertEqual([1, 2, {'three': 3}], json.loads(ism.dao.execute_sql_query(sql)[0][0]))
+        action.set_payload('ActionNormalShutdown', ' [ ] ')
+        deliver(action, {'ActionNormalShutdown': ['4']})
+        self.assertEqual([('[4]',)], ism.dao.execute_sql_query(sql))
+
+    def test_shm_ring(self):
+        """Test that messages sent on the shared memory ring reach their action in order.
+
+        The ring is small so the producer wraps around it and is pushed back when it is full.
+        """
+
+        name = f'ism_test_ring_{os.getpid()}'
+        ring = RingBuffer(name, 64)
+        with RingProducer(name) as producer:
+            self.assertTrue(producer.send('ActionA', '1'))
+            self.assertTrue(producer.send('ActionB', '[2, 3]'))
+            while producer.send('ActionA', '4'):
+                pass
+            self.assertEqual([('ActionA', b'1'), ('ActionB', b'[2, 3]')], ring.drain()[:2])
+            self.assertEqual(0, ring.pending())
+            self.assertTrue(producer.send('ActionA', '5'))
+            ring.drain()
+            # A name that isn't UTF-8 is dropped, then a frame longer than the bytes published
+            for frame in (FRAME.pack(3, 2) + b'\xff\xfe6', FRAME.pack(2, 1) + b'A7', FRAME.pack(50, 1)):
+                producer._copy_in(producer.head, frame)
+                producer.head += len(frame)
+            producer.header[HEAD] = producer.head
+            self.assertEqual([('A', b'7')], ring.drain())
+            self.assertEqual(2, ring.dropped)
+        ring.close()
+
+        args = {
+            'properties_file': self.sqlite3_properties
+        }
+        ism = ISM(args)
+        ism.properties['shm_ring'] = {'name': name, 'capacity_bytes': 1024}
+        ism.import_action_pack('ism.packs.shm_ring')
+        ism.import_action_pack('ism.tests.test_shm_ring')
+        consumer = [action for action in ism.actions if action.action_name == 'ActionTestRingConsumer'][0]
+        consumer.expected = 2000
+        ism.start()
+
+        producer = None
+        for attempt in range(500):
+            try:
+                producer = RingProducer(name)
+                break
+            except FileNotFoundError:
+                sleep(0.01)
+        self.assertIsNotNone(producer, 'Ring not created by ActionIngestRing')
+        with producer:
+            self.assertTrue(producer.send('ActionTestRingConsumer', 'not json'))
+            for number in range(2000):
+                while not producer.send('ActionTestRingConsumer', json.dumps({'number': number})):
+                    sleep(0.001)
+        ism.ism_thread.join(10)
+
+        self.assertEqual([{'number': number} for number in range(2000)], consumer.received)
+        with self.assertRaises(FileNotFoundError):
+            RingProducer(name)
+
+    def test_socket_channel(self):
+        """Test that messages sent on the socket channel are replied to on the same connection, in order.
+
+        The server is allowed few pending messages, so the burst sent pauses reading until the loop
+        catches up. Also checks the server on a Unix socket.
+        """
+
+        args = {
+            'properties_file': self.sqlite3_properties
+        }
+        ism = ISM(args)
+        ism.properties['socket_channel'] = {'port': 0, 'max_pending': 8}
+        ism.import_action_pack('ism.packs.socket_channel')
+        ism.import_action_pack('ism.tests.test_socket_channel')
+        channel = [action for action in ism.actions if action.action_name == 'ActionSocketChannel'][0]
+        ism.start()
+        for attempt in range(500):
+            if channel.server is not None:
+                break
+            sleep(0.01)
+        self.assertIsNotNone(channel.server, 'Server not started by ActionSocketChannel')
+
+        with SocketClient(channel.server.address) as client:
+            for number in range(200):
+                client.send('ActionTestSocketEcho', {'number': number})
+            replies = [client.receive(timeout=10) for _ in range(200)]
+            self.assertEqual([{'echo': {'number': number}} for number in range(200)], replies)
+            server = channel.server
+            client.send('ActionTestSocketEcho', {'shutdown': True})
+            ism.ism_thread.join(10)
+        self.assertGreater(server.pauses, 0, 'Expected reads to be paused while the loop caught up')
+        self.assertFalse(server.paused)
+        self.assertIsNone(channel.server)
+
+        path = os.path.join(tempfile.mkdtemp(), 'channel.sock')
+        server = SocketServer(socket_path=path)
+        server.start()
+        try:
+            with SocketClient(path) as client:
+                client.send('ActionAny', [1, 2])
+                for attempt in range(500):
+                    messages = server.drain()
+                    if messages:
+                        break
+                    sleep(0.01)
+                self.assertEqual(b'{"action": "ActionAny", "payload": [1, 2]}', messages[0][1])
+                server.send([(messages[0][0], b'{"ok": true}')])
+                self.assertEqual({'ok': True}, client.receive(timeout=5))
+        finally:
+            server.stop()
+        self.assertFalse(os.path.exists(path))
+
+    def test_outbound_log(self):
+        """Test that replies to test support messages are appended to the outbound segment log when configured"""
+
+        inbound = self.get_properties(self.sqlite3_properties)['test']['support']['inbound']
+        args = {
+            'properties_file': self.sqlite3_properties
+        }
+        ism = ISM(args)
+        ism.properties['test']['support']['outbound_log'] = {'fsync': 'always'}
+        ism.import_action_pack('ism.tests.support')
+        ism.start()
+
+        message = {
+            "action": "ActionRunSqlQuery",
+            "payload": {
+                "sql": "SELECT action FROM actions WHERE action = 'ActionOutboundTestMsg'",
+                "sender_id": 46
+            }
+        }
+        self.send_test_support_msg(message, inbound)
+        directory = f'{ism.properties["runtime"]["run_dir"]}{os.path.sep}outbound'
+        with SegmentReader(directory, 'outbound') as reader:
+            # Messages left in the shared inbound directory by other tests may be answered first
+            replies = (json.loads(record) for record in reader.follow(0.01, timeout=10))
+            reply = next((reply for reply in replies if reply.get('sender_id') == 46), None)
+        ism.stop()
+
+        self.assertEqual({'query_result': [['ActionOutboundTestMsg']], 'sender_id': 46}, reply)
+        outbound = self.get_properties(self.sqlite3_properties)['test']['support']['outbound']
+        self.assertFalse(os.path.exists(f'{outbound}{os.path.sep}46.json'))
+
+    def test_journal_replay(self):
+        """Test that changes journalled since the last checkpoint are replayed when the run resumes.
+
+        A later checkpoint compacts the journal, deleting the segments it no longer needs.
+        """
+
+        properties = self.get_properties(self.sqlite3_properties)
+        properties['journal'] = {'enabled': True, 'fsync': 'always'}
+        with tempfile.NamedTemporaryFile('w', suffix='.yaml', delete=False) as file:
+            yaml.safe_dump(properties, file)
+        args = {
+            'properties_file': file.name
+        }
+        ism = ISM(args)
+        action = [action for action in ism.actions if action.action_name == 'ActionCheckTimers'][0]
+        cancelled = action.set_recurring_timer('ActionCheckTimers', interval_ms=3600000)
+        self.assertTrue(ism.checkpoint())
+        compacted = ism.checkpoints.load()['journal']
+        action.set_execution_phase('RUNNING')
+        action.set_payload('ActionNormalShutdown', '{"journalled": true}')
+        action.activate('ActionNormalShutdown')
+        action.set_timer('ActionEmergencyShutdown', None, 4102444800000)
+        action.cancel_recurring_timer(cancelled)
+        action.set_recurring_timer('ActionNormalShutdown', interval_ms=3600000)
+
+        # Resume as if the run had crashed before its next checkpoint
+        args = {
+            'properties_file': file.name,
+            'resume': ism.properties['runtime']['run_dir']
+        }
+        resumed = ISM(args)
+        os.remove(file.name)
+        self.assertEqual('RUNNING', resumed.get_execution_phase())
+        self.assertEqual(
+            [(1, '{"journalled": true}')],
+            resumed.dao.execute_sql_query("SELECT active, payload FROM actions WHERE action = 'ActionNormalShutdown'")
+        )
+        self.assertEqual(
+            [('ActionEmergencyShutdown', 4102444800000)],
+            resumed.dao.execute_sql_query('SELECT action, expiry FROM timers WHERE active = 1')
+        )
+        self.assertEqual(
+            [('ActionNormalShutdown',)],
+            resumed.dao.execute_sql_query('SELECT action FROM recurring_timers WHERE active = 1')
+        )
+        self.assertEqual(1, len(resumed.recurring_timers))
+
+        self.assertTrue(resumed.checkpoint())
+        segments = os.listdir(resumed.journal.directory)
+        self.assertEqual([resumed.checkpoints.load()['journal']], segments)
+        self.assertNotIn(compacted, segments)
+
+    def test_journal_interval_sync(self):
+        """Test that with the interval fsync policy, changes journalled before the loop goes idle are written
+        to the journal within the interval, not left in its buffer until the next change."""
+
+        properties = self.get_properties(self.sqlite3_properties)
+        properties['journal'] = {'enabled': True, 'fsync': 'interval', 'fsync_interval_ms': 50}
+        with tempfile.NamedTemporaryFile('w', suffix='.yaml', delete=False) as file:
+            yaml.safe_dump(properties, file)
+        args = {
+            'properties_file': file.name
+        }
+        ism = ISM(args)
+        os.remove(file.name)
+        ism.start()
+        self.assertTrue(ism.wait_for_phase('RUNNING', timeout=5))
+        action = [action for action in ism.actions if action.action_name == 'ActionCheckTimers'][0]
+        action.set_payload('ActionNormalShutdown', '{"before": "idle"}')
+        segment = ism.checkpoints.load()['journal']
+        retries = 100
+        journalled = []
+        while retries > 0 and ('set_payload', 'ActionNormalShutdown') not in journalled:
+            retries -= 1
+            sleep(0.01)
+            journalled = [record[1:3] for record in records(ism.journal.directory, segment)]
+        ism.stop()
+        ism.ism_thread.join()
+        self.assertIn(('set_payload', 'ActionNormalShutdown'), journalled)
+
+    def test_durability_profile(self):
+        """Test that the fast durability profile relaxes syncing and group commits the loop's statements.
+
+        Changes made on the loop are only seen by other threads once committed, by the interval
+        passing or a checkpoint. An unknown profile is rejected.
+        """
+
+        properties = self.get_properties(self.sqlite3_properties)
+        properties['database']['durability'] = 'fast'
+        properties['database']['group_commit_ms'] = 60000
+        with tempfile.NamedTemporaryFile('w', suffix='.yaml', delete=False) as file:
+            yaml.safe_dump(properties, file)
+        args = {
+            'properties_file': file.name
+        }
+        ism = ISM(args)
+        self.assertEqual(0, ism.dao.open_connection().execute('PRAGMA synchronous').fetchone()[0])
+        ism.dao.close_connection()
+        ism.start()
+        self.assertTrue(ism.wait_for_phase('RUNNING', timeout=5))
+        self.assertEqual('STARTING', ism.get_execution_phase())
+        self.assertTrue(ism.checkpoint(timeout=5))
+        self.assertEqual('RUNNING', ism.get_execution_phase())
+        ism.stop()
+        ism.ism_thread.join()
+
+        properties['database']['durability'] = 'reckless'
+        with open(file.name, 'w') as changed:
+            yaml.safe_dump(properties, changed)
+        with self.assertRaises(DurabilityProfileNotRecognised):
+            ISM(args)
+        os.remove(file.name)
+    def test_simulated_clock(self):
+        """Test that the simulated clock jumps to the next deadline while the loop is idle.
+
+        ActionTestRecurring is fired by an hourly recurring timer and a timer 90 minutes away, and shuts
+        the ISM down on its third firing. That takes two simulated hours, not real ones, and the outcome
+        is the same every run.
+        """
+
+        properties = self.get_properties(self.sqlite3_properties)
+        properties['clock'] = {'mode': 'simulated', 'start_ms': 1700000000000}
+        properties['journal'] = {'enabled': True, 'fsync': 'always'}
+        with tempfile.NamedTemporaryFile('w', suffix='.yaml', delete=False) as file:
+            yaml.safe_dump(properties, file)
+        args = {
+            'properties_file': file.name
+        }
+        ism = ISM(args)
+        os.remove(file.name)
+        ism.import_action_pack('ism.tests.test_recurring_timer')
+        action = [action for action in ism.actions if action.action_name == 'ActionTestRecurring'][0]
+        self.assertEqual(1700000000000, action.get_epoch_milliseconds())
+        action.set_timer('ActionTestRecurring', '{"timer": true}', action.set_timer_expiry(seconds=5400))
+        # The timer is due in simulated time, so isn't overdue however far behind the wall clock that is
+        samples = {name: value for name, kind, labels, value in ism.exporter.collect()}
+        self.assertEqual(1, samples['ism_timers_pending'])
+        self.assertEqual(0, samples['ism_timers_overdue'])
+        self.assertEqual(0, samples['ism_timer_lag_seconds'])
+        ism.recurring_timers.create('ActionTestRecurring', '{"hourly": true}', interval_ms=3600000)
+        ism.start()
+        ism.ism_thread.join(timeout=10)
+
+        self.assertFalse(ism.ism_thread.is_alive(), 'Simulated clock did not skip to the recurring timer deadlines')
+        self.assertEqual('STOPPED', ism.get_execution_phase())
+        self.assertEqual(
+            [[('{"hourly": true}',)], [('{"timer": true}',)], [('{"hourly": true}',)]], action.fired
+        )
+        self.assertEqual(1700000000000 + 2 * 3600000, action.get_epoch_milliseconds())
+        self.assertEqual(0, ism.metrics.get('ism_recurring_timer_missed_total') or 0)
+
+        # The checkpoint and journal are stamped with the simulated time
+        manifest = ism.checkpoints.load()
+        self.assertEqual(1700000000000, manifest['created'])
+        stamps = [record[0] for record in records(ism.journal.directory, manifest['journal'])]
+        self.assertTrue(stamps)
+        self.assertTrue(all(1700000000000 <= stamp <= 1700000000000 + 2 * 3600000 for stamp in stamps))
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,79 @@
+# Standard library imports
+import unittest
+
+# Local application imports
+from ism.loadgen import analyse, percentile, slope_per_hour
+
+
+def samples(count: int, rss_mb_per_hour=0.0):
+    """One sample a minute, with RSS growing at the rate given and a steady database and tick p99"""
+
+    return [
+        {
+            'elapsed_s': minute * 60,
+            'rss_bytes': 104857600 + rss_mb_per_hour * 1048576 * minute / 60,
+            'traced_bytes': None,
+            'db_bytes': 1048576,
+            'tick_p99_us': 100.0
+        } for minute in range(count)
+    ]
+
+
+class TestLoadgen(unittest.TestCase):
+
+    def test_percentile(self):
+        """Test the percentiles of a sorted list, clamped to its last value, and None when it is empty"""
+
+        ordered = list(range(1, 101))
+        self.assertEqual(51, percentile(ordered, 0.5))
+        self.assertEqual(100, percentile(ordered, 0.99))
+        self.assertEqual(100, percentile(ordered, 1.0))
+        self.assertEqual(1, percentile(ordered, 0))
+        self.assertEqual(7, percentile([7], 0.99))
+        self.assertIsNone(percentile([], 0.5))
+
+    def test_slope_per_hour(self):
+        """Test the least squares growth of a series, ignoring missing values"""
+
+        series = [{'elapsed_s': second, 'size': 10 + 2 * second} for second in range(0, 100, 10)]
+        self.assertAlmostEqual(7200, slope_per_hour(series, 'size'))
+        series.append({'elapsed_s': 200, 'size': None})
+        self.assertAlmostEqual(7200, slope_per_hour(series, 'size'))
+
+        # Too few points, or all at the same time, have no slope
+        self.assertIsNone(slope_per_hour(series[:1], 'size'))
+        self.assertIsNone(slope_per_hour([{'elapsed_s': 5, 'size': 1}, {'elapsed_s': 5, 'size': 2}], 'size'))
+
+    def test_analyse(self):
+        """Test that leaks, database growth and slowing ticks are flagged, and a steady run isn't"""
+
+        steady = analyse(samples(60), 0.2, 10, 4, 100, 2)
+        self.assertEqual([], steady['flags'])
+        self.assertAlmostEqual(0, steady['trends']['rss_mb_per_hour'])
+        self.assertAlmostEqual(0, steady['trends']['db_mb_per_hour'])
+        self.assertIsNone(steady['trends']['traced_mb_per_hour'])
+        self.assertEqual(1, steady['trends']['tick_p99_ratio'])
+
+        leaking = analyse(samples(60, rss_mb_per_hour=50), 0.2, 10, 4, 100, 2)
+        self.assertAlmostEqual(50, leaking['trends']['rss_mb_per_hour'])
+        self.assertEqual(['leak: rss growing 50.0MB/hour'], leaking['flags'])
+
+        # Growth too small over a short run to be taken for a leak
+        self.assertEqual([], analyse(samples(5, rss_mb_per_hour=50), 0.2, 10, 4, 100, 2)['flags'])
+
+        growing = samples(60)
+        for sample in growing:
+            sample['db_bytes'] += sample['elapsed_s'] * 1048576
+        self.assertEqual(['db_growth: control database growing 3600.0MB/hour'],
+                         analyse(growing, 0.2, 10, 4, 100, 2)['flags'])
+
+        slowing = samples(60)
+        for sample in slowing[40:]:
+            sample['tick_p99_us'] = 500.0
+        slowed = analyse(slowing, 0.2, 10, 4, 100, 2)
+        self.assertEqual(5, slowed['trends']['tick_p99_ratio'])
+        self.assertEqual(['latency_degradation: tick p99 up 5.0x from 100us to 500us'], slowed['flags'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,200 @@
+"""
+Query plan regression harness for the SQL shipped with the ISM.
+
+Collects every SQL statement literal in BaseAction, the core actions, the dispatcher
+and the test support actions, seeds a control database with thousands of actions and timers, then:
+    * Fails if a hot path statement (BaseAction, the core actions and the dispatcher) does a full scan
+    of a seeded table. EXPLAIN QUERY PLAN for Sqlite3 and EXPLAIN for MySql.
+    * Counts the Sqlite3 VM instructions each statement executes against the seeded
+    database and fails, with a report, if any statement got slower than the recorded
+    baseline. Instruction counts are deterministic, so unlike timings they don't flake.
+
+Regenerate the baseline after an intended change with:
+
+    ISM_QUERY_PLAN_BASELINE=update python3 -m unittest -v ism.tests.test_query_plans
+
+Assumes the same MySql setup as test_ism.
+"""
+
+# Standard library imports
+import ast
+import glob
+import json
+import os
+import sqlite3
+import unittest
+
+# Local application imports
+from ism.ISM import ISM
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+HOT_PATH = [
+    f'{ROOT}{os.path.sep}core{os.path.sep}base_action.py',
+    f'{ROOT}{os.path.sep}core{os.path.sep}action_*.py',
+    f'{ROOT}{os.path.sep}core{os.path.sep}dispatcher.py'
+]
+SUPPORT = [
+    f'{ROOT}{os.path.sep}tests{os.path.sep}support{os.path.sep}action_*.py'
+]
+
+# The tables seeded at scale. Scanning the others (e.g. phases) is cheap as their size is fixed.
+SCALED_TABLES = ('actions', 'timers')
+SCALE = 5000
+
+# Hot path statements allowed a full scan, with the reason
+KNOWN_FULL_SCANS = {}
+
+# Permitted growth in VM instructions before a statement is reported as slower
+TOLERANCE = 1.25
+
+SEED = {
+    'sqlite3': [
+        f"INSERT INTO actions (action, execution_phase, payload, active) "
+        f"WITH RECURSIVE seq(n) AS (SELECT 1 UNION ALL SELECT n + 1 FROM seq WHERE n < {SCALE}) "
+        f"SELECT 'ActionSeed' || n, 'RUNNING', NULL, n % 2 FROM seq",
+        f"INSERT INTO timers (active, action, payload, expiry) "
+        f"WITH RECURSIVE seq(n) AS (SELECT 1 UNION ALL SELECT n + 1 FROM seq WHERE n < {SCALE}) "
+        f"SELECT n % 2, 'ActionSeed' || n, NULL, 4102444800000 + n FROM seq"
+    ],
+    'mysql': [
+        f"INSERT INTO actions (action, execution_phase, payload, active) "
+        f"SELECT CONCAT('ActionSeed', n), 'RUNNING', NULL, n % 2 FROM ("
+        f"SELECT a.d + b.d * 10 + c.d * 100 + e.d * 1000 AS n FROM "
+        f"(SELECT 0 d UNION ALL SELECT 1 UNION ALL SELECT 2 UNION ALL SELECT 3 UNION ALL SELECT 4 UNION ALL "
+        f"SELECT 5 UNION ALL SELECT 6 UNION ALL SELECT 7 UNION ALL SELECT 8 UNION ALL SELECT 9) a, "
+        f"(SELECT 0 d UNION ALL SELECT 1 UNION ALL SELECT 2 UNION ALL SELECT 3 UNION ALL SELECT 4 UNION ALL "
+        f"SELECT 5 UNION ALL SELECT 6 UNION ALL SELECT 7 UNION ALL SELECT 8 UNION ALL SELECT 9) b, "
+        f"(SELECT 0 d UNION ALL SELECT 1 UNION ALL SELECT 2 UNION ALL SELECT 3 UNION ALL SELECT 4 UNION ALL "
+        f"SELECT 5 UNION ALL SELECT 6 UNION ALL SELECT 7 UNION ALL SELECT 8 UNION ALL SELECT 9) c, "
+        f"(SELECT 0 d UNION ALL SELECT 1 UNION ALL SELECT 2 UNION ALL SELECT 3 UNION ALL SELECT 4) e) seq",
+        "INSERT INTO timers (active, action, payload, expiry) "
+        "SELECT active, action, NULL, 4102444800000 + id FROM actions WHERE action LIKE 'ActionSeed%'"
+    ]
+}
+
+
+def collect_statements(patterns) -> dict:
+    """Collect the SQL statement literals in the modules matching the glob patterns.
+
+    :return statement -> list of the locations (module:line) it is used
+    """
+
+    statements = {}
+    for pattern in patterns:
+        for module in sorted(glob.glob(pattern)):
+            with open(module) as file:
+                tree = ast.parse(file.read())
+            for node in ast.walk(tree):
+                if isinstance(node, ast.Constant) and isinstance(node.value, str):
+                    sql = node.value.strip()
+                    if sql.split(' ')[0].upper() in ('SELECT', 'INSERT', 'UPDATE', 'DELETE'):
+                        statements.setdefault(sql, []).append(f'{os.path.relpath(module, ROOT)}:{node.lineno}')
+    return statements
+
+
+class TestQueryPlans(unittest.TestCase):
+
+    path_sep = os.path.sep
+    dir = os.path.dirname(os.path.abspath(__file__))
+    sqlite3_properties = f'{dir}{path_sep}resources{path_sep}sqlite3_properties.yaml'
+    mysql_properties = f'{dir}{path_sep}resources{path_sep}mysql_properties.yaml'
+    baseline_file = f'{dir}{path_sep}resources{path_sep}query_plan_baseline.json'
+
+    @staticmethod
+    def seeded_ism(args) -> ISM:
+        """Create an ISM with the test support pack and seed its control DB at scale"""
+
+        ism = ISM(args)
+        ism.import_action_pack('ism.tests.support')
+        for statement in SEED[ism.properties['database']['rdbms'].lower()]:
+            ism.dao.execute_sql_statement(statement)
+        return ism
+
+    @staticmethod
+    def sqlite3_scans(cnx, sql) -> list:
+        """The seeded tables the Sqlite3 query plan for sql scans in full"""
+
+        plan = cnx.execute(f'EXPLAIN QUERY PLAN {sql}', (1,) * sql.count('?')).fetchall()
+        return [
+            table for row in plan for table in SCALED_TABLES
+            if row[3].startswith(f'SCAN {table}') and 'INDEX' not in row[3]
+        ]
+
+    @staticmethod
+    def sqlite3_cost(cnx, sql) -> int:
+        """Count the VM instructions executed by sql, rolling back any changes it makes"""
+
+        steps = [0]
+
+        def count():
+            steps[0] += 1
+            return 0
+
+        cnx.set_progress_handler(count, 1)
+        try:
+            cnx.execute(sql, (1,) * sql.count('?')).fetchall()
+        finally:
+            cnx.set_progress_handler(None, 1)
+            cnx.rollback()
+        return steps[0]
+
+    def test_sqlite3_hot_path_full_scans(self):
+        """Fail if any hot path statement scans a seeded table in full"""
+
+        ism = self.seeded_ism({'properties_file': self.sqlite3_properties})
+        failures = []
+        with sqlite3.connect(ism.get_database_name()) as cnx:
+            for sql, locations in collect_statements(HOT_PATH).items():
+                scans = self.sqlite3_scans(cnx, sql)
+                if scans and sql not in KNOWN_FULL_SCANS:
+                    failures.append(f'{", ".join(locations)} full scan of {scans}: {sql}')
+
+        self.assertEqual([], failures, 'Hot path statements doing a full table scan')
+
+    def test_sqlite3_statement_costs(self):
+        """Fail, with a report, if any statement executes more VM instructions than the baseline"""
+
+        ism = self.seeded_ism({'properties_file': self.sqlite3_properties})
+        statements = collect_statements(HOT_PATH + SUPPORT)
+        with sqlite3.connect(ism.get_database_name()) as cnx:
+            costs = {sql: self.sqlite3_cost(cnx, sql) for sql in statements}
+
+        if os.environ.get('ISM_QUERY_PLAN_BASELINE') == 'update':
+            with open(self.baseline_file, 'w') as file:
+                json.dump(costs, file, indent=4, sort_keys=True)
+
+        with open(self.baseline_file) as file:
+            baseline = json.load(file)
+
+        slower = [
+            f'{", ".join(statements[sql])} {baseline[sql]} -> {cost} instructions: {sql}'
+            for sql, cost in costs.items() if sql in baseline and cost > baseline[sql] * TOLERANCE
+        ]
+        unmeasured = [sql for sql in costs if sql not in baseline]
+        self.assertEqual([], slower, 'Statements slower than the baseline')
+        self.assertEqual([], unmeasured, 'Statements missing from the baseline. Regenerate it.')
+
+    def test_mysql_hot_path_full_scans(self):
+        """Fail if any hot path statement scans a seeded table in full"""
+
+        ism = self.seeded_ism({
+            'properties_file': self.mysql_properties,
+            'database': {
+                'password': 'wbA7C2B6R7'
+            }
+        })
+        failures = []
+        for sql, locations in collect_statements(HOT_PATH).items():
+            statement = ism.dao.prepare_parameterised_statement(sql) if '?' in sql else sql
+            plan = ism.dao.execute_sql_query(f'EXPLAIN {statement}', (1,) * sql.count('?'))
+            # Columns are id, select_type, table, partitions, type, ...
+            scans = [row[2] for row in plan if row[2] in SCALED_TABLES and row[4] in ('ALL', 'index')]
+            if scans and sql not in KNOWN_FULL_SCANS:
+                failures.append(f'{", ".join(locations)} full scan of {scans}: {sql}')
+
+        self.assertEqual([], failures, 'Hot path statements doing a full table scan')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,24 @@
+"""Express a test action for the recurring timer unit tests
+
+"""
+from ism.core.base_action import BaseAction
+
+
+class ActionTestRecurring(BaseAction):
+    """Action is activated by a recurring timer. Counts its firings and shuts the ISM down after the third.
+
+    Unit tests check the payloads it was fired with.
+    """
+
+    def __init__(self, *args):
+        super().__init__(*args)
+        self.fired = []
+
+    def execute(self):
+
+        if self.active():
+
+            self.fired.append(self.get_payload())
+            self.deactivate()
+            if len(self.fired) == 3:
+                self.activate('ActionNormalShutdown')
@@ -0,0 +1,19 @@
+"""Express a test action for the scheduling unit tests
+
+"""
+from ism.core.base_action import BaseAction
+
+
+class ActionTestDeadline(BaseAction):
+    """Action is activated by a timer then shuts the ISM down.
+
+    Its priority and deadline are declared in the pack's data.json. The deadline of 0ms
+    guarantees a miss, which the unit tests check is reported.
+    """
+
+    def execute(self):
+
+        if self.active():
+
+            self.activate('ActionNormalShutdown')
+            self.deactivate()
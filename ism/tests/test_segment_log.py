@@ -0,0 +1,114 @@
+# Standard library imports
+import os
+import tempfile
+import threading
+import time
+import unittest
+
+# Local application imports
+from ism.core.segment_log import SegmentReader, SegmentWriter
+from ism.exceptions.exceptions import CorruptSegmentLog
+
+
+class TestSegmentLog(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def test_rotate_and_tail(self):
+        """Test that a reader tailing the log gets every record in order as the writer rotates segments"""
+
+        writer = SegmentWriter(self.directory, 'test', segment_bytes=1024, fsync='rotate')
+        reader = SegmentReader(self.directory, 'test')
+        self.assertEqual([], reader.read())
+        received = []
+        for number in range(300):
+            writer.append(f'record {number}'.encode())
+            if number % 50 == 0:
+                writer.flush()
+                received.extend(reader.read())
+        writer.close()
+        received.extend(reader.read())
+        reader.close()
+
+        self.assertEqual([f'record {number}'.encode() for number in range(300)], received)
+        self.assertGreater(len(writer.segments()), 3)
+
+        # A writer reopening the log starts a new segment after the last
+        last = writer.segments()[-1]
+        writer = SegmentWriter(self.directory, 'test', fsync='always')
+        self.assertGreater(writer.path, last)
+        writer.close()
+
+    def test_follow(self):
+        """Test that following the log yields records appended on another thread"""
+
+        writer = SegmentWriter(self.directory, 'test', segment_bytes=256, fsync='always')
+
+        def append():
+            for number in range(100):
+                writer.append(str(number).encode())
+            writer.close()
+
+        thread = threading.Thread(target=append)
+        thread.start()
+        with SegmentReader(self.directory, 'test') as reader:
+            records = [record for _, record in zip(range(100), reader.follow(0.01, timeout=5))]
+        thread.join()
+        self.assertEqual([str(number).encode() for number in range(100)], records)
+
+    def test_interval_sync_after_appends_stop(self):
+        """Test that appends followed by a lull are synced within the interval by tick() or a background writer"""
+
+        writer = SegmentWriter(self.directory, 'test', fsync='interval', fsync_interval_ms=200)
+        writer.append(b'last before a lull')
+        writer.tick()
+        self.assertEqual(0, os.path.getsize(writer.path))
+        time.sleep(0.25)
+        writer.tick()
+        self.assertGreater(os.path.getsize(writer.path), 0)
+        writer.close()
+
+        writer = SegmentWriter(self.directory, 'background', fsync='interval', fsync_interval_ms=20, background=True)
+        writer.append(b'last before a lull')
+        with SegmentReader(self.directory, 'background') as reader:
+            records = [record for _, record in zip(range(1), reader.follow(0.01, timeout=5))]
+        self.assertEqual([b'last before a lull'], records)
+        writer.close()
+
+    def test_torn_and_corrupt_records(self):
+        """Test that a record torn at the end of the log isn't read and a corrupt one with valid records after raises"""
+
+        writer = SegmentWriter(self.directory, 'test', fsync='interval', fsync_interval_ms=0)
+        writer.append(b'whole')
+        writer.append(b'last')
+        writer.close()
+        with open(writer.path, 'ab') as segment:
+            segment.write(b'\x00\x00\x00\x10\x00')
+        with SegmentReader(self.directory, 'test') as reader:
+            self.assertEqual([b'whole', b'last'], reader.read())
+            self.assertEqual([], reader.read())
+
+        # The last record's length was written but its bytes weren't all
+        with open(writer.path, 'r+b') as segment:
+            segment.seek(21)
+            segment.write(b'L')
+        with SegmentReader(self.directory, 'test') as reader:
+            with self.assertLogs('ism.segment_log.SegmentReader', level='WARNING'):
+                self.assertEqual([b'whole'], reader.read())
+
+        with open(writer.path, 'r+b') as segment:
+            segment.seek(21)
+            segment.write(b'l')
+            segment.seek(8)
+            segment.write(b'W')
+        with SegmentReader(self.directory, 'test') as reader:
+            with self.assertRaises(CorruptSegmentLog):
+                reader.read()
+
+        with self.assertRaises(ValueError):
+            SegmentWriter(os.path.join(self.directory, 'other'), fsync='sometimes')
+
+
+if __name__ == '__main__':
+    unittest.main()
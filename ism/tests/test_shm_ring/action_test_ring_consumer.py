@@ -0,0 +1,30 @@
+"""Express a test action for the shared memory ring unit tests
+
+"""
+# Standard library imports
+import json
+
+# Local application imports
+from ism.core.base_action import BaseAction
+
+
+class ActionTestRingConsumer(BaseAction):
+    """Action consumes the batches of messages ingested from the ring. Shuts the ISM down once it has expected.
+
+    Unit tests check the messages arrived in order.
+    """
+
+    def __init__(self, *args):
+        super().__init__(*args)
+        self.expected = 0
+        self.received = []
+
+    def execute(self):
+
+        if self.active():
+
+            self.received.extend(json.loads(self.get_payload()[0][0]))
+            self.clear_payload()
+            self.deactivate()
+            if len(self.received) >= self.expected:
+                self.activate('ActionNormalShutdown')
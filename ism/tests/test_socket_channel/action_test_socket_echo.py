@@ -0,0 +1,30 @@
+"""Express a test action for the socket channel unit tests
+
+"""
+# Standard library imports
+import json
+
+# Local application imports
+from ism.core.base_action import BaseAction
+
+
+class ActionTestSocketEcho(BaseAction):
+    """Action replies to each message it is sent with the message's payload. Shuts the ISM down if asked to."""
+
+    def execute(self):
+
+        if self.active():
+
+            sql = self.dao.prepare_parameterised_statement(
+                'INSERT INTO socket_channel_outbound (reply_to, message) VALUES (?, ?)'
+            )
+            for message in json.loads(self.get_payload()[0][0]):
+                if message['payload'].get('shutdown'):
+                    self.activate('ActionNormalShutdown')
+                    continue
+                self.mutate(
+                    'reply', 'socket_channel_outbound', sql,
+                    (message['reply_to'], json.dumps({'echo': message['payload']}))
+                )
+            self.clear_payload()
+            self.deactivate()
@@ -0,0 +1,83 @@
+# Standard library imports
+import datetime
+import random
+import unittest
+
+# Local application imports
+from ism.core.timing_wheel import Cron, TimingWheel
+
+
+class TestTimingWheel(unittest.TestCase):
+
+    def test_fires_on_expiry_tick(self):
+        """Test that timers at every level fire on the tick they expire and not before"""
+
+        wheel = TimingWheel(now=5)
+        expiries = {key: expiry for key, expiry in enumerate(random.Random(7).sample(range(6, 200000), 500))}
+        for key, expiry in expiries.items():
+            wheel.insert(key, expiry, expiry)
+        fired = {}
+        tick = 5
+        while len(wheel):
+            tick += random.Random(tick).randint(1, 300)
+            for key, value in wheel.advance(tick):
+                fired[key] = tick
+        for key, expiry in expiries.items():
+            self.assertGreaterEqual(fired[key], expiry, f'Timer ({key}) fired early')
+        self.assertEqual(set(expiries), set(fired))
+
+        wheel = TimingWheel()
+        wheel.insert('a', 300)
+        self.assertEqual([], wheel.advance(299))
+        self.assertEqual([('a', None)], wheel.advance(300))
+
+    def test_skips_long_advances(self):
+        """Test that advancing far past a few timers fires each in order, on its tick, without stepping every tick"""
+
+        wheel = TimingWheel(now=100)
+        expiries = sorted(random.Random(3).sample(range(101, 1 << 34), 20))
+        for expiry in expiries:
+            wheel.insert(expiry, expiry, expiry)
+        for expiry in expiries:
+            self.assertEqual([], wheel.advance(expiry - 1))
+            self.assertEqual([(expiry, expiry)], wheel.advance(expiry + 1000000))
+        self.assertEqual(0, len(wheel))
+
+        wheel.insert('a', wheel.now + 5000000)
+        wheel.insert('b', wheel.now + 9000000)
+        self.assertEqual(['a', 'b'], [key for key, value in wheel.advance(wheel.now + 10000000)])
+
+    def test_cancel_and_replace(self):
+        """Test that cancelled timers don't fire and inserting a key again replaces its timer"""
+
+        wheel = TimingWheel()
+        wheel.insert('a', 10)
+        wheel.insert('b', 70000)
+        wheel.insert('b', 20, 'replaced')
+        self.assertEqual(10, wheel.earliest())
+        self.assertTrue(wheel.cancel('a'))
+        self.assertEqual(20, wheel.earliest())
+        self.assertFalse(wheel.cancel('a'))
+        self.assertNotIn('a', wheel)
+        self.assertEqual([('b', 'replaced')], wheel.advance(100000))
+        self.assertEqual(0, len(wheel))
+        self.assertIsNone(wheel.earliest())
+
+    def test_cron(self):
+        """Test the next run of some cron schedules"""
+
+        moment = datetime.datetime(2024, 2, 28, 6, 30, 15)
+        self.assertEqual(datetime.datetime(2024, 2, 28, 6, 35), Cron('*/5 * * * *').next_after(moment))
+        self.assertEqual(datetime.datetime(2024, 2, 29, 6, 0), Cron('0 6 * * *').next_after(moment))
+        self.assertEqual(datetime.datetime(2028, 2, 29, 0, 0), Cron('0 0 29 2 *').next_after(datetime.datetime(2024, 3, 1)))
+        # Either day field matches when both are restricted. 2024-03-03 is a Sunday
+        self.assertEqual(datetime.datetime(2024, 3, 1, 0, 0), Cron('0 0 1 * 0').next_after(moment))
+        self.assertEqual(datetime.datetime(2024, 3, 3, 9, 0), Cron('0 9 * * 7').next_after(moment))
+        with self.assertRaises(ValueError):
+            Cron('* * *')
+        with self.assertRaises(ValueError):
+            Cron('60 * * * *')
+
+
+if __name__ == '__main__':
+    unittest.main()
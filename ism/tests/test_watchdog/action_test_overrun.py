@@ -0,0 +1,21 @@
+"""Express a test action for the watchdog unit tests
+
+"""
+# Standard library imports
+import time
+
+# Local application imports
+from ism.core.base_action import BaseAction
+
+
+class ActionTestOverrun(BaseAction):
+    """Action sleeps for longer than the budget declared in the pack's data.json.
+
+    It never deactivates itself, so the unit tests can check the watchdog deactivates it.
+    """
+
+    def execute(self):
+
+        if self.active():
+
+            time.sleep(0.2)
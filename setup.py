@@ -14,9 +14,20 @@ setuptools.setup(
     url="https://github.com/kaliklipper/infinite-state-machine",
     packages=setuptools.find_packages(),
     package_data={
+        'ism': ['*.yaml'],
         'ism.core': ['*.json'],
+        'ism.packs.shm_ring': ['*.json'],
+        'ism.packs.socket_channel': ['*.json'],
         'ism.tests.test_import_action_pack': ['*.json'],
-        'ism.tests.support': ['*.json']
+        'ism.tests.support': ['*.json'],
+        'ism.tests.test_concurrent_startup': ['*.json'],
+        'ism.tests.test_emergency_shutdown': ['*.json'],
+        'ism.tests.test_generator_action': ['*.json'],
+        'ism.tests.test_recurring_timer': ['*.json'],
+        'ism.tests.test_scheduling': ['*.json'],
+        'ism.tests.test_shm_ring': ['*.json'],
+        'ism.tests.test_socket_channel': ['*.json'],
+        'ism.tests.test_watchdog': ['*.json']
     },
     classifiers=[
         "Programming Language :: Python :: 3",